@@ -6,3 +6,33 @@
 #
 # The OwlPy Developers, 21st century
 # -----------------------------------------------------------------------------
+
+'''
+OwlPy - Tools for many-component seismology.
+
+Subpackages and modules are loaded on first attribute access.
+'''
+
+import importlib
+
+_submodules = (
+    'error',
+    'moving',
+    'polarisation',
+    'tilt',
+    'tracestore',
+    'util',
+)
+
+
+def __getattr__(name):
+    # import submodules on first access, keeping the package import cheap
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+
+    raise AttributeError(
+        'module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules))
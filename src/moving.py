@@ -0,0 +1,619 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Moving-window statistics.
+
+All functions work along the last axis of their input and over arbitrary
+leading axes. The ``mode`` argument has the meaning of
+:py:func:`~owlpy.util.moving_sum`: in modes ``'same'`` and ``'full'``,
+windows at the edges are shortened and statistics are normalised by the
+number of samples actually in each window.
+
+Sums of all needed products of one input are stacked and computed with a
+single call to :py:func:`~owlpy.util.moving_sum`, i.e. a single prefix sum
+pass.
+
+Masked samples of :py:class:`numpy.ma.MaskedArray` input, e.g. gaps, are
+excluded and statistics are normalised by the number of valid samples in
+each window. Windows without enough valid samples give NaN. Functions
+combining several components only use samples valid in all of them.
+'''
+
+import numpy as np
+
+from .util import moving_sum
+
+
+def moving_count(nsamples, n, mode='valid'):
+    '''
+    Get number of samples in each window.
+
+    :param nsamples:
+        Number of samples of the input.
+    :type nsamples:
+        int
+
+    :param n:
+        Window length [samples].
+    :type n:
+        int
+
+    :param mode:
+        ``'valid'``, ``'same'`` or ``'full'``, see
+        :py:func:`~owlpy.util.moving_sum`.
+    :type mode:
+        str
+
+    :returns:
+        Number of samples in each window.
+    :rtype:
+        :py:class:`numpy.ndarray`
+    '''
+
+    return moving_sum(np.ones(nsamples), n, mode=mode)
+
+
+def _unmask(x, joint=False):
+    # Zero-filled samples and indicator of valid samples, None if nothing is
+    # masked. With ``joint``, samples masked in any component are dropped in
+    # all components.
+    if not np.ma.isMaskedArray(x):
+        return np.asarray(x), None
+
+    valid = ~np.ma.getmaskarray(x)
+    if joint:
+        valid = np.all(valid, axis=-2, keepdims=True)
+
+    return np.where(valid, np.ma.getdata(x), 0), valid
+
+
+def _valid_count(valid, nsamples, n, mode):
+    if valid is None:
+        return moving_count(nsamples, n, mode=mode)
+
+    return moving_sum(valid.astype(float), n, mode=mode)
+
+
+def _normalise(sums, count, ddof=0):
+    # NaN for windows without enough valid samples
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(count > ddof, sums / (count - ddof), np.nan)
+
+
+def _products(x):
+    ncomponents = x.shape[-2]
+    i, j = np.triu_indices(ncomponents)
+    return i, j, x[..., i, :] * x[..., j, :]
+
+
+def _unpack_products(sums, i, j, ncomponents):
+    shape = sums.shape[:-2] + (ncomponents, ncomponents, sums.shape[-1])
+    out = np.empty(shape, dtype=sums.dtype)
+    out[..., i, j, :] = sums
+    out[..., j, i, :] = sums
+    return out
+
+
+def moving_products(x, n, mode='valid', window='boxcar'):
+    '''
+    Get moving sums of products between all pairs of components.
+
+    :param x:
+        Input as ``x[..., icomponent, isample]``.
+    :type x:
+        :py:class:`numpy.ndarray`
+
+    :param n:
+        Window length [samples].
+    :type n:
+        int
+
+    :param mode:
+        ``'valid'``, ``'same'`` or ``'full'``, see
+        :py:func:`~owlpy.util.moving_sum`.
+    :type mode:
+        str
+
+    :param window:
+        Window taper, see :py:func:`taper_window`.
+    :type window:
+        str
+
+    :returns:
+        Moving sums of ``x[..., i, :] * x[..., j, :]`` as
+        ``sums[..., i, j, iwindow]``. Samples masked in any component do not
+        contribute.
+    :rtype:
+        :py:class:`numpy.ndarray`
+    '''
+
+    x, _ = _unmask(x, joint=True)
+    i, j, products = _products(x)
+    if window == 'boxcar':
+        sums = moving_sum(products, n, mode=mode)
+    else:
+        sums = moving_weighted_sum(products, n, window=window, mode=mode)
+
+    return _unpack_products(sums, i, j, x.shape[-2])
+
+
+def moving_mean(x, n, mode='valid'):
+    '''
+    Get moving average.
+
+    :param x:
+        Input as ``x[..., isample]``.
+    :type x:
+        :py:class:`numpy.ndarray`
+
+    :param n:
+        Window length [samples].
+    :type n:
+        int
+
+    :param mode:
+        ``'valid'``, ``'same'`` or ``'full'``, see
+        :py:func:`~owlpy.util.moving_sum`.
+    :type mode:
+        str
+
+    :returns:
+        Moving average as ``mean[..., iwindow]``.
+    :rtype:
+        :py:class:`numpy.ndarray`
+    '''
+
+    sums, count = moving_sum(x, n, mode=mode, return_counts=True)
+    return _normalise(sums, count)
+
+
+def _moments(x, n, mode):
+    # Remove the overall mean first, to avoid cancellation in the difference
+    # of the second moment and the squared mean. Sums of samples and of
+    # squares are computed in one pass.
+    x = np.asanyarray(x, dtype=float)
+    x, valid = _unmask(x - np.mean(x, axis=-1, keepdims=True))
+    sums = moving_sum(np.stack((x, x**2)), n, mode=mode)
+    return sums[0], sums[1], _valid_count(valid, x.shape[-1], n, mode)
+
+
+def moving_var(x, n, mode='valid', ddof=0):
+    '''
+    Get moving variance.
+
+    :param x:
+        Input as ``x[..., isample]``.
+    :type x:
+        :py:class:`numpy.ndarray`
+
+    :param n:
+        Window length [samples].
+    :type n:
+        int
+
+    :param mode:
+        ``'valid'``, ``'same'`` or ``'full'``, see
+        :py:func:`~owlpy.util.moving_sum`.
+    :type mode:
+        str
+
+    :param ddof:
+        Delta degrees of freedom, as in :py:func:`numpy.var`.
+    :type ddof:
+        int
+
+    :returns:
+        Moving variance as ``var[..., iwindow]``.
+    :rtype:
+        :py:class:`numpy.ndarray`
+    '''
+
+    s1, s2, count = _moments(x, n, mode)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s2 = np.maximum(s2 - s1**2 / count, 0.0)
+
+    return _normalise(s2, count, ddof)
+
+
+def moving_rms(x, n, mode='valid'):
+    '''
+    Get moving root mean square.
+
+    :param x:
+        Input as ``x[..., isample]``.
+    :type x:
+        :py:class:`numpy.ndarray`
+
+    :param n:
+        Window length [samples].
+    :type n:
+        int
+
+    :param mode:
+        ``'valid'``, ``'same'`` or ``'full'``, see
+        :py:func:`~owlpy.util.moving_sum`.
+    :type mode:
+        str
+
+    :returns:
+        Moving root mean square as ``rms[..., iwindow]``.
+    :rtype:
+        :py:class:`numpy.ndarray`
+    '''
+
+    x = np.asanyarray(x)
+    return np.sqrt(moving_mean(x**2, n, mode=mode))
+
+
+def moving_cov(x, n, mode='valid', ddof=0, center=True):
+    '''
+    Get moving covariance matrix.
+
+    :param x:
+        Input as ``x[..., icomponent, isample]``.
+    :type x:
+        :py:class:`numpy.ndarray`
+
+    :param n:
+        Window length [samples].
+    :type n:
+        int
+
+    :param mode:
+        ``'valid'``, ``'same'`` or ``'full'``, see
+        :py:func:`~owlpy.util.moving_sum`.
+    :type mode:
+        str
+
+    :param ddof:
+        Delta degrees of freedom, as in :py:func:`numpy.cov`.
+    :type ddof:
+        int
+
+    :param center:
+        If ``False``, the window means are not removed, giving mean products
+        instead of covariances.
+    :type center:
+        bool
+
+    :returns:
+        Moving covariance matrix as ``cov[..., i, j, iwindow]``.
+    :rtype:
+        :py:class:`numpy.ndarray`
+    '''
+
+    x = np.asanyarray(x, dtype=float)
+    ncomponents, nsamples = x.shape[-2:]
+    x, valid = _unmask(x, joint=True)
+    count = _valid_count(valid, nsamples, n, mode)
+
+    if not center:
+        i, j, products = _products(x)
+        s2 = _normalise(moving_sum(products, n, mode=mode), count, ddof)
+        return _unpack_products(s2, i, j, ncomponents)
+
+    if valid is None:
+        x = x - np.mean(x, axis=-1, keepdims=True)
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.sum(x, axis=-1, keepdims=True) \
+                / np.sum(valid, axis=-1, keepdims=True)
+
+        x = np.where(valid, x - mean, 0.0)
+
+    i, j, products = _products(x)
+
+    # sums of the components and of their products in one pass
+    sums = moving_sum(
+        np.concatenate((x, products), axis=-2), n, mode=mode)
+
+    s1 = sums[..., :ncomponents, :]
+    s2 = sums[..., ncomponents:, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s2 -= s1[..., i, :] * s1[..., j, :] / count
+
+    s2 = _normalise(s2, count, ddof)
+
+    # variances must not become negative due to rounding
+    diagonal = i == j
+    s2[..., diagonal, :] = np.maximum(s2[..., diagonal, :], 0.0)
+
+    return _unpack_products(s2, i, j, ncomponents)
+
+
+def moving_corrcoef(x, n, mode='valid', center=True):
+    '''
+    Get moving correlation coefficient matrix.
+
+    :param x:
+        Input as ``x[..., icomponent, isample]``.
+    :type x:
+        :py:class:`numpy.ndarray`
+
+    :param n:
+        Window length [samples].
+    :type n:
+        int
+
+    :param mode:
+        ``'valid'``, ``'same'`` or ``'full'``, see
+        :py:func:`~owlpy.util.moving_sum`.
+    :type mode:
+        str
+
+    :param center:
+        If ``False``, the window means are not removed, giving normalised
+        zero-lag cross-correlations.
+    :type center:
+        bool
+
+    :returns:
+        Moving correlation coefficients as ``corr[..., i, j, iwindow]``.
+        Windows with zero variance give NaN.
+    :rtype:
+        :py:class:`numpy.ndarray`
+    '''
+
+    cov = moving_cov(x, n, mode=mode, center=center)
+    ncomponents = cov.shape[-2]
+    std = np.sqrt(cov[..., np.arange(ncomponents), np.arange(ncomponents), :])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return cov / (std[..., :, np.newaxis, :] * std[..., np.newaxis, :, :])
+
+
+def _slice_full(y, nsamples, n, mode):
+    if mode == 'valid':
+        return y[..., n-1:nsamples]
+    elif mode == 'same':
+        n1 = (n - 1) // 2
+        return y[..., n1:n1+nsamples]
+    else:
+        return y
+
+
+def taper_window(n, window='hann', sigma=None):
+    '''
+    Get taper window weights.
+
+    :param n:
+        Window length [samples].
+    :type n:
+        int
+
+    :param window:
+        ``'boxcar'``, ``'hann'`` (as :py:func:`numpy.hanning`) or
+        ``'gaussian'``.
+    :type window:
+        str
+
+    :param sigma:
+        Standard deviation of the Gaussian window [samples]. Defaults to
+        ``n / 6``.
+    :type sigma:
+        float
+
+    :returns:
+        Window weights.
+    :rtype:
+        :py:class:`numpy.ndarray`
+    '''
+
+    if window == 'boxcar':
+        return np.ones(n)
+    elif window == 'hann':
+        return np.hanning(n)
+    elif window == 'gaussian':
+        sigma = n / 6. if sigma is None else sigma
+        return np.exp(-0.5 * ((np.arange(n) - 0.5 * (n - 1)) / sigma)**2)
+    else:
+        raise ValueError('Unknown window: %s' % window)
+
+
+def _hann_prefix(x, n):
+    # numpy.hanning(n)[j] = 0.5 - 0.5 * cos(theta * j), so the weighted sum
+    # is a boxcar sum minus the real part of a boxcar sum over the signal
+    # modulated with exp(-i theta m), demodulated at the window end.
+    nsamples = x.shape[-1]
+    if n == 1:
+        # numpy.hanning(1) is [1.]
+        return x.copy()
+
+    theta = 2.0 * np.pi / (n - 1)
+    phase = np.exp(1j * theta * np.arange(nsamples + n - 1))
+    sums = moving_sum(
+        np.stack((x + 0j, x * phase[:nsamples].conj())), n, mode='full')
+
+    return 0.5 * sums[0].real - 0.5 * (phase * sums[1]).real
+
+
+def moving_weighted_sum(
+        x, n, window='hann', mode='valid', method='fft', sigma=None):
+
+    '''
+    Get moving sum with a tapered window.
+
+    Like :py:func:`~owlpy.util.moving_sum` but weighting the samples in each
+    window with a taper, see :py:func:`taper_window`. This avoids the jumps
+    of boxcar window estimates when strong samples enter or leave the window.
+
+    :param x:
+        Input as ``x[..., isample]``.
+    :type x:
+        :py:class:`numpy.ndarray`
+
+    :param n:
+        Window length [samples].
+    :type n:
+        int
+
+    :param window:
+        ``'boxcar'``, ``'hann'`` or ``'gaussian'``.
+    :type window:
+        str
+
+    :param mode:
+        ``'valid'``, ``'same'`` or ``'full'``, see
+        :py:func:`~owlpy.util.moving_sum`.
+    :type mode:
+        str
+
+    :param method:
+        ``'fft'`` for convolution via FFT or ``'prefix'`` for prefix sums. The
+        latter is available for the boxcar and Hann windows, which it
+        evaluates with one prefix sum pass over the signal and a modulated
+        copy of it.
+    :type method:
+        str
+
+    :param sigma:
+        Standard deviation of the Gaussian window [samples].
+    :type sigma:
+        float
+
+    :returns:
+        Moving weighted sums as ``sums[..., iwindow]``. Masked samples do
+        not contribute.
+    :rtype:
+        :py:class:`numpy.ndarray`
+    '''
+
+    assert method in ('fft', 'prefix')
+    assert mode in ('valid', 'same', 'full')
+
+    x, _ = _unmask(np.asanyarray(x, dtype=float))
+    n = int(n)
+    nsamples = x.shape[-1]
+
+    if window == 'boxcar':
+        return moving_sum(x, n, mode=mode)
+
+    if method == 'prefix':
+        if window != 'hann':
+            raise ValueError(
+                'Prefix sum method not available for window: %s' % window)
+
+        y = _hann_prefix(x, n)
+
+    else:
+        w = taper_window(n, window, sigma=sigma)
+        nfull = nsamples + n - 1
+        nfft = 1 << (nfull - 1).bit_length()
+        y = np.fft.irfft(
+            np.fft.rfft(x, nfft, axis=-1) * np.fft.rfft(w, nfft),
+            nfft, axis=-1)[..., :nfull]
+
+    if mode == 'valid' and nsamples < n:
+        return np.zeros(x.shape[:-1] + (0,))
+
+    return _slice_full(y, nsamples, n, mode)
+
+
+class ExponentialMovingSum(object):
+    '''
+    Exponentially weighted moving sum for streams of samples.
+
+    Computes ``y[k] = decay * y[k-1] + x[k]`` with ``decay = exp(-1/n)``,
+    i.e. samples are weighted down with time constant ``n``. Only the last
+    output of each channel is kept between calls to :py:meth:`process`, so
+    the state does not grow with the record length.
+
+    Within each call, the recursion is evaluated in blocks with vectorized
+    scaled prefix sums.
+
+    :param n:
+        Time constant [samples].
+    :type n:
+        float
+    '''
+
+    def __init__(self, n):
+        self.decay = np.exp(-1.0 / n)
+        # keep the dynamic range of the scaled prefix sums within 1e8
+        self.nblock = max(1, int(8. * np.log(10.) * n))
+        self.reset()
+
+    def reset(self):
+        '''
+        Clear the state.
+        '''
+        self.state = None
+
+    def process(self, x):
+        '''
+        Process the next chunk of samples.
+
+        :param x:
+            Input as ``x[..., isample]``. The leading axes must be the same
+            in all calls.
+        :type x:
+            :py:class:`numpy.ndarray`
+
+        :returns:
+            Exponentially weighted moving sums, same shape as ``x``.
+        :rtype:
+            :py:class:`numpy.ndarray`
+        '''
+
+        x = np.asarray(x, dtype=float)
+        if self.state is None:
+            self.state = np.zeros(x.shape[:-1])
+
+        nsamples = x.shape[-1]
+        if nsamples == 0:
+            return x.copy()
+
+        nblock = min(self.nblock, nsamples)
+        nblocks = -(-nsamples // nblock)
+        xb = np.zeros(x.shape[:-1] + (nblocks * nblock,))
+        xb[..., :nsamples] = x
+        xb = xb.reshape(x.shape[:-1] + (nblocks, nblock))
+
+        k = np.arange(nblock)
+        down = self.decay**k
+        y = np.cumsum(xb / down, axis=-1)
+        y *= down
+
+        # carry the state from block to block
+        carry = np.empty(x.shape[:-1] + (nblocks,))
+        state = self.state
+        decay_block = self.decay**nblock
+        for iblock in range(nblocks):
+            carry[..., iblock] = state
+            state = decay_block * state + y[..., iblock, -1]
+
+        y += carry[..., np.newaxis] * (down * self.decay)
+        y = y.reshape(x.shape[:-1] + (nblocks * nblock,))[..., :nsamples]
+
+        self.state = y[..., -1].copy()
+        return y
+
+
+def exponential_moving_sum(x, n):
+    '''
+    Get exponentially weighted moving sum.
+
+    See :py:class:`ExponentialMovingSum`.
+
+    :param x:
+        Input as ``x[..., isample]``.
+    :type x:
+        :py:class:`numpy.ndarray`
+
+    :param n:
+        Time constant [samples].
+    :type n:
+        float
+
+    :returns:
+        Exponentially weighted moving sums, same shape as ``x``.
+    :rtype:
+        :py:class:`numpy.ndarray`
+    '''
+    return ExponentialMovingSum(n).process(x)
@@ -6,3 +6,29 @@
 #
 # The OwlPy Developers, 21st century
 # -----------------------------------------------------------------------------
+
+'''
+Polarisation analysis.
+
+Submodules are loaded on first attribute access.
+'''
+
+import importlib
+
+_submodules = (
+    'gridsearch',
+    'pca',
+)
+
+
+def __getattr__(name):
+    # import submodules on first access, keeping the package import cheap
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+
+    raise AttributeError(
+        'module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules))
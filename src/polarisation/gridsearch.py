@@ -9,12 +9,15 @@
 
 import numpy as np
 
-from owlpy.util import get_traces_data_as_array, arange2, moving_sum
+from owlpy.util import get_traces_data_as_array, arange2, _unpack_trace
+from owlpy.moving import moving_products, moving_weighted_sum
 
 d2r = np.pi / 180.
 
 
-def gridsearch_azimuth_rot_acc(traces, time_sum, azimuth_delta=5.):
+def gridsearch_azimuth_rot_acc(
+        traces, time_sum, azimuth_delta=5., window='boxcar',
+        min_coverage=0.5):
 
     '''
     Get direction of SH/Love waves from rotational and acceleration waveforms.
@@ -25,7 +28,8 @@ def gridsearch_azimuth_rot_acc(traces, time_sum, azimuth_delta=5.):
         Waveforms of the signals to be analysed. Components are expected in the
         order and polarity ``[rotation_rate_down, accelaration_north,
         acceleration_east]``. The traces must be of same length, sampling rate
-        and data type.
+        and data type. Gaps, i.e. masked samples as in merged ObsPy traces,
+        are excluded from the analysis.
     :type traces:
         list of :py:class:`obspy.Trace <obspy.core.trace.Trace>`
         or :py:class:`pyrocko.Trace <pyrocko.trace.Trace>` objects
@@ -40,6 +44,19 @@ def gridsearch_azimuth_rot_acc(traces, time_sum, azimuth_delta=5.):
     :type azimuth_delta:
         float
 
+    :param window:
+        Taper of the gliding window, ``'boxcar'``, ``'hann'`` or
+        ``'gaussian'``. Tapered windows give smoother azimuth estimates.
+    :type window:
+        str
+
+    :param min_coverage:
+        Minimum fraction of valid samples in a window, weighted with the
+        window taper. Windows below are marked invalid with NaN correlations
+        and azimuths. Only relevant if samples are masked.
+    :type min_coverage:
+        float
+
     :raises:
         :py:exc:`~owlpy.error.OwlPyError` if the input traces are
         incompatible.
@@ -47,30 +64,58 @@ def gridsearch_azimuth_rot_acc(traces, time_sum, azimuth_delta=5.):
 
     trace_rot_z, trace_acc_n, trace_acc_e = traces
 
-    data = get_traces_data_as_array([trace_rot_z, trace_acc_n, trace_acc_e])
-    deltat = trace_rot_z.deltat
+    data = get_traces_data_as_array(
+        [trace_rot_z, trace_acc_n, trace_acc_e], copy=False)
+    _, deltat, tmin = _unpack_trace(trace_rot_z)
 
     irotz, iaccn, iacce = 0, 1, 2
     nsamples = data.shape[1]
     azimuths = arange2(0., 360. - azimuth_delta, azimuth_delta)
-    grid = np.zeros((azimuths.size, 2, nsamples))
-    for iazimuth, azimuth in enumerate(azimuths):
-        data_rot = data[irotz, :]
-        data_acc_t = -data[iaccn, :] * np.sin(azimuth*d2r) \
-            + data[iacce, :] * np.cos(azimuth*d2r)
-        grid[iazimuth, 0, :] = data_rot * data_acc_t
-        grid[iazimuth, 1, :] = data_acc_t**2
 
     nsum = int(np.round(time_sum / deltat))
 
-    sgrid = moving_sum(grid, nsum, mode='same')
-    srotz = moving_sum(data[irotz, :]**2, nsum, mode='same')
-    grid_correlations = sgrid[:, 0, :] \
-        / (np.sqrt(sgrid[:, 1, :]) * np.sqrt(srotz)[np.newaxis, :])
+    if np.ma.isMaskedArray(data):
+        # Fraction of the (tapered) window weight on samples valid in all
+        # components. Windows reaching past the ends of the record are
+        # compared against their part inside it.
+        valid = ~np.any(np.ma.getmaskarray(data), axis=0)
+        weights = moving_weighted_sum(
+            np.stack((valid, np.ones(nsamples))), nsum, window=window,
+            mode='same')
+
+        coverage = weights[0] / weights[1]
+        invalid = coverage < min_coverage - 1e-9
+    else:
+        invalid = None
+
+    # The transverse acceleration is linear in north and east acceleration,
+    # so its windowed products follow from the windowed products of the
+    # three input components, for all azimuths at once.
+    products = moving_products(data, nsum, mode='same', window=window)
+    s_rr = products[irotz, irotz]
+    s_rn = products[irotz, iaccn]
+    s_re = products[irotz, iacce]
+    s_nn = products[iaccn, iaccn]
+    s_ne = products[iaccn, iacce]
+    s_ee = products[iacce, iacce]
+
+    sin = np.sin(azimuths*d2r)[:, np.newaxis]
+    cos = np.cos(azimuths*d2r)[:, np.newaxis]
+    s_rt = -sin * s_rn + cos * s_re
+    s_tt = sin**2 * s_nn - 2.0 * sin * cos * s_ne + cos**2 * s_ee
+
+    grid_correlations = s_rt \
+        / (np.sqrt(np.maximum(s_tt, 0.0)) * np.sqrt(s_rr)[np.newaxis, :])
+
+    if invalid is not None:
+        grid_correlations[:, invalid] = np.nan
 
     max_indices = np.argmax(grid_correlations, axis=0)
     max_correlations = grid_correlations[max_indices, np.arange(nsamples)]
     max_azimuths = azimuths[max_indices]
 
-    times = trace_rot_z.tmin + np.arange(nsamples) * deltat
+    if invalid is not None:
+        max_azimuths[invalid] = np.nan
+
+    times = tmin + np.arange(nsamples) * deltat
     return times, azimuths, grid_correlations, max_azimuths, max_correlations
@@ -31,14 +31,16 @@ def pca(traces):
     :param traces:
         Waveforms of the signals to be analysed. Components are expected in the
         order and polarity ``[east, north]`` or ``[east, north, up]``. The
-        traces must be of same length, sampling rate and data type.
+        traces must be of same length, sampling rate and data type. Samples
+        masked in any trace, e.g. gaps of merged ObsPy traces, are excluded.
     :type traces:
         list of :py:class:`obspy.Trace <obspy.core.trace.Trace>`
         or :py:class:`pyrocko.Trace <pyrocko.trace.Trace>` objects
 
     :raises:
         :py:exc:`~owlpy.error.OwlPyError` if the input traces are
-        incompatible, :py:exc:`PCAError` if the traces are too short.
+        incompatible, :py:exc:`PCAError` if the traces have less than two
+        valid samples.
 
     :returns:
         ``(cov, evals, evecs, azimuth, incidence)`` where ``cov`` is the
@@ -61,7 +63,14 @@ def pca(traces):
     cannot be determined from the PCA alone.
     '''
 
-    data = get_traces_data_as_array(traces)
+    data = get_traces_data_as_array(traces, copy=False)
+    if np.ma.isMaskedArray(data):
+        data = np.ma.getdata(data)[
+            :, ~np.any(np.ma.getmaskarray(data), axis=0)]
+
+    if data.shape[1] < 2:
+        raise PCAError(
+            'Need at least two valid samples, got %i.' % data.shape[1])
 
     cov = np.cov(data)
 
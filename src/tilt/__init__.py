@@ -0,0 +1,44 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Tilt correction and tilt-table experiments.
+
+Submodules are loaded on first attribute access.
+'''
+
+import importlib
+
+_submodules = (
+    'cache',
+    'correction',
+    'detect',
+    'geometry',
+    'orientation',
+    'preprocess',
+    'runner',
+    'segments',
+    'spectral',
+    'streaming',
+    'sweep',
+    'util',
+)
+
+
+def __getattr__(name):
+    # import submodules on first access, keeping the package import cheap
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+
+    raise AttributeError(
+        'module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules))
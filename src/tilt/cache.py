@@ -0,0 +1,276 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Persistent on-disk cache for tilt transfer functions and coherences.
+'''
+
+import os
+import glob
+import hashlib
+import tempfile
+
+import numpy as np
+
+from owlpy.tilt.correction import _get_nfft, transfer_function
+
+
+def _resample(x, freq_in, freq_out):
+    return np.interp(freq_out, freq_in, x.real) \
+        + 1j * np.interp(freq_out, freq_in, x.imag)
+
+
+class TransferFunctionCache(object):
+    '''
+    Store and reuse transfer functions and coherences across runs.
+
+    Entries are keyed by station/channel identifiers, sampling interval, FFT
+    length and smoothing window length. Each entry is stored as a ``.npy``
+    file containing the array ``[Ars, coh]`` so that it can be loaded
+    memory-mapped. If the total size of the cache exceeds ``max_size``, least
+    recently used entries are evicted. Entries are resampled by linear
+    interpolation if a different FFT length is requested, e.g. for a record of
+    different length.
+
+    The transfer functions and coherences returned can be passed as
+    ``trans_coh`` to :py:func:`~owlpy.tilt.correction.remove_tilt`.
+
+    :param path:
+        Cache directory. Created if it does not exist.
+    :type path:
+        str
+
+    :param max_size:
+        Maximum total size of the cache [bytes]. ``None`` means unlimited.
+    :type max_size:
+        :py:class:`int` or ``None``
+
+    :param dtype:
+        Data type used for storage.
+    :type dtype:
+        :py:class:`numpy.dtype` or str
+    '''
+
+    def __init__(self, path, max_size=None, dtype='complex64'):
+        self.path = path
+        self.max_size = max_size
+        self.dtype = np.dtype(dtype)
+        os.makedirs(path, exist_ok=True)
+
+    def _key(self, codes, dt, smooth):
+        if isinstance(codes, str):
+            codes = (codes,)
+
+        s = '%s %.9g %.9g' % ('.'.join(str(c) for c in codes), dt, smooth)
+        return hashlib.sha1(s.encode('utf8')).hexdigest()
+
+    def _filename(self, key, nfft):
+        return os.path.join(self.path, '%s_%i.npy' % (key, nfft))
+
+    def _entries(self, key):
+        entries = []
+        for fn in glob.glob(os.path.join(self.path, '%s_*.npy' % key)):
+            nfft = int(os.path.basename(fn)[len(key)+1:-4])
+            entries.append((nfft, fn))
+
+        return sorted(entries)
+
+    def put(self, codes, dt, smooth, Ars, coh):
+        '''
+        Store transfer function and coherence.
+
+        :param codes:
+            Station/channel identifiers, e.g. ``('XX', 'BS1', '', 'HJE')``.
+        :type codes:
+            :py:class:`str` or :py:class:`tuple` of :py:class:`str`
+
+        :param dt:
+            Sampling interval [s].
+        :type dt:
+            float
+
+        :param smooth:
+            Size of the Blackman window used for smoothing [Hz].
+        :type smooth:
+            float
+
+        :param Ars:
+            Transfer function as returned by
+            :py:func:`~owlpy.tilt.correction.transfer_function`.
+        :type Ars:
+            numpy.ndarray
+
+        :param coh:
+            Complex coherence as returned by
+            :py:func:`~owlpy.tilt.correction.transfer_function`.
+        :type coh:
+            numpy.ndarray
+        '''
+
+        assert Ars.shape == coh.shape
+        nfft = 2 * (Ars.size - 1)
+        fn = self._filename(self._key(codes, dt, smooth), nfft)
+
+        fd, fn_temp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.array([Ars, coh], dtype=self.dtype))
+
+            os.replace(fn_temp, fn)
+
+        except Exception:
+            os.unlink(fn_temp)
+            raise
+
+        self._evict(keep=fn)
+
+    def get(self, codes, dt, nfft, smooth, mmap=True):
+        '''
+        Get transfer function and coherence from the cache.
+
+        If no entry with the requested FFT length is available, an entry with
+        different FFT length is resampled, preferring the next larger one.
+
+        :param codes:
+            Station/channel identifiers, as used with :py:meth:`put`.
+
+        :param dt:
+            Sampling interval [s].
+        :type dt:
+            float
+
+        :param nfft:
+            FFT length, see :py:func:`get_nfft`.
+        :type nfft:
+            int
+
+        :param smooth:
+            Size of the Blackman window used for smoothing [Hz].
+        :type smooth:
+            float
+
+        :param mmap:
+            Whether to memory-map the stored arrays.
+        :type mmap:
+            bool
+
+        :returns:
+            ``(Ars, coh)`` or ``None`` if no entry is available.
+        '''
+
+        key = self._key(codes, dt, smooth)
+        entries = self._entries(key)
+        if not entries:
+            return None
+
+        exact = dict(entries).get(nfft)
+        if exact is not None:
+            fn = exact
+        else:
+            larger = [e for e in entries if e[0] > nfft]
+            fn = larger[0][1] if larger else entries[-1][1]
+
+        try:
+            os.utime(fn)
+            data = np.load(fn, mmap_mode='r' if mmap else None)
+        except FileNotFoundError:
+            # evicted concurrently
+            return None
+
+        Ars, coh = data[0], data[1]
+
+        if exact is None:
+            freq_in = np.fft.rfftfreq(2 * (Ars.size - 1), dt)
+            freq_out = np.fft.rfftfreq(nfft, dt)
+            Ars = _resample(Ars, freq_in, freq_out)
+            coh = _resample(coh, freq_in, freq_out)
+
+        return Ars, coh
+
+    def get_or_compute(self, codes, response, source, dt, smooth):
+        '''
+        Get transfer function and coherence, computing them if needed.
+
+        If not available in the cache, they are calculated with
+        :py:func:`~owlpy.tilt.correction.transfer_function` and stored.
+
+        :returns:
+            ``(Ars, coh)``, matching the spectra of ``response`` and
+            ``source``.
+        '''
+
+        nfft = get_nfft(response.size)
+        trans_coh = self.get(codes, dt, nfft, smooth)
+        if trans_coh is None:
+            Ars, coh = transfer_function(response, source, dt, smooth)[-2:]
+            self.put(codes, dt, smooth, Ars, coh)
+            trans_coh = Ars, coh
+
+        return trans_coh
+
+    def size(self):
+        '''
+        Get total size of the cache [bytes].
+        '''
+        return sum(
+            os.path.getsize(fn)
+            for fn in glob.glob(os.path.join(self.path, '*.npy')))
+
+    def clear(self):
+        '''
+        Remove all entries from the cache.
+        '''
+        for fn in glob.glob(os.path.join(self.path, '*.npy')):
+            os.unlink(fn)
+
+    def _evict(self, keep=None):
+        if self.max_size is None:
+            return
+
+        entries = []
+        for fn in glob.glob(os.path.join(self.path, '*.npy')):
+            try:
+                stat = os.stat(fn)
+            except FileNotFoundError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, fn))
+
+        entries.sort()
+        total = sum(size for (_, size, _) in entries)
+        for (_, size, fn) in entries:
+            if total <= self.max_size:
+                break
+
+            if fn == keep:
+                continue
+
+            try:
+                os.unlink(fn)
+            except FileNotFoundError:
+                pass
+
+            total -= size
+
+
+def get_nfft(ndat):
+    '''
+    Get FFT length used by the tilt correction for signals of given length.
+
+    :param ndat:
+        Number of samples.
+    :type ndat:
+        int
+
+    :returns:
+        FFT length.
+    :rtype:
+        int
+    '''
+    return _get_nfft(ndat)
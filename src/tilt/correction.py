@@ -28,7 +28,257 @@ def _nearest_pow2(x):
         return b
 
 
-def transfer_function(response, source, dt, smooth):
+def _get_nfft(ndat):
+    '''
+    Get FFT length used for zero-padded spectra of signals with ndat samples.
+    '''
+    return int(_nearest_pow2(ndat)) * 2
+
+
+def _get_nsmooth(smooth, freq):
+    return int(round(smooth/(freq[1] - freq[0])))
+
+
+def _get_fft_single():
+    '''
+    Get module with real FFTs in single precision, ``None`` if unavailable.
+
+    NumPy computes FFTs in double precision before version 2, SciPy is used
+    in that case, if installed.
+    '''
+
+    if int(np.__version__.split('.')[0]) >= 2:
+        return np.fft
+
+    try:
+        import scipy.fft
+        return scipy.fft
+    except ImportError:
+        return None
+
+
+def _rfft(x, nfft, low_memory=False):
+    '''
+    Get spectrum, in single precision if requested and applicable.
+    '''
+
+    if low_memory and x.dtype == np.float32:
+        fft = _get_fft_single()
+        if fft is not None:
+            return fft.rfft(x, nfft)
+
+        return np.fft.rfft(x, nfft).astype(np.complex64)
+
+    return np.fft.rfft(x, nfft)
+
+
+def _irfft(X):
+    '''
+    Get inverse of spectrum, in single precision for ``complex64`` input.
+    '''
+
+    if X.dtype == np.complex64:
+        fft = _get_fft_single()
+        if fft is not None:
+            return fft.irfft(X)
+
+        return np.fft.irfft(X).astype(np.float32)
+
+    return np.fft.irfft(X)
+
+
+def _power(X):
+    '''
+    Get real-valued power of complex spectrum.
+    '''
+    P = np.square(X.real)
+    P += np.square(X.imag)
+    return P
+
+
+_quantity_orders = {
+    'displacement': 0,
+    'velocity': 1,
+    'acceleration': 2,
+    'angle': 0,
+    'rotation_rate': 1}
+
+
+def _get_quantity_order(quantity, choices):
+    if quantity not in choices:
+        raise ValueError(
+            'Invalid quantity: %s, choices: %s' % (
+                quantity, ', '.join(choices)))
+
+    return _quantity_orders[quantity]
+
+
+def _convert_spectrum(X, freq, nderivative):
+    '''
+    Differentiate (positive) or integrate (negative) spectrum in-place.
+
+    The zero-frequency component is set to zero when integrating.
+    '''
+
+    if nderivative == 0:
+        return X
+
+    # in the precision of the spectrum
+    iomega = 2.0j * np.pi * freq.astype(X.real.dtype, copy=False)
+    if nderivative > 0:
+        factor = iomega**nderivative
+    else:
+        factor = np.zeros_like(iomega)
+        factor[1:] = iomega[1:]**nderivative
+
+    X *= factor
+    return X
+
+
+def _smooth(x, nsmooth):
+    '''
+    Smooth spectra by convolution with a Blackman window along the last axis.
+
+    Same as ``numpy.convolve(x, numpy.blackman(nsmooth), mode='same')`` for
+    1D input, but also works on stacks of spectra, where the convolution is
+    done with one vectorized operation per window coefficient. Input is
+    returned unchanged if ``nsmooth`` is zero. The precision of the input is
+    preserved.
+    '''
+
+    if nsmooth == 0:
+        return x
+
+    w = np.blackman(nsmooth).astype(np.finfo(x.dtype).dtype)
+    if x.ndim == 1:
+        return np.convolve(x, w, mode='same')
+
+    n = x.shape[-1]
+    npad = nsmooth - 1 - (nsmooth - 1) // 2
+    xpad = np.zeros(x.shape[:-1] + (n + nsmooth - 1,), dtype=x.dtype)
+    xpad[..., npad:npad+n] = x
+
+    y = np.zeros_like(x)
+    temp = np.empty_like(x)
+    for iw in range(nsmooth):
+        i = nsmooth - 1 - iw
+        np.multiply(xpad[..., i:i+n], w[iw], out=temp)
+        y += temp
+
+    return y
+
+
+def _spectral_estimates(Gr, Gs, nsmooth):
+    '''
+    Get auto-spectra, transfer function and coherence from given spectra.
+
+    Works on single spectra as well as on stacks of spectra (last axis is
+    frequency). Auto-spectra are real-valued. The precision of the input
+    spectra is preserved and operations are done in-place where possible to
+    keep the number of full-length temporaries low.
+    '''
+
+    # calculate autospectral and crossspectral densities
+    Grs = Gr * Gs.conjugate()
+    Grr = _power(Gr)
+    Gss = _power(Gs)
+
+    Crs_smooth = _smooth(Grs, nsmooth)
+    del Grs
+
+    # Crs_smooth = Grs_smooth / sqrt(Grr_smooth * Gss_smooth)
+    norm = _smooth(Grr, nsmooth)
+    norm *= _smooth(Gss, nsmooth)
+    np.sqrt(norm, out=norm)
+    Crs_smooth /= norm
+    del norm
+
+    # calculate transfer function: Ars = Crs_smooth * sqrt(Grr / Gss)
+    ratio = Grr / Gss
+    np.sqrt(ratio, out=ratio)
+    Ars = Crs_smooth * ratio
+
+    return Grr, Gss, Ars, Crs_smooth
+
+
+def _get_band_slice(freq, fmin, fmax):
+    '''
+    Get slice of frequency bins with ``fmin <= freq <= fmax``.
+    '''
+
+    i0 = 0 if fmin is None else int(np.searchsorted(freq, fmin, 'left'))
+    i1 = freq.size if fmax is None \
+        else int(np.searchsorted(freq, fmax, 'right'))
+
+    if i1 <= i0:
+        raise ValueError(
+            'No frequencies in the selected band: fmin=%s, fmax=%s.' % (
+                fmin, fmax))
+
+    return slice(i0, i1)
+
+
+def _band_spectral_estimates(Gr, Gs, band, nsmooth):
+    '''
+    Get spectral estimates, evaluated only in the given band of frequencies.
+
+    The estimates are computed on the band, extended by a margin for the
+    smoothing, so that they are identical to estimates computed on all
+    frequencies.
+    '''
+
+    n = Gr.shape[-1]
+    i0, i1 = band.start, band.stop
+    j0, j1 = max(0, i0 - nsmooth), min(n, i1 + nsmooth)
+
+    return tuple(
+        x[..., i0-j0:i1-j0]
+        for x in _spectral_estimates(
+            Gr[..., j0:j1], Gs[..., j0:j1], nsmooth))
+
+
+def _correct_spectra(
+        Gr, Gs, freq, Ars, coh, fmin, fmax, sign, threshold, g, method):
+
+    '''
+    Get corrected response spectra.
+
+    Works on single spectra as well as on stacks of spectra (last axis is
+    frequency). The given response spectra ``Gr`` are overwritten.
+    '''
+
+    if method == 'coh':
+        mask = np.abs(coh) >= threshold
+        if fmin is not None:
+            mask[..., freq < fmin] = False
+
+        if fmax is not None:
+            mask[..., freq > fmax] = False
+
+        # mask may have more dimensions than Gs, e.g. for a single source
+        # spectrum shared by several response channels
+        corr = np.empty(
+            np.broadcast_shapes(Gs.shape, mask.shape), dtype=Gs.dtype)
+        np.multiply(Gs, mask, out=corr)
+        corr *= sign * g
+
+    elif method == 'freq':
+        corr = np.conjugate(Ars)
+        corr *= Gs
+        corr *= sign
+
+    else:
+        raise ValueError('Invalid `method` argument: %s' % method)
+
+    Gr -= corr
+    return Gr
+
+
+def transfer_function(
+        response, source, dt, smooth,
+        low_memory=False,
+        fmin=None,
+        fmax=None):
     '''
     Calculate transfer function and complex coherence between two signals.
 
@@ -59,11 +309,29 @@ def transfer_function(response, source, dt, smooth):
     :type smooth:
         float
 
+    :param low_memory:
+        If ``True`` and the input signals are single precision, the spectral
+        estimates are computed in single precision (``complex64``).
+    :type low_memory:
+        bool
+
+    :param fmin:
+        If given, evaluate spectral estimates only for frequencies ``>=
+        fmin`` [Hz].
+    :type fmin:
+        :py:class:`float` or ``None``
+
+    :param fmax:
+        If given, evaluate spectral estimates only for frequencies ``<=
+        fmax`` [Hz].
+    :type fmax:
+        :py:class:`float` or ``None``
+
     :returns:
         (``freq``, ``XX``, ``YY``, ``Ars``, ``coh``)
         ``freq``: array of frequencies
-        ``Grr``: autospectral density of response signal,
-        ``Gss``: autospectral density of source signal,
+        ``Grr``: real-valued autospectral density of response signal,
+        ``Gss``: real-valued autospectral density of source signal,
         ``Ars``: source to response transfer function,
         ``coh``: smoothed complex coherence between source and response signal
 
@@ -74,40 +342,19 @@ def transfer_function(response, source, dt, smooth):
     assert response.size == source.size
     ndat = response.size
 
-    nfft = int(_nearest_pow2(ndat))
-    nfft *= 2
-    gr = np.zeros(nfft)
-    gs = np.zeros(nfft)
-    gr[:ndat] = response
-    gs[:ndat] = source
+    nfft = _get_nfft(ndat)
 
     # perform ffts
-    Gr = np.fft.rfft(gr)*dt
-    Gs = np.fft.rfft(gs)*dt
+    Gr = _rfft(response, nfft, low_memory)
+    Gr *= dt
+    Gs = _rfft(source, nfft, low_memory)
+    Gs *= dt
     freq = np.fft.rfftfreq(nfft, dt)
 
-    # calculate autospectral and crossspectral densities
-    Grs = (Gr*Gs.conjugate())
-    Grr = (Gr*Gr.conjugate())
-    Gss = (Gs*Gs.conjugate())
-
-    nsmooth = int(round(smooth/(freq[1] - freq[0])))
-    if nsmooth != 0:
-        w = np.blackman(nsmooth)
-        Grs_smooth = np.convolve(Grs, w, mode='same')
-        Grr_smooth = np.convolve(Grr, w, mode='same')
-        Gss_smooth = np.convolve(Gss, w, mode='same')
-    else:
-        Grs_smooth = Grs
-        Grr_smooth = Grr
-        Gss_smooth = Gss
-
-    Crs_smooth = Grs_smooth / np.sqrt(Grr_smooth * Gss_smooth)
-
-    # calculate transfer function
-    Ars = Crs_smooth * np.sqrt(Grr / Gss)
+    nsmooth = _get_nsmooth(smooth, freq)
+    band = _get_band_slice(freq, fmin, fmax)
 
-    return freq, Grr, Gss, Ars, Crs_smooth
+    return (freq[band],) + _band_spectral_estimates(Gr, Gs, band, nsmooth)
 
 
 def remove_tilt(
@@ -119,7 +366,12 @@ def remove_tilt(
         smooth=1.0,
         g=9.81,
         method='coh',
-        trans_coh=None):
+        trans_coh=None,
+        low_memory=False,
+        quantity_response='acceleration',
+        quantity_source='angle',
+        quantity_output='acceleration',
+        zoom=False):
 
     '''
     Remove tilt noise from translational accelerometer recordings.
@@ -198,12 +450,58 @@ def remove_tilt(
         size of the spectra of ``source`` and ``response`` (the same
         zero-padding has to be applied). If set to ``None``, it is computed
         from ``response`` and ``source`` using
-        :py:func:`tilt_utils.transfer_function`.
+        :py:func:`tilt_utils.transfer_function`. The given transfer function
+        must relate acceleration to angle, regardless of the quantities given
+        with ``quantity_response`` and ``quantity_source``.
     :type trans_coh:
         (:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`) or ``None``
 
+    :param low_memory:
+        If ``True`` and the input signals are single precision, all spectral
+        computations are done in single precision (``complex64``) and the
+        corrected signal is returned in single precision. With NumPy < 2,
+        the FFTs of SciPy are used for this, if available.
+    :type low_memory:
+        bool
+
+    :param quantity_response:
+        Physical quantity of ``response``: ``'displacement'`` [m],
+        ``'velocity'`` [m/s] or ``'acceleration'`` [m/s**2]. Conversion to
+        acceleration is done by multiplication of the spectrum, which assumes
+        that the signal is tapered to zero at its ends. In
+        the ``'direct'`` method, only ``'acceleration'`` is supported.
+    :type quantity_response:
+        str
+
+    :param quantity_source:
+        Physical quantity of ``source``: ``'angle'`` [rad] or
+        ``'rotation_rate'`` [rad/s]. Conversion to angle is done by division
+        of the spectrum. In the ``'direct'`` method, only ``'angle'`` is
+        supported.
+    :type quantity_source:
+        str
+
+    :param quantity_output:
+        Physical quantity of the returned signal, choices as for
+        ``quantity_response``.
+    :type quantity_output:
+        str
+
+    :param zoom:
+        If ``True``, spectral estimates are only evaluated in the band
+        selected with ``fmin`` and ``fmax`` and the correction is only applied
+        in this band, also with the ``'freq'`` method. The given
+        ``trans_coh`` must then match the band, as returned by
+        :py:func:`transfer_function` with the same ``fmin`` and ``fmax``.
+        Useful to save computations when only a narrow band at long periods
+        needs correction.
+    :type zoom:
+        bool
+
     :returns:
-        Data samples of corrected accelerometer signal [m/s**2].
+        Data samples of corrected accelerometer signal [m/s**2], or of
+        corrected displacement [m] or velocity [m/s], depending on
+        ``quantity_output``.
     :rtype:
         numpy.ndarray
     '''
@@ -211,42 +509,518 @@ def remove_tilt(
     assert response.size == source.size
     assert method in ('direct', 'coh', 'freq')
 
+    translation_choices = ('displacement', 'velocity', 'acceleration')
+    order_response = _get_quantity_order(
+        quantity_response, translation_choices)
+    order_source = _get_quantity_order(
+        quantity_source, ('angle', 'rotation_rate'))
+    order_output = _get_quantity_order(quantity_output, translation_choices)
+
     sign = 1.0 if parallel else -1.0
 
     if method == 'direct':
+        if (order_response, order_source, order_output) != (2, 0, 2):
+            raise ValueError(
+                'Conversion of physical quantities is not available with '
+                'method "direct".')
+
         return response - sign * g * np.sin(source)
 
     ndat = response.size
 
-    nfft = int(_nearest_pow2(ndat))
-    nfft *= 2
+    nfft = _get_nfft(ndat)
+
+    Gr = _rfft(response, nfft, low_memory)
+    Gs = _rfft(source, nfft, low_memory)
+    freq = np.fft.rfftfreq(nfft, dt)
+
+    # convert to acceleration and angle
+    _convert_spectrum(Gr, freq, 2 - order_response)
+    _convert_spectrum(Gs, freq, -order_source)
+
+    if zoom:
+        band = _get_band_slice(freq, fmin, fmax)
+    else:
+        band = slice(0, freq.size)
 
     if trans_coh is None:
-        Ars, coh = transfer_function(response, source, dt, smooth)[-2:]
+        # transfer function and coherence do not depend on the scaling of the
+        # spectra, so the spectra can be reused here
+        nsmooth = _get_nsmooth(smooth, freq)
+        if order_response == 2 and order_source == 0:
+            Ars, coh = _band_spectral_estimates(Gr, Gs, band, nsmooth)[-2:]
+        else:
+            # zero-frequency component is lost by differentiation of the
+            # response or integration of the source
+            with np.errstate(divide='ignore', invalid='ignore'):
+                Ars, coh = _band_spectral_estimates(
+                    Gr, Gs, band, nsmooth)[-2:]
+
+            if band.start == 0:
+                Ars[0] = coh[0] = 0.0
     else:
         Ars, coh = trans_coh
 
-    Gr = np.fft.rfft(response, nfft)
-    Gs = np.fft.rfft(source, nfft)
+    assert Ars.shape == Gr[band].shape
+    assert coh.shape == Gr[band].shape
+
+    # corrects Gr in-place through the view
+    _correct_spectra(
+        Gr[band], Gs[band], freq[band], Ars, coh, fmin, fmax, sign, threshold,
+        g, method)
+
+    del Gs, Ars, coh
+
+    return _irfft(_convert_spectrum(Gr, freq, order_output - 2))[:ndat]
+
+
+def _get_frames(x, nwin, nhop, nwindows):
+    '''
+    Get overlapping windows of a signal as 2D array ``frames[iwindow, i]``.
+
+    The signal is zero-padded at the end, if needed, so that the windows cover
+    all samples.
+    '''
+
+    npadded = (nwindows - 1) * nhop + nwin
+    if npadded != x.size:
+        xpad = np.zeros(npadded, dtype=x.dtype)
+        xpad[:x.size] = x
+    else:
+        xpad = x
+
+    return np.lib.stride_tricks.sliding_window_view(xpad, nwin)[::nhop]
+
+
+def _get_window_layout(ndat, dt, twin, overlap):
+    assert 0.0 <= overlap < 1.0
+
+    nwin = min(ndat, max(2, int(round(twin / dt))))
+    nhop = max(1, int(round(nwin * (1.0 - overlap))))
+    nwindows = max(0, int(math.ceil((ndat - nwin) / nhop))) + 1
+    return nwin, nhop, nwindows
+
+
+def transfer_function_sliding(response, source, dt, smooth, twin, overlap=0.5):
+    '''
+    Calculate time-varying transfer function and coherence between two signals.
+
+    Short-time version of :py:func:`transfer_function`. The signals are cut
+    into overlapping windows of length ``twin`` and the spectral estimates are
+    computed for each window. All windows are processed together with stacked
+    FFTs.
+
+    :param response:
+        Sample data of the response signal.
+    :type response:
+        numpy.ndarray
+
+    :param source:
+        Sample data of the source signal.
+    :type source:
+        numpy.ndarray
+
+    :param dt:
+        Sampling interval [s].
+    :type dt:
+        float
+
+    :param smooth:
+        Size of the Blackman window used for smoothing [Hz].
+    :type smooth:
+        float
+
+    :param twin:
+        Length of the analysis windows [s].
+    :type twin:
+        float
+
+    :param overlap:
+        Fraction of overlap between neighbouring windows, in the range
+        ``[0, 1)``.
+    :type overlap:
+        float
+
+    :returns:
+        (``times``, ``freq``, ``Grr``, ``Gss``, ``Ars``, ``coh``)
+        ``times``: center times of the windows, relative to the first sample
+        [s], ``freq``: array of frequencies, ``Grr``, ``Gss``, ``Ars``,
+        ``coh``: as in :py:func:`transfer_function` but as 2D arrays with
+        shape ``(times.size, freq.size)``.
+
+    :rtype:
+        6-:py:class:`tuple` of :py:class:`numpy.ndarray`
+    '''
+
+    assert response.size == source.size
+
+    nwin, nhop, nwindows = _get_window_layout(
+        response.size, dt, twin, overlap)
+
+    nfft = _get_nfft(nwin)
+
+    Gr = np.fft.rfft(_get_frames(response, nwin, nhop, nwindows), nfft)*dt
+    Gs = np.fft.rfft(_get_frames(source, nwin, nhop, nwindows), nfft)*dt
     freq = np.fft.rfftfreq(nfft, dt)
+    times = (np.arange(nwindows) * nhop + 0.5 * (nwin - 1)) * dt
 
-    assert Ars.shape == Gr.shape
+    nsmooth = _get_nsmooth(smooth, freq)
+
+    return (times, freq) + _spectral_estimates(Gr, Gs, nsmooth)
+
+
+def remove_tilt_sliding(
+        response, source, dt, twin,
+        overlap=0.5,
+        fmin=None,
+        fmax=None,
+        parallel=True,
+        threshold=0.5,
+        smooth=1.0,
+        g=9.81,
+        method='coh'):
+
+    '''
+    Remove non-stationary tilt noise from translational accelerometer records.
+
+    Adaptive version of :py:func:`remove_tilt`. Transfer function and
+    coherence are estimated in overlapping short-time windows, see
+    :py:func:`transfer_function_sliding`, and a window-specific correction is
+    applied. The corrected windows are blended together with a Hann-shaped
+    weighting, normalized by the sum of weights at each sample. All windows
+    are processed together with stacked FFTs.
+
+    Parameters ``response``, ``source``, ``dt``, ``fmin``, ``fmax``,
+    ``parallel``, ``threshold``, ``smooth``, ``g`` are as in
+    :py:func:`remove_tilt`. The ``method`` argument may be ``'coh'`` or
+    ``'freq'``.
+
+    :param twin:
+        Length of the analysis windows [s].
+    :type twin:
+        float
+
+    :param overlap:
+        Fraction of overlap between neighbouring windows, in the range
+        ``[0, 1)``.
+    :type overlap:
+        float
+
+    :returns:
+        Data samples of corrected accelerometer signal [m/s**2].
+    :rtype:
+        numpy.ndarray
+    '''
+
+    assert response.size == source.size
+    assert method in ('coh', 'freq')
+
+    sign = 1.0 if parallel else -1.0
+
+    ndat = response.size
+    nwin, nhop, nwindows = _get_window_layout(ndat, dt, twin, overlap)
+    nfft = _get_nfft(nwin)
+
+    Gr = np.fft.rfft(_get_frames(response, nwin, nhop, nwindows), nfft)
+    Gs = np.fft.rfft(_get_frames(source, nwin, nhop, nwindows), nfft)
+    freq = np.fft.rfftfreq(nfft, dt)
+
+    nsmooth = _get_nsmooth(smooth, freq)
+    Ars, coh = _spectral_estimates(Gr, Gs, nsmooth)[-2:]
+
+    corrected = np.fft.irfft(
+        _correct_spectra(
+            Gr, Gs, freq, Ars, coh, fmin, fmax, sign, threshold, g, method)
+    )[:, :nwin]
+
+    # blend overlapping windows, weights must be non-zero at window edges
+    weights = np.hanning(nwin + 2)[1:-1]
+    indices = (
+        np.arange(nwindows)[:, np.newaxis] * nhop
+        + np.arange(nwin)[np.newaxis, :]).ravel()
+
+    npadded = (nwindows - 1) * nhop + nwin
+    corrected *= weights[np.newaxis, :]
+    numerator = np.bincount(
+        indices, weights=corrected.ravel(), minlength=npadded)
+    denominator = np.bincount(
+        indices, weights=np.tile(weights, nwindows), minlength=npadded)
+
+    return (numerator / denominator)[:ndat]
+
+
+def _transfer_matrix_estimates(Gr, Gs, nsmooth):
+    '''
+    Get transfer matrix and multiple coherence from stacked spectra.
+
+    ``Gr[iresponse, ifreq]`` and ``Gs[isource, ifreq]`` are the spectra of
+    the response and source signals.
+    '''
+
+    Grs = _smooth(
+        Gr[:, np.newaxis, :] * Gs[np.newaxis, :, :].conjugate(), nsmooth)
+    Gss = _smooth(
+        Gs[:, np.newaxis, :] * Gs[np.newaxis, :, :].conjugate(), nsmooth)
+    Grr = _smooth((Gr * Gr.conjugate()).real, nsmooth)
+
+    Gss_inv = np.linalg.pinv(np.moveaxis(Gss, -1, 0), hermitian=True)
+    H = np.einsum('ijf,fjk->ikf', Grs, Gss_inv)
+
+    coh2 = np.einsum('ijf,ijf->if', H, Grs.conjugate()).real / Grr
+    coh = np.sqrt(np.clip(coh2, 0.0, 1.0))
+
+    return H, coh
+
+
+def transfer_matrix(responses, sources, dt, smooth):
+    '''
+    Calculate matrix of transfer functions between multiple signals.
+
+    Multi-input multi-output (MIMO) version of :py:func:`transfer_function`.
+    For each frequency, the transfer matrix ``H`` minimizes the residual
+    power of ``R - H S``, where ``R`` and ``S`` are the vectors of response
+    and source spectra. It is obtained from smoothed cross-spectral densities
+    as ``H = G_RS G_SS^-1``. Smoothing is done by convolution with a Blackman
+    window. Smoothing is required to obtain a well-conditioned source
+    cross-spectral matrix.
+
+    :param responses:
+        Sample data of the response signals, e.g. north and east
+        acceleration, as ``responses[iresponse, isample]``.
+    :type responses:
+        numpy.ndarray
+
+    :param sources:
+        Sample data of the source signals, e.g. north and east tilt, as
+        ``sources[isource, isample]``.
+    :type sources:
+        numpy.ndarray
+
+    :param dt:
+        Sampling interval [s].
+    :type dt:
+        float
+
+    :param smooth:
+        Size of the Blackman window used for smoothing [Hz].
+    :type smooth:
+        float
+
+    :returns:
+        (``freq``, ``H``, ``coh``)
+        ``freq``: array of frequencies,
+        ``H``: transfer matrix as ``H[iresponse, isource, ifreq]``,
+        ``coh``: multiple coherence of each response with all sources as
+        ``coh[iresponse, ifreq]``
+
+    :rtype:
+        3-:py:class:`tuple` of :py:class:`numpy.ndarray`
+    '''
+
+    responses = np.atleast_2d(responses)
+    sources = np.atleast_2d(sources)
+    nresponses = responses.shape[0]
+    assert responses.shape[1] == sources.shape[1]
+
+    nfft = _get_nfft(responses.shape[1])
+
+    G = np.fft.rfft(np.vstack([responses, sources]), nfft)
+    freq = np.fft.rfftfreq(nfft, dt)
+
+    nsmooth = _get_nsmooth(smooth, freq)
+
+    return (freq,) + _transfer_matrix_estimates(
+        G[:nresponses], G[nresponses:], nsmooth)
+
+
+def remove_tilt_mimo(
+        responses, sources, dt,
+        fmin=None,
+        fmax=None,
+        threshold=None,
+        smooth=1.0,
+        trans_coh=None):
+
+    '''
+    Remove tilt noise jointly from multiple accelerometer components.
+
+    Multi-input multi-output (MIMO) version of :py:func:`remove_tilt` with
+    the empirical transfer function (``'freq'``) method. Each response
+    component is corrected with contributions from all source components, so
+    that cross-axis coupling, e.g. due to misaligned sensors, is removed as
+    well. The transfer matrix is estimated with :py:func:`transfer_matrix`.
+    All signals are transformed only once and all components are corrected
+    together.
+
+    :param responses:
+        Data samples of the accelerometer signals [m/s**2], e.g. north and
+        east components, as ``responses[iresponse, isample]``.
+    :type responses:
+        numpy.ndarray
+
+    :param sources:
+        Data samples of the tilt signals [rad], as
+        ``sources[isource, isample]``.
+    :type sources:
+        numpy.ndarray
+
+    :param dt:
+        Sampling interval [s].
+    :type dt:
+        float
+
+    :param fmin:
+        Minimum frequency for band-limited correction [Hz].
+    :type fmin:
+        :py:class:`float` or ``None``
+
+    :param fmax:
+        Maximum frequency for band-limited correction [Hz].
+    :type fmax:
+        :py:class:`float` or ``None``
+
+    :param threshold:
+        If given, a response component is corrected only where its multiple
+        coherence with the sources is ``>= threshold``.
+    :type threshold:
+        :py:class:`float` or ``None``
+
+    :param smooth:
+        Size of the Blackman window [Hz] used for smoothing when estimating
+        the transfer matrix.
+    :type smooth:
+        float
+
+    :param trans_coh:
+        If given, previously calculated transfer matrix and multiple coherence
+        as returned by :py:func:`transfer_matrix`. If set to ``None``, they
+        are computed from ``responses`` and ``sources``.
+    :type trans_coh:
+        (:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`) or ``None``
+
+    :returns:
+        Data samples of corrected accelerometer signals [m/s**2], as
+        ``corrected[iresponse, isample]``.
+    :rtype:
+        numpy.ndarray
+    '''
+
+    responses = np.atleast_2d(responses)
+    sources = np.atleast_2d(sources)
+    nresponses, ndat = responses.shape
+    assert sources.shape[1] == ndat
+
+    nfft = _get_nfft(ndat)
+
+    G = np.fft.rfft(np.vstack([responses, sources]), nfft)
+    freq = np.fft.rfftfreq(nfft, dt)
+    Gr = G[:nresponses]
+    Gs = G[nresponses:]
+
+    if trans_coh is None:
+        H, coh = _transfer_matrix_estimates(
+            Gr, Gs, _get_nsmooth(smooth, freq))
+    else:
+        H, coh = trans_coh
+
+    assert H.shape == (nresponses, Gs.shape[0], freq.size)
     assert coh.shape == Gr.shape
 
-    mask = np.where(np.abs(coh) >= threshold, 1.0, 0.0)
-    if fmin is not None:
-        mask[freq < fmin] = 0.0
+    corr = np.einsum('ijf,jf->if', H, Gs)
 
-    if fmax is not None:
-        mask[freq > fmax] = 0.0
+    if threshold is not None or fmin is not None or fmax is not None:
+        mask = np.ones(Gr.shape)
+        if threshold is not None:
+            mask[coh < threshold] = 0.0
 
-    if method == 'coh':
-        corr = sign * g * Gs * mask
+        if fmin is not None:
+            mask[..., freq < fmin] = 0.0
 
-    elif method == 'freq':
-        corr = sign * np.conjugate(Ars) * Gs
+        if fmax is not None:
+            mask[..., freq > fmax] = 0.0
+
+        corr *= mask
+
+    return np.fft.irfft(Gr - corr)[:, :ndat]
 
+
+def remove_tilt_multi(
+        responses, source, dt,
+        fmin=None,
+        fmax=None,
+        parallel=True,
+        threshold=0.5,
+        smooth=1.0,
+        g=9.81,
+        method='coh',
+        trans_coh=None):
+
+    '''
+    Remove tilt noise from multiple recordings sharing a single tilt source.
+
+    Batched version of :py:func:`remove_tilt` for setups where one rotational
+    sensor serves several co-located accelerometers. The spectrum and the
+    smoothed autospectral density of the source are computed only once, and
+    all responses are transformed and corrected together.
+
+    Parameters ``source``, ``dt``, ``fmin``, ``fmax``, ``threshold``,
+    ``smooth``, ``g`` and ``method`` are as in :py:func:`remove_tilt`.
+
+    :param responses:
+        Data samples of the accelerometer signals [m/s**2], as
+        ``responses[iresponse, isample]``.
+    :type responses:
+        numpy.ndarray
+
+    :param parallel:
+        Flag to indicate if tilt and acceleration axes are parallel (``True``)
+        or antiparallel (``False``). May be given per response.
+    :type parallel:
+        bool or sequence of bool
+
+    :param trans_coh:
+        If given, previously calculated transfer functions and complex
+        coherences, as 2D arrays ``[iresponse, ifreq]``. If set to ``None``,
+        they are computed from ``responses`` and ``source``.
+    :type trans_coh:
+        (:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`) or ``None``
+
+    :returns:
+        Data samples of corrected accelerometer signals [m/s**2], as
+        ``corrected[iresponse, isample]``.
+    :rtype:
+        numpy.ndarray
+    '''
+
+    responses = np.atleast_2d(responses)
+    nresponses, ndat = responses.shape
+    assert source.size == ndat
+    assert method in ('direct', 'coh', 'freq')
+
+    sign = np.where(np.asarray(parallel), 1.0, -1.0)
+    if sign.ndim == 1:
+        assert sign.size == nresponses
+        sign = sign[:, np.newaxis]
+
+    if method == 'direct':
+        return responses - sign * g * np.sin(source)[np.newaxis, :]
+
+    nfft = _get_nfft(ndat)
+
+    Gr = np.fft.rfft(responses, nfft)
+    Gs = np.fft.rfft(source, nfft)
+    freq = np.fft.rfftfreq(nfft, dt)
+
+    if trans_coh is None:
+        Ars, coh = _spectral_estimates(
+            Gr, Gs, _get_nsmooth(smooth, freq))[-2:]
     else:
-        raise ValueError('Invalid `method` argument: %s' % method)
+        Ars, coh = trans_coh
+
+    assert Ars.shape == Gr.shape
+    assert coh.shape == Gr.shape
 
-    return np.fft.irfft(Gr - corr)[:ndat]
+    return np.fft.irfft(
+        _correct_spectra(
+            Gr, Gs, freq, Ars, coh, fmin, fmax, sign, threshold, g, method)
+    )[:, :ndat]
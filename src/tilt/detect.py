@@ -0,0 +1,183 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Detect steps of tilt-table experiments in rotation rate recordings.
+'''
+
+import numpy as np
+
+from owlpy.util import moving_sum
+
+
+def sta_lta(data, nsta, nlta):
+    '''
+    Compute classic STA/LTA characteristic function.
+
+    Same as :py:func:`obspy.signal.trigger.classic_sta_lta`, but implemented
+    with :py:func:`~owlpy.util.moving_sum`. Works along the last axis of the
+    input.
+
+    :param data:
+        Input signal.
+    :type data:
+        numpy.ndarray
+
+    :param nsta:
+        Length of short time average window [samples].
+    :type nsta:
+        int
+
+    :param nlta:
+        Length of long time average window [samples].
+    :type nlta:
+        int
+
+    :returns:
+        Characteristic function, zero for the first ``nlta - 1`` samples.
+    :rtype:
+        numpy.ndarray
+    '''
+
+    nsta = int(nsta)
+    nlta = int(nlta)
+    energy = np.square(data, dtype=float)
+    n = energy.shape[-1]
+
+    sta = moving_sum(energy, nsta, mode='full')[..., :n]
+    sta /= nsta
+    lta = moving_sum(energy, nlta, mode='full')[..., :n]
+    lta /= nlta
+    sta[..., :nlta-1] = 0.0
+    np.maximum(lta, np.finfo(float).tiny, out=lta)
+
+    sta /= lta
+    return sta
+
+
+def _select_separated(times, min_separation):
+    '''
+    Select sorted times, skipping those too close to the last selected one.
+
+    Only the selected times are visited, so the cost depends on the number of
+    selected times, not on the number of candidates.
+    '''
+
+    selected = []
+    candidates = np.flatnonzero(np.abs(times) > min_separation)
+    i = candidates[0] if candidates.size else times.size
+    while i < times.size:
+        selected.append(i)
+        i = np.searchsorted(times, times[i] + min_separation, side='right')
+
+    return times[np.array(selected, dtype=int)]
+
+
+def _transitions(indices, deltat, correction, start, stop, min_separation):
+    '''
+    Get times of the last samples of runs of consecutive indices.
+    '''
+
+    # the final run is not considered complete
+    ends = indices[:-1][np.diff(indices) > 1]
+    times = ends * deltat
+    times = times[np.logical_and(start <= times, times <= stop)]
+    return _select_separated(times + correction, min_separation)
+
+
+def detect_steps(
+        data, deltat, nsta, nlta, threshold_on, threshold_off,
+        correction_on=0.0,
+        correction_off=0.0,
+        start=0.0,
+        stop=np.inf,
+        min_separation=1.0):
+
+    '''
+    Find time spans when the steps of a tilt-table experiment are performed.
+
+    The STA/LTA characteristic function, see :py:func:`sta_lta`, drops below
+    ``threshold_on`` when a step starts and rises above ``threshold_off``
+    when a step ends. Transitions are found as the ends of runs of samples
+    meeting these conditions. A constant offset can be applied because the
+    steps are uniform. All operations are vectorized.
+
+    :param data:
+        Rotation rate recording containing steps.
+    :type data:
+        numpy.ndarray
+
+    :param deltat:
+        Sampling interval [s].
+    :type deltat:
+        float
+
+    :param nsta:
+        Number of samples for short term average.
+    :type nsta:
+        int
+
+    :param nlta:
+        Number of samples for long term average.
+    :type nlta:
+        int
+
+    :param threshold_on:
+        Threshold for trigger-on.
+    :type threshold_on:
+        float
+
+    :param threshold_off:
+        Threshold for trigger-off.
+    :type threshold_off:
+        float
+
+    :param correction_on:
+        Constant correction for trigger at the start of each step [s].
+    :type correction_on:
+        float
+
+    :param correction_off:
+        Constant correction for trigger at the end of each step [s].
+    :type correction_off:
+        float
+
+    :param start:
+        Offset to start searching for steps [s].
+    :type start:
+        float
+
+    :param stop:
+        Offset to stop searching for steps [s].
+    :type stop:
+        float
+
+    :param min_separation:
+        Minimum time between two detections of the same kind [s].
+    :type min_separation:
+        float
+
+    :returns:
+        ``(on, off)``, start and end time of each step, relative to the first
+        sample [s].
+    :rtype:
+        2-:py:class:`tuple` of :py:class:`numpy.ndarray`
+    '''
+
+    cft = sta_lta(data, nsta, nlta)
+
+    on = _transitions(
+        np.flatnonzero(cft < threshold_on), deltat, correction_on, start,
+        stop, min_separation)
+
+    off = _transitions(
+        np.flatnonzero(cft > threshold_off), deltat, correction_off, start,
+        stop, min_separation)
+
+    return on, off
@@ -0,0 +1,328 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Tilt-table geometry from residual displacements over grids of parameters.
+
+A tilt by the angle ``alpha`` about a horizontal axis moves the seismometer
+mass horizontally by
+
+    ``d = l * (1 - cos(alpha)) + (dh + h) * sin(alpha)``,
+
+where ``l`` is the horizontal distance between axis of rotation and centre
+of the seismometer, ``dh`` the vertical distance between bottom of the
+seismometer and axis of rotation, and ``h`` the height of the seismometer
+mass above the bottom of the seismometer (see
+:py:func:`owlpy.tilt.util.theo_resid_disp`).
+
+The model is linear in ``l`` and ``dh + h``. The functions in this module
+reduce the measured displacements of all steps to a least squares solution
+and a few sums, so that misfits for whole grids of geometries are evaluated
+without looping over steps.
+'''
+
+import numpy as np
+
+
+def residual_displacement(alpha, l, dh, h):  # noqa: E741
+    '''
+    Get theoretical residual displacement of tilt steps for many geometries.
+
+    :param alpha:
+        Rotation angle of each step [rad].
+    :type alpha:
+        numpy.ndarray
+
+    :param l:
+        Horizontal distance between axis of rotation and centre of
+        seismometer [m].
+    :type l:
+        float or numpy.ndarray
+
+    :param dh:
+        Vertical distance between bottom of seismometer and axis of rotation
+        [m].
+    :type dh:
+        float or numpy.ndarray
+
+    :param h:
+        Vertical distance between bottom of seismometer and seismometer
+        mass [m].
+    :type h:
+        float or numpy.ndarray
+
+    :returns:
+        Residual displacement [m] as ``disp[..., istep]``, where ``...`` is
+        the broadcast shape of ``l``, ``dh`` and ``h``.
+    :rtype:
+        numpy.ndarray
+    '''
+
+    alpha = np.asarray(alpha, dtype=float)
+    l, dh, h = (np.asarray(x, dtype=float)[..., np.newaxis]
+                for x in (l, dh, h))
+
+    return l * (1.0 - np.cos(alpha)) + (dh + h) * np.sin(alpha)
+
+
+def _sums(disp, alpha):
+    # Least squares solution for (l, dh + h) and the normal matrix. The
+    # misfit of any other geometry follows from the quadratic form around
+    # it, which avoids the cancellation of expanding the sum of squares.
+    x = 1.0 - np.cos(alpha)
+    s = np.sin(alpha)
+    design = np.column_stack((x, s))
+    (l0, c0), _, _, _ = np.linalg.lstsq(design, disp, rcond=None)
+    residual = disp - design.dot((l0, c0))
+    return dict(
+        rss=np.dot(residual, residual),
+        l=l0,
+        c=c0,
+        xx=np.dot(x, x),
+        ss=np.dot(s, s),
+        xs=np.dot(x, s))
+
+
+def _rss(sums, l, c):  # noqa: E741
+    dl = l - sums['l']
+    dc = c - sums['c']
+    rss = sums['rss'] + dl**2 * sums['xx'] + dc**2 * sums['ss'] \
+        + 2.0 * dl * dc * sums['xs']
+
+    return np.maximum(rss, 0.0)
+
+
+class GeometryInversion(object):
+    '''
+    Result of a tilt-table geometry inversion over a grid of parameters.
+
+    Use :py:func:`invert_geometry` to create it. All gridded attributes have
+    the broadcast shape of the parameter grids given to the inversion.
+
+    :ivar l:
+        Horizontal distance between axis of rotation and centre of
+        seismometer [m] at each grid node.
+    :ivar dh:
+        Vertical distance between bottom of seismometer and axis of
+        rotation [m] at each grid node.
+    :ivar h:
+        Height of the seismometer mass [m] at each grid node, fitted by least
+        squares if no grid of heights was given.
+    :ivar h_sigma:
+        Standard deviation of the fitted height of the seismometer mass [m]
+        at each grid node. Zero if the height was not fitted.
+    :ivar misfit:
+        Root mean square misfit of the residual displacements [m] at each
+        grid node.
+    :ivar nsteps:
+        Number of steps used.
+    '''
+
+    def __init__(self, l, dh, h, h_sigma, misfit, nsteps):  # noqa: E741
+        self.l = l  # noqa: E741
+        self.dh = dh
+        self.h = h
+        self.h_sigma = h_sigma
+        self.misfit = misfit
+        self.nsteps = nsteps
+
+    @property
+    def ibest(self):
+        '''
+        Index of the grid node with the smallest misfit.
+        '''
+        return np.unravel_index(np.argmin(self.misfit), self.misfit.shape)
+
+    @property
+    def best(self):
+        '''
+        Best-fitting parameters as :py:class:`dict` with keys ``'l'``,
+        ``'dh'``, ``'h'`` and ``'misfit'``.
+        '''
+        ibest = self.ibest
+        return dict(
+            l=self.l[ibest],
+            dh=self.dh[ibest],
+            h=self.h[ibest],
+            misfit=self.misfit[ibest])
+
+    def uncertainties(self):
+        '''
+        Get uncertainties of the best-fitting parameters.
+
+        The noise variance of the displacements is estimated from the
+        smallest misfit. The uncertainty of each gridded parameter is half
+        the range of its values over all grid nodes whose chi-square lies
+        within one of the minimum. For a fitted height of the seismometer
+        mass, the least squares standard deviation at the best node is
+        combined with this range.
+
+        :returns:
+            Uncertainties as :py:class:`dict` with keys ``'l'``, ``'dh'``
+            and ``'h'`` [m].
+        :rtype:
+            dict
+        '''
+
+        rss = self.misfit**2 * self.nsteps
+        rss_min = np.min(rss)
+        dof = max(self.nsteps - 1, 1)
+        sigma2 = rss_min / dof
+
+        if sigma2 > 0.0:
+            inside = rss - rss_min <= sigma2
+        else:
+            inside = rss == rss_min
+
+        def half_range(x):
+            x = x[inside]
+            return 0.5 * (np.max(x) - np.min(x))
+
+        ibest = self.ibest
+        return dict(
+            l=half_range(self.l),
+            dh=half_range(self.dh),
+            h=np.hypot(half_range(self.h), self.h_sigma[ibest]))
+
+
+def fit_height(disp, alpha, l, dh):  # noqa: E741
+    '''
+    Fit the height of the seismometer mass by least squares across steps.
+
+    This is the least squares counterpart of
+    :py:func:`owlpy.tilt.util.calc_height_of_mass`, evaluated for any number
+    of geometries at once.
+
+    :param disp:
+        Measured residual displacement of each step [m].
+    :type disp:
+        numpy.ndarray
+
+    :param alpha:
+        Rotation angle of each step [rad].
+    :type alpha:
+        numpy.ndarray
+
+    :param l:
+        Horizontal distance between axis of rotation and centre of
+        seismometer [m].
+    :type l:
+        float or numpy.ndarray
+
+    :param dh:
+        Vertical distance between bottom of seismometer and axis of rotation
+        [m].
+    :type dh:
+        float or numpy.ndarray
+
+    :returns:
+        ``(h, h_sigma, misfit)``, height of the seismometer mass [m], its
+        standard deviation [m] and root mean square misfit [m], each with the
+        broadcast shape of ``l`` and ``dh``.
+    :rtype:
+        3-:py:class:`tuple` of :py:class:`numpy.ndarray`
+    '''
+
+    disp, alpha = _check_steps(disp, alpha)
+    sums = _sums(disp, alpha)
+    return _fit_height(sums, disp.size, *np.broadcast_arrays(
+        np.asarray(l, dtype=float), np.asarray(dh, dtype=float)))
+
+
+def _fit_height(sums, nsteps, l, dh):  # noqa: E741
+    if sums['ss'] == 0.0:
+        raise ValueError('Height of mass cannot be fitted without tilt.')
+
+    c = sums['c'] - (l - sums['l']) * sums['xs'] / sums['ss']
+    rss = _rss(sums, l, c)
+    h_sigma = np.sqrt(rss / max(nsteps - 1, 1) / sums['ss'])
+    return c - dh, h_sigma, np.sqrt(rss / nsteps)
+
+
+def _check_steps(disp, alpha):
+    disp = np.asarray(disp, dtype=float)
+    alpha = np.asarray(alpha, dtype=float)
+    if disp.ndim != 1 or disp.shape != alpha.shape:
+        raise ValueError(
+            'Displacements and angles must be 1D arrays of equal length.')
+
+    if disp.size == 0:
+        raise ValueError('No steps given.')
+
+    return disp, alpha
+
+
+def invert_geometry(disp, alpha, l, dh, h=None):  # noqa: E741
+    '''
+    Invert residual displacements of tilt steps for tilt-table geometry.
+
+    The misfit between measured and theoretical residual displacements is
+    evaluated on the broadcast grid of ``l``, ``dh`` and, if given, ``h``.
+    Without a grid of heights, the height of the seismometer mass is fitted
+    by least squares at each node of the ``(l, dh)`` grid. Only sums over
+    the steps enter the misfit, so the cost does not depend on the number of
+    steps.
+
+    Note that the displacements depend on ``dh`` and ``h`` only through
+    their sum, so only one of them can be resolved.
+
+    :param disp:
+        Measured residual displacement of each step [m], e.g. peak-to-peak
+        displacements from
+        :py:func:`owlpy.tilt.segments.residual_displacement`.
+    :type disp:
+        numpy.ndarray
+
+    :param alpha:
+        Rotation angle of each step [rad], e.g. from
+        :py:func:`owlpy.tilt.util.get_angle`.
+    :type alpha:
+        numpy.ndarray
+
+    :param l:
+        Candidate horizontal distances between axis of rotation and centre of
+        seismometer [m], e.g. ``ls[:, np.newaxis]``.
+    :type l:
+        float or numpy.ndarray
+
+    :param dh:
+        Candidate vertical distances between bottom of seismometer and axis
+        of rotation [m], e.g. ``dhs[np.newaxis, :]``.
+    :type dh:
+        float or numpy.ndarray
+
+    :param h:
+        Candidate heights of the seismometer mass [m]. If ``None``, the
+        height is fitted.
+    :type h:
+        float or numpy.ndarray
+
+    :returns:
+        Misfit surface and best-fitting parameters.
+    :rtype:
+        :py:class:`GeometryInversion`
+    '''
+
+    disp, alpha = _check_steps(disp, alpha)
+    sums = _sums(disp, alpha)
+
+    if h is None:
+        l, dh = np.broadcast_arrays(
+            np.asarray(l, dtype=float), np.asarray(dh, dtype=float))
+
+        h, h_sigma, misfit = _fit_height(sums, disp.size, l, dh)
+    else:
+        l, dh, h = np.broadcast_arrays(
+            np.asarray(l, dtype=float), np.asarray(dh, dtype=float),
+            np.asarray(h, dtype=float))
+
+        h_sigma = np.zeros(h.shape)
+        misfit = np.sqrt(_rss(sums, l, dh + h) / disp.size)
+
+    return GeometryInversion(l, dh, h, h_sigma, misfit, disp.size)
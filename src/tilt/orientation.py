@@ -0,0 +1,206 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Estimate relative orientation of rotational sensor and seismometer.
+'''
+
+import numpy as np
+
+from owlpy.util import arange2
+from owlpy.tilt.correction import (
+    _get_nfft, _get_nsmooth, _get_band_slice, _smooth, _power)
+
+d2r = np.pi / 180.
+r2d = 180. / np.pi
+
+
+def _wrap(angle):
+    return (angle + 180.) % 360. - 180.
+
+
+def rotate_sources(sources, angle):
+    '''
+    Rotate horizontal tilt components by a given angle.
+
+    ``rotated[0] = cos(angle) * sources[0] + sin(angle) * sources[1]`` and
+    ``rotated[1] = -sin(angle) * sources[0] + cos(angle) * sources[1]``.
+
+    :param sources:
+        Horizontal tilt components as ``sources[icomponent, isample]``.
+    :type sources:
+        numpy.ndarray
+
+    :param angle:
+        Rotation angle [deg].
+    :type angle:
+        float
+
+    :returns:
+        Rotated tilt components.
+    :rtype:
+        numpy.ndarray
+    '''
+
+    c = np.cos(angle*d2r)
+    s = np.sin(angle*d2r)
+    return np.vstack([
+        c * sources[0] + s * sources[1],
+        -s * sources[0] + c * sources[1]])
+
+
+def estimate_misorientation(
+        responses, sources, dt,
+        smooth=1.0,
+        fmin=None,
+        fmax=None,
+        parallel=(True, True),
+        angle_delta=1.0):
+
+    '''
+    Estimate horizontal misorientation between rotational sensor and
+    seismometer.
+
+    The relative orientation angle is scanned to find the rotation of the
+    tilt components, see :py:func:`rotate_sources`, which maximizes the
+    coherence between tilt and acceleration. Signals are transformed only
+    once. The smoothed cross-spectral densities of the rotated components are
+    linear combinations of a handful of precomputed cross-spectral densities,
+    so that all angles are evaluated in closed form with one vectorized
+    operation.
+
+    The coherence is evaluated with the expected polarity of the tilt
+    coupling (given with ``parallel``), so that the angle is determined
+    without 180 deg ambiguity.
+
+    :param responses:
+        Horizontal accelerometer signals [m/s**2] as
+        ``responses[icomponent, isample]``.
+    :type responses:
+        numpy.ndarray
+
+    :param sources:
+        Horizontal tilt signals [rad] as ``sources[icomponent, isample]``.
+        If the sensors are aligned, ``sources[i]`` is the tilt coupling into
+        ``responses[i]``.
+    :type sources:
+        numpy.ndarray
+
+    :param dt:
+        Sampling interval [s].
+    :type dt:
+        float
+
+    :param smooth:
+        Size of the Blackman window used for smoothing [Hz].
+    :type smooth:
+        float
+
+    :param fmin:
+        Minimum frequency of the band used for the estimation [Hz].
+    :type fmin:
+        :py:class:`float` or ``None``
+
+    :param fmax:
+        Maximum frequency of the band used for the estimation [Hz].
+    :type fmax:
+        :py:class:`float` or ``None``
+
+    :param parallel:
+        For each component, flag to indicate if tilt and acceleration axes are
+        parallel (``True``) or antiparallel (``False``).
+    :type parallel:
+        :py:class:`tuple` of two :py:class:`bool`
+
+    :param angle_delta:
+        Angle grid step size [deg].
+    :type angle_delta:
+        float
+
+    :returns:
+        ``(angle, uncertainty, angles, objective)`` where ``angle`` is the best
+        rotation angle in the range ``[-180, 180)`` [deg], to be used with
+        :py:func:`rotate_sources`, ``uncertainty`` is its standard error
+        [deg], estimated from the scatter of the best angles at independent
+        frequencies, ``angles`` is the angle grid [deg] and ``objective`` is
+        the mean coherence in the frequency band for each angle of the grid.
+    :rtype:
+        :py:class:`tuple`
+    '''
+
+    responses = np.atleast_2d(responses)
+    sources = np.atleast_2d(sources)
+    assert responses.shape[0] == sources.shape[0] == 2
+    assert responses.shape[1] == sources.shape[1]
+
+    signs = np.where(np.asarray(parallel), 1.0, -1.0)
+
+    nfft = _get_nfft(responses.shape[1])
+    G = np.fft.rfft(np.vstack([responses, sources]), nfft)
+    freq = np.fft.rfftfreq(nfft, dt)
+    nsmooth = _get_nsmooth(smooth, freq)
+
+    # restrict to band plus margin for smoothing
+    band = _get_band_slice(freq, fmin, fmax)
+    j0, j1 = max(0, band.start - nsmooth), min(freq.size, band.stop + nsmooth)
+    Ga = G[:2, j0:j1]
+    Gs = G[2:, j0:j1]
+    inner = slice(band.start - j0, band.stop - j0)
+
+    Gas = _smooth(
+        Ga[:, np.newaxis, :] * Gs[np.newaxis, :, :].conjugate(),
+        nsmooth)[..., inner]
+    Gss = _smooth(
+        Gs[:, np.newaxis, :] * Gs[np.newaxis, :, :].conjugate(),
+        nsmooth)[..., inner]
+    Gaa = _smooth(_power(Ga), nsmooth)[..., inner]
+
+    angles = arange2(-180., 180. - angle_delta, angle_delta)
+    c = np.cos(angles*d2r)[:, np.newaxis]
+    s = np.sin(angles*d2r)[:, np.newaxis]
+
+    Gss_00 = Gss[0, 0].real
+    Gss_11 = Gss[1, 1].real
+    Gss_01 = 2.0 * Gss[0, 1].real
+
+    # coherence of each component with its rotated tilt component, as
+    # coh[iangle, ifreq]
+    coh0 = signs[0] * (c * Gas[0, 0] + s * Gas[0, 1]).real / np.sqrt(
+        Gaa[0] * (c**2 * Gss_00 + s**2 * Gss_11 + c * s * Gss_01))
+
+    coh1 = signs[1] * (-s * Gas[1, 0] + c * Gas[1, 1]).real / np.sqrt(
+        Gaa[1] * (s**2 * Gss_00 + c**2 * Gss_11 - c * s * Gss_01))
+
+    coh = 0.5 * (coh0 + coh1)
+    objective = np.mean(coh, axis=1)
+
+    iangle = int(np.argmax(objective))
+    angle = angles[iangle]
+
+    # refine by parabolic interpolation
+    y0, y1, y2 = objective[[iangle - 1, iangle, (iangle + 1) % angles.size]]
+    denominator = y0 - 2.0 * y1 + y2
+    if denominator < 0.0:
+        angle += 0.5 * angle_delta * (y0 - y2) / denominator
+
+    angle = _wrap(angle)
+
+    # scatter of best angles at individual frequencies, weighted by coherence
+    ibest = np.argmax(coh, axis=0)
+    weights = np.clip(coh[ibest, np.arange(ibest.size)], 0.0, None)
+    deviations = _wrap(angles[ibest] - angle)
+    if np.sum(weights) > 0.0:
+        std = np.sqrt(np.sum(weights * deviations**2) / np.sum(weights))
+    else:
+        std = 180.
+
+    nindependent = max(1.0, ibest.size / max(1, nsmooth))
+    uncertainty = std / np.sqrt(nindependent)
+
+    return float(angle), float(uncertainty), angles, objective
@@ -0,0 +1,506 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Cached, parallel preprocessing of tilt-table raw data.
+
+Seismometer and rotational sensor records are read, response corrected,
+rotated to ZNE and cut to the requested time window, as described for
+:py:func:`owlpy.tilt.util.get_data`. The two records are processed
+concurrently and the results can be stored in a :py:class:`PreprocessCache`
+so that repeated analyses of the same raw files skip the preprocessing.
+'''
+
+import os
+import glob
+import json
+import hashlib
+import tempfile
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from obspy import read_inventory
+from obspy.core import UTCDateTime, Stream, Trace, read
+
+from owlpy.error import OwlPyError
+
+# Increase when the processing changes, to invalidate cached results.
+PIPELINE_VERSION = 1
+
+
+def _file_names(pattern):
+    filenames = sorted(glob.glob(pattern))
+    if not filenames:
+        raise OwlPyError('No such file: %s' % pattern)
+
+    return filenames
+
+
+def _hash_file(filename):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(functools.partial(f.read, 1 << 20), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def _digest_files(pattern, digest_file=_hash_file):
+    h = hashlib.sha1()
+    for filename in _file_names(pattern):
+        h.update(os.path.basename(filename).encode('utf8'))
+        h.update(digest_file(filename).encode('ascii'))
+
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=8)
+def _read_inventory_cached(filename, mtime, size):
+    return read_inventory(filename)
+
+
+_inventory_lock = threading.Lock()
+
+
+def _read_inventory(filename):
+    '''
+    Read inventory, reusing the result while the file is unchanged.
+    '''
+    st = os.stat(filename)
+    with _inventory_lock:
+        return _read_inventory_cached(
+            os.path.abspath(filename), st.st_mtime_ns, st.st_size)
+
+
+def process_seismometer(st, inv, tmin, tmax, taper=0.1, water_level=60.):
+    '''
+    Preprocess seismometer records in place.
+
+    The records are detrended and tapered, corrected for the instrument
+    response to velocity [m/s], rotated to ZNE according to the inventory,
+    trimmed to the time window and tapered again.
+
+    :param st:
+        Seismometer records, including some margin around the time window.
+    :type st:
+        obspy.Stream
+
+    :param inv:
+        Inventory with response and orientation information.
+    :type inv:
+        obspy.Inventory
+
+    :param tmin:
+        Start of time window.
+    :type tmin:
+        obspy.UTCDateTime
+
+    :param tmax:
+        End of time window.
+    :type tmax:
+        obspy.UTCDateTime
+
+    :param taper:
+        Taper fraction.
+    :type taper:
+        float
+
+    :param water_level:
+        Water level for the response deconvolution [dB].
+    :type water_level:
+        float
+    '''
+
+    st.sort()
+    st.reverse()
+    st.detrend('linear')
+    st.detrend('demean')
+    st.taper(taper)
+
+    st.attach_response(inv)
+    st.remove_response(water_level=water_level, output='VEL')
+    st.rotate(method='->ZNE', inventory=inv, components=['ZNE'])
+
+    st.trim(tmin, tmax)
+    st.taper(taper)
+
+
+def process_rotation(st, inv, tmin, tmax, taper=0.1):
+    '''
+    Preprocess rotation rate records in place.
+
+    The records are demeaned and tapered, scaled by the sensitivity to
+    rotation rate [rad/s], rotated to ZNE according to the inventory,
+    trimmed to the time window and tapered again.
+
+    :param st:
+        Rotation rate records, including some margin around the time window.
+    :type st:
+        obspy.Stream
+
+    :param inv:
+        Inventory with response and orientation information.
+    :type inv:
+        obspy.Inventory
+
+    :param tmin:
+        Start of time window.
+    :type tmin:
+        obspy.UTCDateTime
+
+    :param tmax:
+        End of time window.
+    :type tmax:
+        obspy.UTCDateTime
+
+    :param taper:
+        Taper fraction.
+    :type taper:
+        float
+    '''
+
+    st.sort()
+    st.detrend('demean')
+    st.taper(taper)
+
+    st.attach_response(inv)
+    st.remove_sensitivity()
+    st.rotate(method='->ZNE', inventory=inv, components=['321'])
+
+    st.trim(tmin, tmax)
+    st.taper(taper)
+
+
+class PreprocessCache(object):
+    '''
+    Store preprocessed records on disk.
+
+    Entries are keyed by the content of the raw data and inventory files, the
+    time window and the processing parameters. Each entry is stored as a
+    ``.npz`` file holding the samples and headers of all traces of one
+    record.
+
+    Content digests of the input files are kept in an index in the cache
+    directory, together with path, size and modification time of each file.
+    A file is only read and hashed again when its size or modification time
+    change.
+
+    :param path:
+        Cache directory. Created if it does not exist.
+    :type path:
+        str
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._digests = None
+        self._digests_lock = threading.Lock()
+
+    def _filename(self, key):
+        return os.path.join(self.path, '%s.npz' % key)
+
+    def _digests_filename(self):
+        return os.path.join(self.path, 'digests.json')
+
+    def _get_digests(self):
+        if self._digests is None:
+            try:
+                with open(self._digests_filename(), 'r') as f:
+                    self._digests = json.load(f)
+
+            except (FileNotFoundError, ValueError):
+                self._digests = {}
+
+        return self._digests
+
+    def _put_digests(self):
+        fd, fn_temp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._digests, f)
+
+            os.replace(fn_temp, self._digests_filename())
+
+        except Exception:
+            os.unlink(fn_temp)
+            raise
+
+    def digest_file(self, filename):
+        '''
+        Get content digest of a file.
+
+        The file is only hashed if it is new or if its size or modification
+        time changed since it was last hashed.
+
+        :param filename:
+            Path of the file.
+        :type filename:
+            str
+
+        :returns:
+            SHA-1 digest of the file content as hex string.
+        :rtype:
+            str
+        '''
+
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        with self._digests_lock:
+            entry = self._get_digests().get(path)
+            if entry is not None and entry[:2] == stamp:
+                return entry[2]
+
+        digest = _hash_file(path)
+        with self._digests_lock:
+            self._get_digests()[path] = stamp + [digest]
+            self._put_digests()
+
+        return digest
+
+    def get(self, key):
+        '''
+        Get preprocessed record.
+
+        :returns:
+            Record or ``None`` if not in the cache.
+        :rtype:
+            :py:class:`obspy.Stream` or ``None``
+        '''
+
+        try:
+            with np.load(self._filename(key)) as f:
+                traces = []
+                for itrace, (trace_id, tmin, deltat) in enumerate(zip(
+                        f['ids'].tolist(), f['tmins'].tolist(),
+                        f['deltats'].tolist())):
+
+                    net, sta, loc, cha = trace_id.split('.')
+                    traces.append(Trace(
+                        data=f['data_%i' % itrace],
+                        header=dict(
+                            network=net, station=sta, location=loc,
+                            channel=cha, starttime=UTCDateTime(tmin),
+                            delta=deltat)))
+
+        except FileNotFoundError:
+            return None
+
+        return Stream(traces)
+
+    def put(self, key, st):
+        '''
+        Store preprocessed record.
+        '''
+
+        arrays = dict(
+            ('data_%i' % itrace, tr.data) for (itrace, tr) in enumerate(st))
+
+        arrays['ids'] = np.array([tr.id for tr in st], dtype=str)
+        arrays['tmins'] = np.array(
+            [str(tr.stats.starttime) for tr in st], dtype=str)
+        arrays['deltats'] = np.array([tr.stats.delta for tr in st])
+
+        fd, fn_temp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+
+            os.replace(fn_temp, self._filename(key))
+
+        except Exception:
+            os.unlink(fn_temp)
+            raise
+
+    def clear(self):
+        '''
+        Remove all entries.
+        '''
+        for fn in glob.glob(os.path.join(self.path, '*.npz')):
+            os.unlink(fn)
+
+
+def _process(kind, filename, inventory, t, duration, margin, taper,
+             water_level, cache):
+
+    params = dict(taper=taper)
+    if kind == 'seismometer':
+        params['water_level'] = water_level
+
+    if cache is not None:
+        s = ' '.join(str(x) for x in (
+            kind, PIPELINE_VERSION,
+            _digest_files(filename, cache.digest_file),
+            _digest_files(inventory, cache.digest_file),
+            t, '%.9g' % duration, '%.9g' % margin, sorted(params.items())))
+
+        key = hashlib.sha1(s.encode('utf8')).hexdigest()
+        st = cache.get(key)
+        if st is not None:
+            return st
+
+    dt = margin * duration
+    st = read(filename, starttime=t-dt, endtime=t+duration+dt)
+    inv = _read_inventory(inventory)
+    if kind == 'seismometer':
+        process_seismometer(st, inv, t, t+duration, **params)
+    else:
+        process_rotation(st, inv, t, t+duration, **params)
+
+    if cache is not None:
+        cache.put(key, st)
+
+    return st
+
+
+def preprocess(
+        stream1, stream2, utctime, duration, inventory, cache=None,
+        nworkers=2, margin=0.1, taper=0.1, water_level=60.):
+
+    '''
+    Read and preprocess seismometer and rotation rate records.
+
+    See :py:func:`process_seismometer` and :py:func:`process_rotation` for
+    the processing steps. The two records are processed concurrently.
+
+    :param stream1:
+        Path or glob pattern of the seismometer records.
+    :type stream1:
+        str
+
+    :param stream2:
+        Path or glob pattern of the rotation rate records.
+    :type stream2:
+        str
+
+    :param utctime:
+        Start time of the time window, format: YYYY-MM-DDThh:mm:ss.
+    :type utctime:
+        str
+
+    :param duration:
+        Length of the time window [s].
+    :type duration:
+        float
+
+    :param inventory:
+        Path to StationXML file with response information.
+    :type inventory:
+        str
+
+    :param cache:
+        Cache for preprocessed records. ``None`` disables caching.
+    :type cache:
+        :py:class:`PreprocessCache` or ``None``
+
+    :param nworkers:
+        Number of records to process concurrently.
+    :type nworkers:
+        int
+
+    :param margin:
+        Extra time read before and after the time window as fraction of
+        ``duration``.
+    :type margin:
+        float
+
+    :param taper:
+        Taper fraction.
+    :type taper:
+        float
+
+    :param water_level:
+        Water level for the response deconvolution of the seismometer
+        records [dB].
+    :type water_level:
+        float
+
+    :returns:
+        ``(st1, st2)``, preprocessed seismometer and rotation rate records.
+    :rtype:
+        2-:py:class:`tuple` of :py:class:`obspy.Stream`
+    '''
+
+    t = UTCDateTime(utctime)
+    jobs = [
+        (kind, filename, inventory, t, duration, margin, taper, water_level,
+         cache)
+        for (kind, filename) in [
+            ('seismometer', stream1), ('rotation', stream2)]]
+
+    if nworkers > 1:
+        with ThreadPoolExecutor(max_workers=nworkers) as executor:
+            return tuple(executor.map(lambda job: _process(*job), jobs))
+    else:
+        return tuple(_process(*job) for job in jobs)
+
+
+def _select_one(st, channel):
+    selected = st.select(channel=channel)
+    if len(selected) != 1:
+        raise OwlPyError(
+            'Expected exactly one trace for channel "%s" but got %i.'
+            % (channel, len(selected)))
+
+    return selected[0]
+
+
+def preprocess_arrays(
+        stream1, stream2, utctime, duration, inventory, ch_r, ch_s,
+        **kwargs):
+
+    '''
+    Get preprocessed response and source signals as arrays.
+
+    Like :py:func:`preprocess` but selecting one channel from each record.
+    The returned arrays are the sample arrays of the preprocessed traces and
+    can be passed to :py:func:`~owlpy.tilt.correction.remove_tilt` without
+    copying.
+
+    :param ch_r:
+        Response channel (data to be corrected).
+    :type ch_r:
+        str
+
+    :param ch_s:
+        Source channel (data to correct for).
+    :type ch_s:
+        str
+
+    :param kwargs:
+        Further arguments passed to :py:func:`preprocess`.
+
+    :returns:
+        ``(response, source, dt)``, samples of the response and source
+        channels and sampling interval [s].
+    :rtype:
+        :py:class:`tuple`
+
+    :raises:
+        :py:exc:`~owlpy.error.OwlPyError` if the channels are not found or if
+        sampling rate or number of samples of the two channels differ.
+    '''
+
+    st1, st2 = preprocess(
+        stream1, stream2, utctime, duration, inventory, **kwargs)
+
+    tr_r = _select_one(st1, ch_r)
+    tr_s = _select_one(st2, ch_s)
+
+    if tr_r.stats.sampling_rate != tr_s.stats.sampling_rate:
+        raise OwlPyError('Sampling rates of response and source differ.')
+
+    if tr_r.stats.npts != tr_s.stats.npts:
+        raise OwlPyError(
+            'Number of samples of response and source differ.')
+
+    return tr_r.data, tr_s.data, tr_r.stats.delta
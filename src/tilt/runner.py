@@ -0,0 +1,236 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Parallel tilt correction of long records split into segments, e.g. days.
+'''
+
+import os
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from owlpy.error import OwlPyError
+from owlpy.tilt.correction import remove_tilt
+
+
+def _to_shared(arrays):
+    n = arrays[0].size
+    dtype = np.result_type(*arrays)
+    shm = shared_memory.SharedMemory(
+        create=True, size=max(1, len(arrays) * n * dtype.itemsize))
+
+    data = np.ndarray((len(arrays), n), dtype=dtype, buffer=shm.buf)
+    for i, array in enumerate(arrays):
+        data[i] = array
+
+    del data
+    return shm, (shm.name, len(arrays), n, dtype.str)
+
+
+def _from_shared(desc):
+    name, narrays, n, dtype = desc
+    shm = shared_memory.SharedMemory(name=name)
+    data = np.ndarray((narrays, n), dtype=np.dtype(dtype), buffer=shm.buf)
+    return shm, data
+
+
+def _unlink_shared(desc):
+    shm = shared_memory.SharedMemory(name=desc[0])
+    shm.close()
+    shm.unlink()
+
+
+def _run_segment(args):
+    isegment, segment, dt, kwargs = args
+
+    if callable(segment):
+        response, source = segment()
+        shm_in = None
+    else:
+        shm_in, (response, source) = _from_shared(segment)
+
+    try:
+        corrected = remove_tilt(response, source, dt, **kwargs)
+    finally:
+        del response, source
+        if shm_in is not None:
+            shm_in.close()
+
+    shm_out, desc = _to_shared([corrected])
+    shm_out.close()
+    return isegment, desc
+
+
+def _stitch(segments, noverlap):
+    if not segments:
+        raise OwlPyError('No segments to stitch.')
+
+    if noverlap < 0 or any(x.size < noverlap for x in segments[1:]):
+        raise OwlPyError(
+            'Overlap of %i samples does not fit the segments.' % noverlap)
+
+    nsamples = sum(x.size for x in segments) \
+        - noverlap * (len(segments) - 1)
+
+    stitched = np.empty(nsamples, dtype=np.result_type(*segments))
+    if noverlap:
+        ramp = (np.arange(noverlap) + 0.5) / noverlap
+
+    i0 = 0
+    for isegment, x in enumerate(segments):
+        if isegment == 0 or noverlap == 0:
+            stitched[i0:i0+x.size] = x
+        else:
+            # crossfade in the overlap with the previous segment
+            overlap = stitched[i0:i0+noverlap]
+            overlap *= 1.0 - ramp
+            overlap += ramp * x[:noverlap]
+            stitched[i0+noverlap:i0+x.size] = x[noverlap:]
+
+        i0 += x.size - noverlap
+
+    return stitched
+
+
+def run_remove_tilt(
+        segments, dt,
+        noverlap=None,
+        nworkers=None,
+        **kwargs):
+
+    '''
+    Apply :py:func:`~owlpy.tilt.correction.remove_tilt` to many segments in
+    parallel.
+
+    The segments are distributed over a pool of worker processes. Sample data
+    is passed to and from the workers through shared memory instead of
+    pickling. Segments given as callables are loaded in the workers.
+
+    Adjacent segments may overlap, in which case the corrected segments are
+    stitched into one continuous signal with a linear crossfade in the
+    overlapping parts.
+
+    :param segments:
+        Segments to process, in temporal order. Each segment is either a
+        tuple ``(response, source)`` of sample arrays, or a callable without
+        arguments returning such a tuple. Callables must be picklable, e.g.
+        module level functions or :py:func:`functools.partial` objects.
+    :type segments:
+        list
+
+    :param dt:
+        Sampling interval [s].
+    :type dt:
+        float
+
+    :param noverlap:
+        Number of samples by which adjacent segments overlap. If ``None``,
+        the corrected segments are returned individually.
+    :type noverlap:
+        :py:class:`int` or ``None``
+
+    :param nworkers:
+        Number of worker processes. By default, the number of CPUs is used.
+    :type nworkers:
+        :py:class:`int` or ``None``
+
+    :param kwargs:
+        Further arguments passed to
+        :py:func:`~owlpy.tilt.correction.remove_tilt`.
+
+    :returns:
+        ``(corrected, stats)``, where ``corrected`` is the stitched corrected
+        signal, or a list with the corrected segments if ``noverlap`` is
+        ``None``, and ``stats`` is a :py:class:`dict` with entries
+        ``'nsegments'``, ``'nsamples'`` (number of samples processed),
+        ``'duration'`` (wall clock time [s]) and ``'throughput'`` (samples
+        processed per second).
+    :rtype:
+        :py:class:`tuple`
+
+    :raises:
+        :py:exc:`~owlpy.error.OwlPyError` if the segments cannot be stitched.
+    '''
+
+    if noverlap is not None and not segments:
+        raise OwlPyError('At least one segment is needed for stitching.')
+
+    tstart = time.time()
+
+    if nworkers is None:
+        nworkers = os.cpu_count() or 1
+
+    if os.name == 'posix':
+        # workers must share the resource tracker of this process, so that
+        # shared memory created in the workers outlives them
+        from multiprocessing import resource_tracker
+        resource_tracker.ensure_running()
+
+    shms_in = []
+    descs_out = {}
+    results = [None] * len(segments)
+    try:
+        tasks = []
+        for isegment, segment in enumerate(segments):
+            if not callable(segment):
+                response, source = segment
+                assert response.size == source.size
+                shm, segment = _to_shared([response, source])
+                shms_in.append(shm)
+
+            tasks.append((isegment, segment, dt, kwargs))
+
+        exception = None
+        with multiprocessing.Pool(min(nworkers, max(1, len(tasks)))) as pool:
+            outputs = pool.imap_unordered(_run_segment, tasks)
+            for _ in range(len(tasks)):
+                # if a worker fails, still collect the outputs of the other
+                # segments, so that their shared memory is released
+                try:
+                    isegment, desc = next(outputs)
+                    descs_out[isegment] = desc
+                except Exception as e:
+                    if exception is None:
+                        exception = e
+
+        if exception is not None:
+            raise exception
+
+        for isegment, desc in descs_out.items():
+            shm, data = _from_shared(desc)
+            try:
+                results[isegment] = data[0].copy()
+            finally:
+                del data
+                shm.close()
+
+    finally:
+        for shm in shms_in:
+            shm.close()
+            shm.unlink()
+
+        for desc in descs_out.values():
+            _unlink_shared(desc)
+
+    nsamples = sum(x.size for x in results)
+
+    if noverlap is not None:
+        results = _stitch(results, noverlap)
+
+    duration = time.time() - tstart
+    stats = dict(
+        nsegments=len(segments),
+        nsamples=nsamples,
+        duration=duration,
+        throughput=nsamples / duration if duration > 0.0 else float('inf'))
+
+    return results, stats
@@ -0,0 +1,316 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Handle segments of a signal, e.g. the steps of a tilt-table experiment.
+'''
+
+import numpy as np
+
+
+def nearest_indices(t, nsamples, deltat=None, times=None):
+    '''
+    Get indices of the samples nearest to given times.
+
+    Either the sampling interval of a regular time grid starting at zero or
+    the sorted time stamps of the samples must be given. Ties are resolved
+    towards the lower index.
+
+    :param t:
+        Times to look up [s].
+    :type t:
+        :py:class:`numpy.ndarray` or :py:class:`float`
+
+    :param nsamples:
+        Number of samples.
+    :type nsamples:
+        int
+
+    :param deltat:
+        Sampling interval [s].
+    :type deltat:
+        :py:class:`float` or ``None``
+
+    :param times:
+        Sorted time stamps of the samples [s].
+    :type times:
+        :py:class:`numpy.ndarray` or ``None``
+
+    :returns:
+        Sample indices.
+    :rtype:
+        :py:class:`numpy.ndarray` of :py:class:`int`
+    '''
+
+    t = np.asarray(t, dtype=float)
+
+    if times is None:
+        indices = np.ceil(t / deltat - 0.5).astype(int)
+        return np.clip(indices, 0, nsamples - 1)
+
+    assert times.size == nsamples
+
+    indices = np.clip(np.searchsorted(times, t), 1, max(1, nsamples - 1))
+    lower = times[indices - 1]
+    upper = times[np.minimum(indices, nsamples - 1)]
+    indices -= np.abs(t - lower) <= np.abs(upper - t)
+    return indices
+
+
+def segment_table(on, off, nsamples, deltat=None, times=None):
+    '''
+    Map start and end times of segments to sample indices.
+
+    All times are mapped at once, see :py:func:`nearest_indices`.
+
+    :param on:
+        Start times of the segments [s], e.g. from
+        :py:func:`~owlpy.tilt.detect.detect_steps`.
+    :type on:
+        :py:class:`numpy.ndarray` or :py:class:`list`
+
+    :param off:
+        End times of the segments [s].
+    :type off:
+        :py:class:`numpy.ndarray` or :py:class:`list`
+
+    :param nsamples:
+        Number of samples.
+    :type nsamples:
+        int
+
+    :param deltat:
+        Sampling interval [s].
+    :type deltat:
+        :py:class:`float` or ``None``
+
+    :param times:
+        Sorted time stamps of the samples [s].
+    :type times:
+        :py:class:`numpy.ndarray` or ``None``
+
+    :returns:
+        Segment table as ``table[isegment, (0: index of sample nearest to
+        start time, 1: index of sample nearest to end time)]``. Functions
+        working on segments of a signal, e.g. :py:func:`gather_segments`,
+        take the samples ``data[table[isegment, 0]:table[isegment, 1]]``.
+    :rtype:
+        :py:class:`numpy.ndarray` of :py:class:`int`
+    '''
+
+    on = np.asarray(on, dtype=float)
+    off = np.asarray(off, dtype=float)
+    assert on.shape == off.shape
+
+    table = np.empty((on.size, 2), dtype=int)
+    table[:, 0] = nearest_indices(on, nsamples, deltat, times)
+    table[:, 1] = nearest_indices(off, nsamples, deltat, times)
+    return table
+
+
+def gather_segments(data, table):
+    '''
+    Collect samples of many segments of a signal into one flat array.
+
+    :param data:
+        Signal samples.
+    :type data:
+        numpy.ndarray
+
+    :param table:
+        Segment table, as returned by :py:func:`segment_table`. Segment
+        ``isegment`` holds the samples
+        ``data[table[isegment, 0]:table[isegment, 1]]``.
+    :type table:
+        numpy.ndarray
+
+    :returns:
+        ``(flat, offsets)``, where ``flat`` contains the samples of all
+        segments, one after the other, and segment ``isegment`` is
+        ``flat[offsets[isegment]:offsets[isegment+1]]``.
+    :rtype:
+        2-:py:class:`tuple` of :py:class:`numpy.ndarray`
+
+    :raises:
+        :py:exc:`ValueError` if any segment is empty.
+    '''
+
+    table = np.asarray(table, dtype=int)
+    lengths = table[:, 1] - table[:, 0]
+    if np.any(lengths <= 0):
+        raise ValueError('Segments must contain at least one sample.')
+
+    offsets = np.zeros(lengths.size + 1, dtype=int)
+    np.cumsum(lengths, out=offsets[1:])
+
+    indices = np.arange(offsets[-1])
+    indices += np.repeat(table[:, 0] - offsets[:-1], lengths)
+    return data[indices], offsets
+
+
+def split_segments(flat, offsets):
+    '''
+    Get list of views on the segments in a flat array.
+    '''
+    bounds = np.asarray(offsets).tolist()
+    return [flat[i0:i1] for (i0, i1) in zip(bounds[:-1], bounds[1:])]
+
+
+def _segment_sums(x, offsets):
+    return np.add.reduceat(x, offsets[:-1])
+
+
+def _local_indices(offsets):
+    lengths = np.diff(offsets)
+    return np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths), lengths
+
+
+def detrend_segments(flat, offsets):
+    '''
+    Remove linear trend from each segment in a flat array.
+
+    The trend is fitted by least squares, like ``Trace.detrend('linear')``
+    in ObsPy. Sums needed for the fits are computed with
+    :py:func:`numpy.add.reduceat` for all segments at once.
+
+    :param flat:
+        Samples of all segments, as returned by :py:func:`gather_segments`.
+    :type flat:
+        numpy.ndarray
+
+    :param offsets:
+        Segment offsets, as returned by :py:func:`gather_segments`.
+    :type offsets:
+        numpy.ndarray
+
+    :returns:
+        Detrended samples of all segments.
+    :rtype:
+        numpy.ndarray
+    '''
+
+    k, lengths = _local_indices(offsets)
+    n = lengths.astype(float)
+
+    sum_y = _segment_sums(flat, offsets)
+    sum_ky = _segment_sums(k * flat, offsets)
+    sum_k = 0.5 * n * (n - 1.0)
+    sum_kk = (n - 1.0) * n * (2.0 * n - 1.0) / 6.0
+
+    denominator = n * sum_kk - sum_k**2
+    slope = np.zeros_like(sum_y)
+    nonzero = denominator != 0.0
+    slope[nonzero] = (n * sum_ky - sum_k * sum_y)[nonzero] \
+        / denominator[nonzero]
+
+    intercept = (sum_y - slope * sum_k) / n
+
+    trend = k * np.repeat(slope, lengths)
+    trend += np.repeat(intercept, lengths)
+    return flat - trend
+
+
+def zero_offset_segments(flat, offsets):
+    '''
+    Shift each segment in a flat array so that it starts at zero.
+    '''
+    return flat - np.repeat(flat[offsets[:-1]], np.diff(offsets))
+
+
+def integrate_segments(flat, offsets, deltat):
+    '''
+    Integrate each segment in a flat array with the cumulative trapezoidal
+    rule.
+
+    The integral is zero at the first sample of each segment, like
+    ``Trace.integrate()`` in ObsPy.
+
+    :param flat:
+        Samples of all segments, as returned by :py:func:`gather_segments`.
+    :type flat:
+        numpy.ndarray
+
+    :param offsets:
+        Segment offsets, as returned by :py:func:`gather_segments`.
+    :type offsets:
+        numpy.ndarray
+
+    :param deltat:
+        Sampling interval [s].
+    :type deltat:
+        float
+
+    :returns:
+        Integrated samples of all segments.
+    :rtype:
+        numpy.ndarray
+    '''
+
+    increments = np.zeros(flat.size)
+    np.add(flat[1:], flat[:-1], out=increments[1:])
+    increments *= 0.5 * deltat
+    increments[offsets[:-1]] = 0.0
+
+    integral = np.cumsum(increments)
+    integral -= np.repeat(integral[offsets[:-1]], np.diff(offsets))
+    return integral
+
+
+def peak_to_peak_segments(flat, offsets):
+    '''
+    Get peak-to-peak amplitude of each segment in a flat array.
+    '''
+    return np.maximum.reduceat(flat, offsets[:-1]) \
+        - np.minimum.reduceat(flat, offsets[:-1])
+
+
+def residual_displacement(velocity, table, deltat, detrend=True):
+    '''
+    Integrate velocity to displacement in many segments of a signal.
+
+    Each segment is optionally detrended, shifted to start at zero and
+    integrated. The velocity is assumed to be zero at the beginning and at
+    the end of a segment. All segments are processed at once.
+
+    :param velocity:
+        Velocity samples [m/s].
+    :type velocity:
+        numpy.ndarray
+
+    :param table:
+        Segment table, as returned by :py:func:`segment_table`.
+    :type table:
+        numpy.ndarray
+
+    :param deltat:
+        Sampling interval [s].
+    :type deltat:
+        float
+
+    :param detrend:
+        Whether to remove a linear trend from each segment.
+    :type detrend:
+        bool
+
+    :returns:
+        ``(flat, offsets, ptp)``, where ``flat`` and ``offsets`` hold the
+        displacement of the segments, see :py:func:`gather_segments`, and
+        ``ptp`` is the peak-to-peak displacement of each segment [m].
+    :rtype:
+        3-:py:class:`tuple` of :py:class:`numpy.ndarray`
+    '''
+
+    flat, offsets = gather_segments(velocity, table)
+    flat = flat.astype(float)
+    if detrend:
+        flat = detrend_segments(flat, offsets)
+
+    flat = zero_offset_segments(flat, offsets)
+    flat = integrate_segments(flat, offsets, deltat)
+    return flat, offsets, peak_to_peak_segments(flat, offsets)
@@ -0,0 +1,141 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Cross-spectral matrix of multi-component recordings.
+'''
+
+import numpy as np
+
+from owlpy.tilt.correction import (
+    _get_nfft, _get_nsmooth, _smooth, _power, _rfft)
+
+
+class SpectralMatrix(object):
+    '''
+    Smoothed Hermitian cross-spectral matrix of multiple signals.
+
+    Use :py:func:`cross_spectral_matrix` to create it. Spectral estimates
+    for any pair of components are derived from it consistently with
+    :py:func:`~owlpy.tilt.correction.transfer_function`.
+
+    :ivar freq:
+        Array of frequencies [Hz].
+    :ivar G:
+        Smoothed cross-spectral densities as ``G[i, j, ifreq]``, i.e. the
+        smoothed spectrum of component ``i`` times the complex conjugate of
+        the spectrum of component ``j``.
+    :ivar P:
+        Non-smoothed, real-valued autospectral densities as
+        ``P[i, ifreq]``.
+    '''
+
+    def __init__(self, freq, G, P):
+        self.freq = freq
+        self.G = G
+        self.P = P
+
+    @property
+    def ncomponents(self):
+        return self.G.shape[0]
+
+    def coherence_matrix(self):
+        '''
+        Get smoothed complex coherence between all pairs of components.
+
+        :returns:
+            Coherence as ``coh[i, j, ifreq]``.
+        :rtype:
+            :py:class:`numpy.ndarray`
+        '''
+        norm = np.sqrt(np.einsum('iif->if', self.G).real)
+        return self.G / (norm[:, np.newaxis, :] * norm[np.newaxis, :, :])
+
+    def transfer_function(self, iresponse, isource):
+        '''
+        Get transfer function and coherence between two components.
+
+        :param iresponse:
+            Index of the response component.
+        :type iresponse:
+            int
+
+        :param isource:
+            Index of the source component.
+        :type isource:
+            int
+
+        :returns:
+            ``(Ars, coh)``, as returned by
+            :py:func:`~owlpy.tilt.correction.transfer_function`.
+        :rtype:
+            2-:py:class:`tuple` of :py:class:`numpy.ndarray`
+        '''
+
+        coh = self.G[iresponse, isource] / np.sqrt(
+            self.G[iresponse, iresponse].real * self.G[isource, isource].real)
+
+        Ars = coh * np.sqrt(self.P[iresponse] / self.P[isource])
+        return Ars, coh
+
+
+def cross_spectral_matrix(data, dt, smooth, low_memory=False):
+    '''
+    Calculate smoothed cross-spectral matrix between all components.
+
+    Each component is transformed only once and the cross-spectral densities
+    of all pairs are computed and smoothed with stacked operations. Only the
+    upper triangle is computed, the lower triangle is filled by Hermitian
+    symmetry. Smoothing is done by convolution with a Blackman window.
+
+    :param data:
+        Sample data of the signals as ``data[icomponent, isample]``, e.g. as
+        returned by :py:func:`~owlpy.util.get_traces_data_as_array`.
+    :type data:
+        numpy.ndarray
+
+    :param dt:
+        Sampling interval [s].
+    :type dt:
+        float
+
+    :param smooth:
+        Size of the Blackman window used for smoothing [Hz].
+    :type smooth:
+        float
+
+    :param low_memory:
+        If ``True`` and the input signals are single precision, computations
+        are done in single precision.
+    :type low_memory:
+        bool
+
+    :returns:
+        Cross-spectral matrix.
+    :rtype:
+        :py:class:`SpectralMatrix`
+    '''
+
+    data = np.atleast_2d(data)
+    ncomponents, ndat = data.shape
+
+    nfft = _get_nfft(ndat)
+    X = _rfft(data, nfft, low_memory)
+    X *= dt
+    freq = np.fft.rfftfreq(nfft, dt)
+    nsmooth = _get_nsmooth(smooth, freq)
+
+    iupper, jupper = np.triu_indices(ncomponents)
+    Gupper = _smooth(X[iupper] * X[jupper].conjugate(), nsmooth)
+
+    G = np.empty((ncomponents, ncomponents, freq.size), dtype=X.dtype)
+    G[iupper, jupper] = Gupper
+    G[jupper, iupper] = Gupper.conjugate()
+
+    return SpectralMatrix(freq, G, _power(X))
@@ -0,0 +1,169 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Low-latency tilt correction of streaming data.
+'''
+
+import math
+import numpy as np
+
+
+class StreamingTiltCorrector(object):
+    '''
+    Real-time version of the ``'direct'`` method of
+    :py:func:`~owlpy.tilt.correction.remove_tilt`.
+
+    Data is fed in packets of rotation rate and acceleration samples with
+    :py:meth:`process`, which immediately returns the corrected acceleration
+    for the packet. The rotation rate is integrated to tilt angle with the
+    trapezoidal rule and the integration state is kept between packets.
+
+    Optionally, drift of the tilt angle is controlled by a first-order
+    high-pass with corner frequency ``fcorner``, realized as a leaky
+    integrator. The recursion is evaluated in closed form for blocks of at
+    most ``nblock`` samples. For numerical stability, the block length is
+    limited so that the scaling of the samples within a block spans at most
+    eight orders of magnitude, i.e. ``2 * pi * fcorner * dt * nblock <= 8 *
+    ln(10)``.
+
+    :param dt:
+        Sampling interval [s].
+    :type dt:
+        float
+
+    :param parallel:
+        Flag to indicate if tilt and acceleration axes are parallel (``True``)
+        or antiparallel (``False``).
+    :type parallel:
+        bool
+
+    :param g:
+        Gravitational acceleration [m/s**2].
+    :type g:
+        float
+
+    :param fcorner:
+        Corner frequency of the drift control high-pass [Hz]. ``None``
+        disables drift control.
+    :type fcorner:
+        :py:class:`float` or ``None``
+
+    :param nblock:
+        Maximum number of samples processed in one vectorized block. It is
+        reduced if needed for stability of the drift control.
+    :type nblock:
+        int
+
+    :param angle:
+        Initial tilt angle [rad].
+    :type angle:
+        float
+    '''
+
+    def __init__(
+            self, dt,
+            parallel=True,
+            g=9.81,
+            fcorner=None,
+            nblock=1024,
+            angle=0.0):
+
+        self.dt = dt
+        self.sign = 1.0 if parallel else -1.0
+        self.g = g
+        self.fcorner = fcorner
+        self.nblock = int(nblock)
+
+        if fcorner is None:
+            self._powers = None
+        else:
+            # keep the dynamic range of the scaled prefix sums within 1e8
+            decay_rate = 2.0 * math.pi * fcorner * dt
+            self.nblock = min(
+                self.nblock, max(1, int(8. * math.log(10.) / decay_rate)))
+
+            decay = math.exp(-decay_rate)
+            self._powers = decay**np.arange(1, self.nblock + 1)
+
+        self.reset(angle)
+
+    def reset(self, angle=0.0):
+        '''
+        Reset integration state.
+
+        :param angle:
+            Tilt angle at the next sample [rad].
+        :type angle:
+            float
+        '''
+
+        self.angle = angle
+        self._rate_last = None
+
+    def _integrate_block(self, rate):
+        rate_previous = np.empty_like(rate, dtype=float)
+        rate_previous[1:] = rate[:-1]
+        if self._rate_last is None:
+            # first sample after reset: keep initial angle
+            rate_previous[0] = -rate[0]
+        else:
+            rate_previous[0] = self._rate_last
+
+        # increments of the trapezoidal rule
+        increments = rate_previous
+        increments += rate
+        increments *= 0.5 * self.dt
+
+        if self._powers is None:
+            angle = np.cumsum(increments)
+            angle += self.angle
+        else:
+            # closed form of angle[i] = decay * angle[i-1] + increments[i]
+            powers = self._powers[:rate.size]
+            increments /= powers
+            angle = np.cumsum(increments)
+            angle += self.angle
+            angle *= powers
+
+        self.angle = float(angle[-1])
+        self._rate_last = rate[-1]
+        return angle
+
+    def process(self, rotation_rate, acceleration):
+        '''
+        Correct a packet of acceleration samples.
+
+        :param rotation_rate:
+            Rotation rate samples of the packet [rad/s].
+        :type rotation_rate:
+            numpy.ndarray
+
+        :param acceleration:
+            Acceleration samples of the packet [m/s**2].
+        :type acceleration:
+            numpy.ndarray
+
+        :returns:
+            Corrected acceleration samples of the packet [m/s**2].
+        :rtype:
+            numpy.ndarray
+        '''
+
+        assert rotation_rate.size == acceleration.size
+
+        corrected = np.empty(acceleration.size)
+        for i0 in range(0, acceleration.size, self.nblock):
+            i1 = min(i0 + self.nblock, acceleration.size)
+            angle = self._integrate_block(rotation_rate[i0:i1])
+            np.sin(angle, out=angle)
+            angle *= self.sign * self.g
+            np.subtract(acceleration[i0:i1], angle, out=corrected[i0:i1])
+
+        return corrected
@@ -0,0 +1,154 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Tune tilt correction parameters efficiently.
+'''
+
+import itertools
+
+import numpy as np
+
+from owlpy.tilt.correction import (
+    _get_nfft, _get_nsmooth, _spectral_estimates, _correct_spectra)
+
+
+def sweep_remove_tilt(
+        response, source, dt,
+        thresholds=(0.5,),
+        smooths=(1.0,),
+        fmins=(None,),
+        fmaxs=(None,),
+        parallel=True,
+        g=9.81,
+        method='coh',
+        reference=None,
+        output='misfit'):
+
+    '''
+    Evaluate :py:func:`~owlpy.tilt.correction.remove_tilt` over parameter
+    grids.
+
+    The spectra of ``response`` and ``source`` are computed only once and the
+    spectral estimates are computed only once for each distinct smoothing
+    window length. For each smoothing, the corrections for all combinations
+    of ``thresholds``, ``fmins`` and ``fmaxs`` are evaluated one after the
+    other with the same code as in
+    :py:func:`~owlpy.tilt.correction.remove_tilt`, so that memory use does not
+    grow with the number of combinations.
+
+    Parameters ``response``, ``source``, ``dt``, ``parallel`` and ``g`` are
+    as in :py:func:`~owlpy.tilt.correction.remove_tilt`.
+
+    :param thresholds:
+        Coherence thresholds to try.
+    :type thresholds:
+        sequence of :py:class:`float`
+
+    :param smooths:
+        Smoothing window lengths to try [Hz].
+    :type smooths:
+        sequence of :py:class:`float`
+
+    :param fmins:
+        Minimum frequencies for band-limited correction to try [Hz]. ``None``
+        means no lower limit.
+    :type fmins:
+        sequence of :py:class:`float` or ``None``
+
+    :param fmaxs:
+        Maximum frequencies for band-limited correction to try [Hz]. ``None``
+        means no upper limit.
+    :type fmaxs:
+        sequence of :py:class:`float` or ``None``
+
+    :param method:
+        Correction method, ``'coh'`` or ``'freq'``. With ``'freq'``, the
+        results do not depend on ``thresholds``, ``fmins`` and ``fmaxs``.
+    :type method:
+        str
+
+    :param reference:
+        If given, misfits are computed with respect to this signal, e.g. a
+        tilt-free reference recording. Otherwise the misfit is the RMS of the
+        corrected signal.
+    :type reference:
+        :py:class:`numpy.ndarray` or ``None``
+
+    :param output:
+        ``'misfit'``: return RMS misfit for each parameter combination,
+        ``'traces'``: return corrected signal for each parameter combination.
+    :type output:
+        str
+
+    :returns:
+        Array with shape ``(len(smooths), len(thresholds), len(fmins),
+        len(fmaxs))`` containing the misfits or with an additional last axis
+        containing the samples of the corrected signals.
+    :rtype:
+        :py:class:`numpy.ndarray`
+    '''
+
+    assert response.size == source.size
+    assert method in ('coh', 'freq')
+    assert output in ('misfit', 'traces')
+
+    sign = 1.0 if parallel else -1.0
+
+    ndat = response.size
+    nfft = _get_nfft(ndat)
+
+    Gr = np.fft.rfft(response, nfft)
+    Gs = np.fft.rfft(source, nfft)
+    freq = np.fft.rfftfreq(nfft, dt)
+
+    shape = (len(smooths), len(thresholds), len(fmins), len(fmaxs))
+    if output == 'traces':
+        result = np.zeros(shape + (ndat,))
+    else:
+        result = np.zeros(shape)
+
+    def evaluate(corrected):
+        if output == 'traces':
+            return corrected
+
+        if reference is not None:
+            corrected = corrected - reference
+
+        return np.sqrt(np.mean(corrected**2))
+
+    estimates = {}
+    for ismooth, smooth in enumerate(smooths):
+        nsmooth = _get_nsmooth(smooth, freq)
+        if nsmooth not in estimates:
+            estimates[nsmooth] = _spectral_estimates(Gr, Gs, nsmooth)[-2:]
+
+        Ars, coh = estimates[nsmooth]
+
+        if method == 'freq':
+            # independent of threshold and band
+            corrected = np.fft.irfft(_correct_spectra(
+                Gr.copy(), Gs, freq, Ars, coh, None, None, sign, None, g,
+                method))[:ndat]
+
+            result[ismooth] = evaluate(corrected)
+            continue
+
+        for (ithreshold, threshold), (ifmin, fmin), (ifmax, fmax) \
+                in itertools.product(
+                    enumerate(thresholds), enumerate(fmins),
+                    enumerate(fmaxs)):
+
+            corrected = np.fft.irfft(_correct_spectra(
+                Gr.copy(), Gs, freq, Ars, coh, fmin, fmax, sign, threshold,
+                g, method))[:ndat]
+
+            result[ismooth, ithreshold, ifmin, ifmax] = evaluate(corrected)
+
+    return result
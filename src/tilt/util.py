@@ -2,15 +2,16 @@
 
 import sys
 import numpy as np
-from obspy import read_inventory
-from obspy.core import UTCDateTime, read, Trace
-from obspy.signal.trigger import classic_sta_lta, plot_trigger
+
+from owlpy.tilt.detect import detect_steps, sta_lta
+from owlpy.tilt.segments import (
+    nearest_indices, residual_displacement, segment_table, split_segments)
 
 
 def get_data(
         stream1, stream2, utctime, duration,
         seis_channel, rot_channel,
-        inventory, ch_r, ch_s):
+        inventory, ch_r, ch_s, cache=None, nworkers=2):
 
     '''
     Read in data from two files and do basic pre-processing.
@@ -58,6 +59,15 @@ def get_data(
         source channel (data to correct for)
     :type ch_s:
         string
+    :param cache:
+        cache for preprocessed records, see
+        :py:class:`owlpy.tilt.preprocess.PreprocessCache`
+    :type cache:
+        owlpy.tilt.preprocess.PreprocessCache
+    :param nworkers:
+        number of records to process concurrently
+    :type nworkers:
+        int
 
     :returns:
         r, s
@@ -66,70 +76,20 @@ def get_data(
     :rtype:
         obspy.Stream, obspy.Stream
     '''
-    # define some parameters
-    # take some seconds before and after the series of steps
-    p = 0.1
-    dt = p * duration
-
-    # read the inventory for meta data
-    inv = read_inventory(inventory)
+    from owlpy.tilt.preprocess import preprocess
 
-    # get the strat time right
-    t = UTCDateTime(utctime)
+    # read, response correct, rotate and cut both records, concurrently and
+    # from the cache if given
+    sz1, sz2 = preprocess(
+        stream1, stream2, utctime, duration, inventory, cache=cache,
+        nworkers=nworkers)
 
-    # define the seismometer and rotation sensor input channels
-    chan1 = seis_channel  # TODO: not used and probably not needed?  # noqa
-    chan2 = rot_channel   # noqa
-
-    # -------------------------------------------------------------------------
-    # process the classic seismometer records
-    # 1. read in the records and sort the channels, detrend and taper
-    sz1 = read(stream1, starttime=t-dt, endtime=t+duration+dt)
-    sz1.sort()
-    sz1.reverse()
-    sz1.detrend("linear")
-    sz1.detrend("demean")
-    sz1.taper(0.1)
-
-    # 2. remove response and out put velocity in m/s
-    sz1.attach_response(inv)
-    sz1.remove_response(water_level=60, output="VEL")
-
-    # 3. rotate the components according to the orientation as documented in
-    # the inventory
-    sz1.rotate(method="->ZNE", inventory=inv, components=["ZNE"])
-
-# asign samplingrate and number of samples for seismometer channels
+    # asign samplingrate and number of samples
     df1 = sz1[0].stats.sampling_rate
     npts1 = sz1[0].stats.npts
-
-    # -------------------------------------------------------------------------
-    # process the rotation rate records
-    # 1. read in the records and sort the channels, detrend and taper
-    sz2 = read(stream2, starttime=t-dt, endtime=t+duration+dt)
-    sz2.sort()
-    sz2.detrend("demean")
-    sz2.taper(0.1)
-
-    # 2. remove response (scale by sensitivity) to out put rotation rate in
-    # rad/s
-    sz2.attach_response(inv)
-    sz2.remove_sensitivity()
-    # 3. rotate the components according to the orientation as documented in
-    # the inventory
-    sz2.rotate(method="->ZNE", inventory=inv, components=["321"])
-
-    # asign samplingrate and number of samples for seismometer channels
     df2 = sz2[0].stats.sampling_rate
     npts2 = sz2[0].stats.npts
 
-    # -------------------------------------------------------------------------
-    # trim to the original time window and taper again
-    sz1.trim(t, t+duration)
-    sz2.trim(t, t+duration)
-    sz1.taper(0.1)
-    sz2.taper(0.1)
-
     # -------------------------------------------------------------------------
     # do sanity checks
     # 1. check for sampling rate
@@ -156,6 +116,9 @@ def trigger(tr1, a, b, d0, d1, c_on, c_off, start, stop, plot_flagg=False):
     STA/LTA- trigger is used to calculate the characteristic function.
     A constant offset can be applied bacause the steps are uniform.
 
+    See :py:func:`owlpy.tilt.detect.detect_steps` for a version returning
+    arrays.
+
     :param tr1:
         rotation rate recording containing steps
     :type tr1:
@@ -200,47 +163,29 @@ def trigger(tr1, a, b, d0, d1, c_on, c_off, start, stop, plot_flagg=False):
     :rtype:
         list, list
     '''
-    # define some parameters
-    data1 = tr1.data
-    # df1 = tr1.stats.sampling_rate
-
-    # get the characteristic function
-    cft1 = classic_sta_lta(data1, int(a), int(b))
+    # get the characteristic function and the on/off time stamps of each step
+    on, off = detect_steps(
+        tr1.data, tr1.stats.delta, a, b, d0, d1,
+        correction_on=c_on,
+        correction_off=c_off,
+        start=start,
+        stop=stop)
 
     # you can plot it if you want
     if plot_flagg:
-        plot_trigger(tr1, cft1, d0, d1)
-
-    # find the on/off time stamps of each step
-    _on = np.where(cft1 < d0)[0]
-    _off = np.where(cft1 > d1)[0]
-
-    on = []
-    on0 = 0
-    for i in range(len(_on)-1):
-        if _on[i+1] - _on[i] > 1:
-            trigg = _on[i]*tr1.stats.delta
-            if trigg >= start and trigg <= stop:
-                if np.abs((trigg + c_on)-on0) > 1.0:
-                    on.append(trigg + c_on)
-                    on0 = trigg + c_on
-    off = []
-    off0 = 0
-    for i in range(len(_off)-1):
-        if _off[i+1] - _off[i] > 1:
-            trigg = _off[i]*tr1.stats.delta
-            if trigg >= start and trigg <= stop:
-                if np.abs((trigg + c_off)-off0) > 1.0:
-                    off.append(trigg + c_off)
-                    off0 = trigg + c_off
-
-    return on, off
+        from obspy.signal.trigger import plot_trigger
+        plot_trigger(tr1, sta_lta(tr1.data, a, b), d0, d1)
+
+    return on.tolist(), off.tolist()
 
 
 def find_nearest(t, data, on, off):
     '''
     This method finds the nearest sample in 'data' to 'on' and 'off'
 
+    Use :py:func:`owlpy.tilt.segments.segment_table` to look up many steps at
+    once.
+
     :param t:
         array containing timestamps of samples in data
     :type t:
@@ -267,8 +212,7 @@ def find_nearest(t, data, on, off):
     :rtype:
         int, int, float, float
     '''
-    idx_on = (np.abs(t-on)).argmin()
-    idx_off = (np.abs(t-off)).argmin()
+    idx_on, idx_off = nearest_indices([on, off], t.size, times=t).tolist()
     return idx_on, idx_off, data[idx_on], data[idx_off]
 
 
@@ -310,40 +254,23 @@ def calc_residual_disp(tr1, on, off, r, theo=False):
         list, list, float, float
     '''
 
-    disp_tr = []
-    disp = []
-    time = []
+    if len(on) == 0:
+        return [], [], np.nan, np.nan
 
     t = np.arange(len(tr1[0].data))/(tr1[0].stats.sampling_rate)
+    table = segment_table(on, off, t.size, tr1[0].stats.delta)
 
-    for i in range(len(on)):
-        idx_on, idx_off, d_0, d_1 = find_nearest(t, tr1[0].data, on[i], off[i])
-
-        data = tr1[0].data[idx_on:idx_off]
-        stats = tr1[0].stats
-        stats.starttime = tr1[0].stats.starttime+idx_on*tr1[0].stats.delta
-        tr = Trace(data=data, header=stats)
-
-        # suppose that velocity is zero at the beginning and at the end of a
-        # step
-        if not theo:
-            tr.detrend('linear')
-        y0 = tr.data[0]
-        tr.data = tr.data - y0
-
-        # integrate to displacement
-        tr.integrate()
-
-        # shift the whole trace to make it comparable to theoretical
-        # displacement
-        y0 = tr.data[0]
-        diff = (y0 - r[idx_on])
-        tr.data = tr.data - diff
+    # suppose that velocity is zero at the beginning and at the end of a
+    # step; all steps are detrended and integrated at once
+    flat, offsets, disp_tr = residual_displacement(
+        tr1[0].data, table, tr1[0].stats.delta, detrend=not theo)
 
-        disp.append(tr.data)
-        time.append(t[idx_on:idx_off])
+    # shift the displacement of each step to make it comparable to
+    # theoretical displacement (integration starts at zero)
+    flat += np.repeat(r[table[:, 0]], np.diff(offsets))
 
-        disp_tr.append(np.abs(max(tr.data)-min(tr.data)))
+    disp = split_segments(flat, offsets)
+    time = [t[idx_on:idx_off] for idx_on, idx_off in table.tolist()]
 
     mean_tr = np.mean(disp_tr)
     sigma_tr = np.std(disp_tr)
@@ -373,12 +300,9 @@ def get_angle(st, on, off):
     :rtype:
         numpy.ndarray
     '''
-    t = np.arange(len(st[0].data))/(st[0].stats.sampling_rate)
-    alpha = []
-    for i in range(len(on)):
-        idx_on, idx_off, d_0, d_1 = find_nearest(t, st[0].data, on[i], off[i])
-        alpha.append(np.abs(d_0 - d_1))
-    return np.asarray(alpha)
+    data = st[0].data
+    table = segment_table(on, off, data.size, st[0].stats.delta)
+    return np.abs(data[table[:, 0]] - data[table[:, 1]])
 
 
 def theo_resid_disp(alpha0, l, h, dh, rr):
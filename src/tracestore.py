@@ -0,0 +1,365 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+'''
+Memory-mapped on-disk trace store for out-of-core processing.
+
+Each trace is stored in its own file: an 8 byte magic string, the length of
+a JSON header as 4 byte little-endian integer, the JSON header with codes,
+start time, sampling interval, data type and number of samples, padding to
+a multiple of 64 bytes and finally the raw samples in little-endian byte
+order. The samples can therefore be memory-mapped without decoding.
+
+Stored traces are accepted by :py:func:`~owlpy.util.get_traces_data_as_array`
+and all functions working on traces.
+'''
+
+import os
+import json
+import struct
+import fnmatch
+import tempfile
+
+import numpy as np
+
+from .error import OwlPyError
+from .util import ArrayTrace, _unpack_trace
+
+MAGIC = b'OWLTRC01'
+ALIGNMENT = 64
+
+
+class TraceStoreError(OwlPyError):
+    '''
+    Raised when a trace file cannot be read.
+    '''
+    pass
+
+
+class StoredTrace(ArrayTrace):
+    '''
+    Trace with samples, usually memory-mapped from a trace file.
+
+    See :py:class:`~owlpy.util.ArrayTrace` for the attributes. ``ydata`` is a
+    :py:class:`numpy.memmap` when read from a trace file.
+    '''
+
+    def __init__(self, codes, tmin, deltat, ydata):
+        ArrayTrace.__init__(self, ydata, deltat, tmin, codes)
+
+    def __repr__(self):
+        return 'StoredTrace(%s, tmin=%.6f, deltat=%g, nsamples=%i)' % (
+            '.'.join(self.codes), self.tmin, self.deltat, self.ydata.size)
+
+    def chop(self, tmin, tmax):
+        '''
+        Get view on the samples within a time window.
+
+        No samples are copied or read from disk.
+
+        :param tmin:
+            Start of time window [s].
+        :type tmin:
+            float
+
+        :param tmax:
+            End of time window [s], inclusive.
+        :type tmax:
+            float
+
+        :returns:
+            Trace with the samples in the time window. It may be empty.
+        :rtype:
+            :py:class:`StoredTrace`
+        '''
+
+        eps = 1e-6
+        n = self.ydata.size
+        i0 = min(max(int(np.ceil(
+            (tmin - self.tmin) / self.deltat - eps)), 0), n)
+        i1 = min(max(int(np.floor(
+            (tmax - self.tmin) / self.deltat + eps)) + 1, i0), n)
+
+        return StoredTrace(
+            self.codes, self.tmin + i0 * self.deltat, self.deltat,
+            self.ydata[i0:i1])
+
+    def load(self):
+        '''
+        Get in-memory copy of the trace.
+
+        :rtype:
+            :py:class:`StoredTrace`
+        '''
+        return StoredTrace(
+            self.codes, self.tmin, self.deltat, np.array(self.ydata))
+
+
+def _trace_codes(tr):
+    if hasattr(tr, 'nslc_id'):
+        return tuple(tr.nslc_id)
+
+    stats = getattr(tr, 'stats', None)
+    if stats is not None:
+        return (stats.network, stats.station, stats.location, stats.channel)
+
+    raise TypeError(
+        'Cannot get codes of object of type "%s".' % str(type(tr)))
+
+
+def write_trace(filename, tr, dtype=None):
+    '''
+    Write a trace to a trace file.
+
+    :param filename:
+        Output file name.
+    :type filename:
+        str
+
+    :param tr:
+        Trace to be written.
+    :type tr:
+        :py:class:`obspy.Trace <obspy.core.trace.Trace>`,
+        :py:class:`pyrocko.Trace <pyrocko.trace.Trace>` or
+        :py:class:`StoredTrace`
+
+    :param dtype:
+        Data type of the stored samples. Defaults to the data type of the
+        trace.
+    :type dtype:
+        :py:class:`numpy.dtype` or str
+    '''
+
+    data, deltat, tmin = _unpack_trace(tr)
+    dtype = np.dtype(data.dtype if dtype is None else dtype) \
+        .newbyteorder('<')
+
+    header = json.dumps(dict(
+        codes=list(_trace_codes(tr)),
+        tmin=float(tmin),
+        deltat=float(deltat),
+        dtype=dtype.str,
+        nsamples=int(data.size))).encode('utf8')
+
+    nhead = len(MAGIC) + 4 + len(header)
+    padding = b' ' * (-nhead % ALIGNMENT)
+
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, fn_temp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<I', len(header) + len(padding)))
+            f.write(header)
+            f.write(padding)
+            f.write(np.ascontiguousarray(data, dtype=dtype).tobytes())
+
+        os.replace(fn_temp, filename)
+
+    except Exception:
+        os.unlink(fn_temp)
+        raise
+
+
+def _read_header(f, filename):
+    magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        raise TraceStoreError('Not a trace file: %s' % filename)
+
+    nheader, = struct.unpack('<I', f.read(4))
+    try:
+        header = json.loads(f.read(nheader).decode('utf8'))
+    except ValueError:
+        raise TraceStoreError('Invalid header in trace file: %s' % filename)
+
+    return header, len(MAGIC) + 4 + nheader
+
+
+def read_trace(filename, mmap=True):
+    '''
+    Read a trace from a trace file.
+
+    :param filename:
+        Trace file name.
+    :type filename:
+        str
+
+    :param mmap:
+        Whether to memory-map the samples (read-only) instead of reading
+        them.
+    :type mmap:
+        bool
+
+    :rtype:
+        :py:class:`StoredTrace`
+
+    :raises:
+        :py:exc:`TraceStoreError` if the file is not a valid trace file.
+    '''
+
+    with open(filename, 'rb') as f:
+        header, offset = _read_header(f, filename)
+        dtype = np.dtype(header['dtype'])
+        nsamples = header['nsamples']
+        if os.fstat(f.fileno()).st_size < offset + nsamples * dtype.itemsize:
+            raise TraceStoreError('Truncated trace file: %s' % filename)
+
+        if nsamples == 0:
+            ydata = np.zeros(0, dtype=dtype)
+        elif mmap:
+            ydata = np.memmap(
+                filename, dtype=dtype, mode='r', offset=offset,
+                shape=(nsamples,))
+        else:
+            f.seek(offset)
+            ydata = np.fromfile(f, dtype=dtype, count=nsamples)
+
+    return StoredTrace(
+        header['codes'], header['tmin'], header['deltat'], ydata)
+
+
+class TraceStore(object):
+    '''
+    Directory of trace files.
+
+    :param path:
+        Store directory. Created if it does not exist.
+    :type path:
+        str
+    '''
+
+    suffix = '.owltr'
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _filename(self, codes, tmin):
+        return os.path.join(
+            self.path, '%s_%.6f%s' % ('.'.join(codes), tmin, self.suffix))
+
+    def add(self, traces, dtype=None):
+        '''
+        Convert traces and add them to the store.
+
+        :param traces:
+            Traces to be added, e.g. an ObsPy stream.
+        :type traces:
+            iterable of :py:class:`obspy.Trace <obspy.core.trace.Trace>`
+            or :py:class:`pyrocko.Trace <pyrocko.trace.Trace>` objects
+
+        :param dtype:
+            Data type of the stored samples, e.g. ``'float32'`` to halve the
+            size of double precision data. Defaults to the data type of each
+            trace.
+        :type dtype:
+            :py:class:`numpy.dtype` or str
+
+        :returns:
+            Names of the written files.
+        :rtype:
+            :py:class:`list` of :py:class:`str`
+        '''
+
+        filenames = []
+        for tr in traces:
+            _, _, tmin = _unpack_trace(tr)
+            filename = self._filename(_trace_codes(tr), tmin)
+            write_trace(filename, tr, dtype=dtype)
+            filenames.append(filename)
+
+        return filenames
+
+    def traces(self, codes='*', tmin=None, tmax=None, mmap=True):
+        '''
+        Get stored traces.
+
+        If a time window is given, only traces overlapping it are returned,
+        chopped to the window with :py:meth:`StoredTrace.chop`.
+
+        :param codes:
+            Pattern matched against ``'network.station.location.channel'``,
+            e.g. ``'XX.BS1.*.HJ?'``.
+        :type codes:
+            str
+
+        :param tmin:
+            Start of time window [s].
+        :type tmin:
+            float
+
+        :param tmax:
+            End of time window [s].
+        :type tmax:
+            float
+
+        :param mmap:
+            Whether to memory-map the samples.
+        :type mmap:
+            bool
+
+        :returns:
+            Traces sorted by codes and start time.
+        :rtype:
+            :py:class:`list` of :py:class:`StoredTrace`
+        '''
+
+        traces = []
+        for basename in os.listdir(self.path):
+            if not basename.endswith(self.suffix):
+                continue
+
+            tr = read_trace(os.path.join(self.path, basename), mmap=mmap)
+            if not fnmatch.fnmatchcase('.'.join(tr.codes), codes):
+                continue
+
+            if tmin is not None or tmax is not None:
+                tr = tr.chop(
+                    tr.tmin if tmin is None else tmin,
+                    tr.tmax if tmax is None else tmax)
+
+                if tr.ydata.size == 0:
+                    continue
+
+            traces.append(tr)
+
+        traces.sort(key=lambda tr: (tr.codes, tr.tmin))
+        return traces
+
+
+def convert(traces, path, dtype=None):
+    '''
+    Convert traces to a trace store.
+
+    :param traces:
+        Traces to be converted, e.g. an ObsPy stream or a list of Pyrocko
+        traces.
+    :type traces:
+        iterable of :py:class:`obspy.Trace <obspy.core.trace.Trace>`
+        or :py:class:`pyrocko.Trace <pyrocko.trace.Trace>` objects
+
+    :param path:
+        Store directory.
+    :type path:
+        str
+
+    :param dtype:
+        Data type of the stored samples.
+    :type dtype:
+        :py:class:`numpy.dtype` or str
+
+    :returns:
+        Trace store containing the traces.
+    :rtype:
+        :py:class:`TraceStore`
+    '''
+
+    store = TraceStore(path)
+    store.add(traces, dtype=dtype)
+    return store
@@ -11,17 +11,6 @@
 import math
 import numpy as np
 
-try:
-    from pyrocko.trace import Trace as PTrace
-except ImportError:
-    PTrace = None
-
-try:
-    from obspy import Trace as OTrace
-except ImportError:
-    OTrace = None
-
-
 from .error import OwlPyError
 
 
@@ -29,29 +18,180 @@ def _all_same(xs):
     return all(x == xs[0] for x in xs)
 
 
+class ArrayTrace(object):
+    '''
+    Lightweight trace: NumPy array of samples plus timing metadata.
+
+    Can be used wherever OwlPy expects traces, without depending on ObsPy or
+    Pyrocko.
+
+    :ivar ydata:
+        Samples.
+    :ivar deltat:
+        Sampling interval [s].
+    :ivar tmin:
+        Time of first sample [s], system time.
+    :ivar codes:
+        Network, station, location and channel code.
+    '''
+
+    def __init__(self, ydata, deltat, tmin=0.0, codes=('', '', '', '')):
+        self.ydata = ydata
+        self.deltat = deltat
+        self.tmin = tmin
+        self.codes = tuple(codes)
+
+    @property
+    def nslc_id(self):
+        return self.codes
+
+    @property
+    def tmax(self):
+        return self.tmin + (self.ydata.size - 1) * self.deltat
+
+
+def _unpack_pyrocko_trace(tr):
+    return (
+        tr.ydata,
+        tr.deltat,
+        tr.tmin)
+
+
+def _unpack_obspy_trace(tr):
+    return (
+        tr.data,
+        1.0/tr.stats.sampling_rate,
+        tr.stats.starttime.timestamp)
+
+
+def _unpack_array_trace(tr):
+    return (
+        tr.ydata,
+        tr.deltat,
+        tr.tmin)
+
+
+# Built-in adapters are registered by class name, so that trace frameworks
+# are never imported by OwlPy itself. A trace object implies that its
+# framework has already been imported by the caller.
+_trace_adapters = {
+    'pyrocko.trace.Trace': _unpack_pyrocko_trace,
+    'obspy.core.trace.Trace': _unpack_obspy_trace,
+    ArrayTrace: _unpack_array_trace}
+
+_trace_adapter_cache = {}
+
+
+def _class_name(cls):
+    return '%s.%s' % (cls.__module__, cls.__qualname__)
+
+
+def register_trace_adapter(cls, unpack):
+    '''
+    Register a function to get samples and timing of custom trace objects.
+
+    Adapters apply to instances of ``cls`` and its subclasses. An adapter
+    registered for a subclass takes precedence over one for its base class.
+
+    :param cls:
+        Trace class or its fully qualified name, e.g.
+        ``'mypackage.traces.MyTrace'``. Registering by name avoids importing
+        the module defining the class.
+    :type cls:
+        :py:class:`type` or :py:class:`str`
+
+    :param unpack:
+        Function taking a trace and returning ``(data, deltat, tmin)``: the
+        samples as :py:class:`numpy.ndarray`, the sampling interval [s] and
+        the time of the first sample [s].
+    :type unpack:
+        callable
+    '''
+
+    _trace_adapters[cls] = unpack
+    _trace_adapter_cache.clear()
+
+
+def _get_trace_adapter(cls):
+    try:
+        return _trace_adapter_cache[cls]
+    except KeyError:
+        pass
+
+    unpack = None
+    for base in cls.__mro__:
+        unpack = _trace_adapters.get(base) \
+            or _trace_adapters.get(_class_name(base))
+
+        if unpack is not None:
+            break
+
+    _trace_adapter_cache[cls] = unpack
+    return unpack
+
+
 def _unpack_trace(tr):
     '''
     Get trace attributes in a framework agnostic way.
     '''
 
-    if PTrace and isinstance(tr, PTrace):
-        return (
-            tr.ydata,
-            tr.deltat,
-            tr.tmin)
-
-    elif OTrace and isinstance(tr, OTrace):
-        return (
-            tr.data,
-            1.0/tr.stats.sampling_rate,
-            tr.stats.starttime.timestamp)
-    else:
+    unpack = _get_trace_adapter(type(tr))
+    if unpack is None:
         raise TypeError(
-            'Expected ObsPy or Pyrocko trace but got object of type "%s".'
+            'Expected ObsPy, Pyrocko or registered trace type but got object '
+            'of type "%s".'
             % str(type(tr)))
 
+    return unpack(tr)
+
+
+def _root_buffer(data):
+    base = data
+    while isinstance(base.base, np.ndarray):
+        base = base.base
+
+    return base
+
+
+def _shared_buffer_view(arrays):
+    '''
+    Get 2D view on 1D arrays which are equally spaced rows of one buffer.
+
+    Returns ``None`` if the arrays do not share one buffer in a way that
+    allows a strided view.
+    '''
+
+    first = arrays[0]
+    if first.ndim != 1:
+        return None
+
+    root = _root_buffer(first)
+    addresses = []
+    for data in arrays:
+        if data.ndim != 1 or data.strides != first.strides \
+                or data.dtype != first.dtype \
+                or _root_buffer(data) is not root:
+            return None
+
+        addresses.append(data.__array_interface__['data'][0])
+
+    steps = np.diff(addresses)
+    if steps.size == 0:
+        step = first.itemsize * first.size
+    elif np.all(steps == steps[0]):
+        step = int(steps[0])
+    else:
+        return None
+
+    return np.lib.stride_tricks.as_strided(
+        first,
+        shape=(len(arrays), first.size),
+        strides=(step, first.strides[0]),
+        writeable=first.flags.writeable and step != 0)
 
-def get_traces_data_as_array(traces):
+
+def get_traces_data_as_array(
+        traces, out=None, dtype=None, copy=True, views=False):
     '''
     Merge data samples from multiple traces into a 2D array.
 
@@ -61,13 +201,44 @@ def get_traces_data_as_array(traces):
         list of :py:class:`obspy.Trace <obspy.core.trace.Trace>`
         or :py:class:`pyrocko.Trace <pyrocko.trace.Trace>` objects
 
+    :param out:
+        Preallocated output array of shape ``(len(traces), nsamples)``. The
+        samples are cast to its data type.
+    :type out:
+        :py:class:`numpy.ndarray`
+
+    :param dtype:
+        Data type of the output. By default, the data type of the traces is
+        used and all traces must have the same data type. If set, traces of
+        different data types are accepted and cast.
+    :type dtype:
+        :py:class:`numpy.dtype` or str
+
+    :param copy:
+        If ``False`` and the trace samples are equally spaced rows of one
+        buffer, e.g. rows of a 2D array, a strided view on that buffer is
+        returned instead of a copy. The caller must not modify the returned
+        array in that case, unless modifying the traces is intended.
+    :type copy:
+        bool
+
+    :param views:
+        If ``True``, return the list of sample arrays of the traces instead
+        of a 2D array. No data is copied, unless a cast to ``dtype`` is
+        needed.
+    :type views:
+        bool
+
     :raises:
         :py:class:`~owlpy.error.OwlPyError` if traces have different time
         span, sample rate or data type, or if traces is an empty list.
 
     :returns:
-        2D array as ``data[itrace, isample]``.
+        2D array as ``data[itrace, isample]`` or list of 1D arrays if
+        ``views`` is set. If any trace holds a masked array, e.g. an ObsPy
+        trace with gaps, a masked array is returned.
     :rtype:
+        :py:class:`numpy.ndarray` or :py:class:`list` of
         :py:class:`numpy.ndarray`
     '''
 
@@ -76,8 +247,11 @@ def get_traces_data_as_array(traces):
 
     udata = [_unpack_trace(tr) for tr in traces]
 
+    if out is not None:
+        dtype = out.dtype
+
     params = [
-        (data.size, data.dtype, deltat, tmin)
+        (data.size, data.dtype if dtype is None else '-', deltat, tmin)
         for (data, deltat, tmin)
         in udata]
 
@@ -92,7 +266,211 @@ def get_traces_data_as_array(traces):
                 '\n'.join(
                     '  %10i %-10s %12.5e %22.16e' % vec for vec in params)))
 
-    return np.vstack([data for (data, _, _) in udata])
+    arrays = [data for (data, _, _) in udata]
+
+    if views:
+        if dtype is None:
+            return arrays
+        else:
+            return [data.astype(dtype, copy=False) for data in arrays]
+
+    # Samples masked in any trace, e.g. gaps of merged ObsPy traces, are
+    # masked in the result.
+    if any(np.ma.isMaskedArray(data) for data in arrays):
+        mask = np.array([np.ma.getmaskarray(data) for data in arrays])
+        arrays = [np.ma.getdata(data) for data in arrays]
+    else:
+        mask = None
+
+    merged = _merge_arrays(arrays, out, dtype, copy)
+    if mask is not None:
+        merged = np.ma.masked_array(merged, mask=mask, copy=False)
+
+    return merged
+
+
+def _merge_arrays(arrays, out, dtype, copy):
+    if out is not None:
+        if out.shape != (len(arrays), arrays[0].size):
+            raise OwlPyError(
+                'Output array has shape %s but %s is needed.' % (
+                    out.shape, (len(arrays), arrays[0].size)))
+
+        for iarray, data in enumerate(arrays):
+            np.copyto(out[iarray], data, casting='same_kind')
+
+        return out
+
+    if not copy:
+        view = _shared_buffer_view(arrays)
+        if view is not None and (dtype is None or view.dtype == dtype):
+            return view
+
+    if dtype is None:
+        dtype = arrays[0].dtype
+
+    merged = np.empty((len(arrays), arrays[0].size), dtype=dtype)
+    for iarray, data in enumerate(arrays):
+        merged[iarray] = data
+
+    return merged
+
+
+def _shift_fft(x, shifts):
+    '''
+    Evaluate rows of ``x`` at fractional sample offsets ``shifts``.
+
+    A straight line through the first and last sample is removed before the
+    phase shift to avoid wrap-around artefacts and added back afterwards.
+    '''
+
+    n = x.shape[1]
+    k = np.arange(n)
+    offset = x[:, :1]
+    slope = (x[:, -1:] - offset) / max(n - 1, 1)
+    x = x - offset - slope * k
+
+    nfft = 2**int(math.ceil(math.log2(2 * n)))
+    freqs = np.fft.rfftfreq(nfft)
+    X = np.fft.rfft(x, nfft, axis=1)
+    X *= np.exp(2j * np.pi * freqs[np.newaxis, :] * shifts[:, np.newaxis])
+    y = np.fft.irfft(X, nfft, axis=1)[:, :n]
+
+    y += offset + slope * (k + shifts[:, np.newaxis])
+    return y
+
+
+def _shift_sinc(data, i0, n, shift, nsinc):
+    '''
+    Evaluate ``data`` at ``i0 + shift + arange(n)`` with Lanczos-windowed
+    sinc interpolation.
+    '''
+
+    k = np.arange(n) + i0
+    y = np.zeros(n)
+    for j in range(-nsinc + 1, nsinc + 1):
+        x = j - shift
+        y += np.sinc(x) * np.sinc(x / nsinc) \
+            * data[np.clip(k + j, 0, data.size - 1)]
+
+    return y
+
+
+def get_traces_data_aligned(
+        traces, method='fft', dtype=None, max_drift=0.1, nsinc=8):
+
+    '''
+    Align data samples from multiple traces on their common time span.
+
+    Unlike :py:func:`get_traces_data_as_array`, traces may differ in start
+    time and number of samples. The common time span is cut from each trace
+    by index arithmetic. If start times are offset by a fraction of a
+    sample, the samples are shifted to the time axis of the trace starting
+    last.
+
+    :param traces:
+        Input waveforms.
+    :type traces:
+        list of :py:class:`obspy.Trace <obspy.core.trace.Trace>`
+        or :py:class:`pyrocko.Trace <pyrocko.trace.Trace>` objects
+
+    :param method:
+        Method for sub-sample shifts: ``'fft'`` for a phase shift in the
+        frequency domain, ``'sinc'`` for windowed sinc interpolation or
+        ``'nearest'`` to use the nearest samples without shifting.
+    :type method:
+        str
+
+    :param dtype:
+        Data type of the output. Defaults to the data type of the first
+        trace, or float if samples are shifted.
+    :type dtype:
+        :py:class:`numpy.dtype` or str
+
+    :param max_drift:
+        Largest accepted timing error accumulated over the common time span
+        due to differing sampling intervals [samples].
+    :type max_drift:
+        float
+
+    :param nsinc:
+        Half width of the sinc interpolation window [samples].
+    :type nsinc:
+        int
+
+    :raises:
+        :py:class:`~owlpy.error.OwlPyError` if traces is an empty list, if
+        sampling intervals differ by more than allowed by ``max_drift`` or if
+        the traces do not overlap.
+
+    :returns:
+        ``(data, times)``, 2D array as ``data[itrace, isample]`` and the
+        common time axis [s].
+    :rtype:
+        2-:py:class:`tuple` of :py:class:`numpy.ndarray`
+    '''
+
+    assert method in ('fft', 'sinc', 'nearest')
+
+    if not traces:
+        raise OwlPyError('Need at least one trace.')
+
+    udata = [_unpack_trace(tr) for tr in traces]
+
+    deltat = udata[0][1]
+    tmin = max(tmin_ for (_, _, tmin_) in udata)
+    tmax = min(
+        tmin_ + (data.size - 1) * deltat_
+        for (data, deltat_, tmin_) in udata)
+
+    if tmax < tmin:
+        raise OwlPyError('Given traces do not overlap.')
+
+    nspan = (tmax - tmin) / deltat + 1.
+    for (_, deltat_, _) in udata:
+        if abs(deltat_ - deltat) * nspan > max_drift * deltat:
+            raise OwlPyError(
+                'Sampling intervals of given traces differ: %g, %g'
+                % (deltat, deltat_))
+
+    offsets = np.array([(tmin - tmin_) / deltat for (_, _, tmin_) in udata])
+    istarts = np.round(offsets).astype(int)
+    shifts = offsets - istarts
+    if method == 'nearest':
+        shifts[:] = 0.0
+
+    # tolerate rounding errors of the start times
+    shifts[np.abs(shifts) < 1e-6] = 0.0
+
+    nsamples = min(
+        int(math.floor(data.size - 1 - istart - max(shift, 0.0) + 1e-6)) + 1
+        for ((data, _, _), istart, shift) in zip(udata, istarts, shifts))
+
+    if dtype is None:
+        dtype = udata[0][0].dtype if np.all(shifts == 0.0) else float
+
+    aligned = np.empty((len(udata), nsamples), dtype=dtype)
+    ishifted = []
+    for itrace, ((data, _, _), istart, shift) in enumerate(
+            zip(udata, istarts, shifts)):
+
+        if shift == 0.0:
+            aligned[itrace] = data[istart:istart+nsamples]
+        elif method == 'sinc':
+            aligned[itrace] = _shift_sinc(
+                data, istart, nsamples, shift, nsinc)
+        else:
+            ishifted.append(itrace)
+
+    if ishifted:
+        x = np.array([
+            udata[itrace][0][istarts[itrace]:istarts[itrace]+nsamples]
+            for itrace in ishifted], dtype=float)
+
+        aligned[ishifted] = _shift_fft(x, shifts[ishifted])
+
+    times = tmin + np.arange(nsamples) * deltat
+    return aligned, times
 
 
 class ArangeError(Exception):
@@ -138,7 +516,59 @@ def arange2(start, stop, step, dtype=float, epsilon=1e-6, error='raise'):
     return x
 
 
-def moving_sum(x, n, mode='valid'):
+def moving_sum(x, n, mode='valid', return_counts=False):
+    '''
+    Get sums of ``n`` consecutive samples along the last axis.
+
+    :param x:
+        Input as ``x[..., isample]``. Masked samples of a
+        :py:class:`numpy.ma.MaskedArray` do not contribute to the sums.
+    :type x:
+        :py:class:`numpy.ndarray`
+
+    :param n:
+        Window length [samples].
+    :type n:
+        int
+
+    :param mode:
+        ``'valid'``: only windows fully inside the input, ``'same'``: one
+        window centred on each sample, ``'full'``: all windows overlapping the
+        input. Windows reaching past the ends of the input are shortened.
+    :type mode:
+        str
+
+    :param return_counts:
+        Whether to also return the number of valid samples in each window.
+    :type return_counts:
+        bool
+
+    :returns:
+        Moving sums as ``sums[..., iwindow]``, or ``(sums, counts)`` if
+        ``return_counts`` is set. ``counts`` has the shape of ``sums`` for
+        masked input and is broadcastable to it otherwise.
+    :rtype:
+        :py:class:`numpy.ndarray` or 2-:py:class:`tuple` of
+        :py:class:`numpy.ndarray`
+    '''
+
+    if np.ma.isMaskedArray(x):
+        valid = ~np.ma.getmaskarray(x)
+        x = np.where(valid, np.ma.getdata(x), 0)
+    else:
+        valid = None
+
+    y = _moving_sum(x, n, mode)
+    if not return_counts:
+        return y
+
+    if valid is None:
+        valid = np.ones(x.shape[-1])
+
+    return y, _moving_sum(valid.astype(float), n, mode)
+
+
+def _moving_sum(x, n, mode):
     n = int(n)
     cx = np.cumsum(x, axis=-1)
     nn = x.shape[-1]
@@ -159,11 +589,12 @@ def moving_sum(x, n, mode='valid'):
         if n <= nn:
             y[..., 0:n] = cx[..., 0:n]
             y[..., n:nn] = cx[..., n:nn] - cx[..., 0:nn-n]
-            y[..., nn:nn+n-1] = cx[..., -1]-cx[..., nn-n:nn-1]
+            y[..., nn:nn+n-1] = cx[..., -1, np.newaxis] \
+                - cx[..., nn-n:nn-1]
         else:
             y[..., 0:nn] = cx[..., 0:nn]
-            y[..., nn:n] = cx[..., nn-1]
-            y[..., n:nn+n-1] = cx[..., nn-1] - cx[..., 0:nn-1]
+            y[..., nn:n] = cx[..., nn-1, np.newaxis]
+            y[..., n:nn+n-1] = cx[..., nn-1, np.newaxis] - cx[..., 0:nn-1]
 
     if mode == 'same':
         n1 = (n-1)//2
@@ -175,8 +606,8 @@ def moving_sum(x, n, mode='valid'):
                 - cx[..., nn-n:nn-n+n1]
         else:
             y[..., 0:max(0, nn-n1)] = cx[..., min(n1, nn):nn]
-            y[..., max(nn-n1, 0):min(n-n1, nn)] = cx[..., nn-1]
-            y[..., min(n-n1, nn):nn] = cx[..., nn-1] \
+            y[..., max(nn-n1, 0):min(n-n1, nn)] = cx[..., nn-1, np.newaxis]
+            y[..., min(n-n1, nn):nn] = cx[..., nn-1, np.newaxis] \
                 - cx[..., 0:max(0, nn-(n-n1))]
 
     return y
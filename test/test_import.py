@@ -0,0 +1,78 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+# import time budget for ``import owlpy`` [s], can be relaxed on slow machines
+budget = float(os.environ.get('OWLPY_IMPORT_BUDGET', 0.05))
+
+
+def run_import(statement):
+    '''
+    Import in a fresh interpreter, return cumulative import times [s] and
+    names of loaded top-level packages.
+    '''
+
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         '%s; import sys; '
+         'print(" ".join(sorted(set(m.split(".")[0] for m in sys.modules))))'
+         % statement],
+        capture_output=True, check=True, text=True)
+
+    times = {}
+    for line in output.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative) * 1e-6
+
+    return times, set(output.stdout.split())
+
+
+def test_import_time_budget():
+    times, modules = run_import('import owlpy')
+    assert times['owlpy'] < budget, \
+        'import owlpy took %g s, budget is %g s' % (times['owlpy'], budget)
+
+    assert 'numpy' not in modules
+
+
+@pytest.mark.parametrize('statement', [
+    'import owlpy.tilt',
+    'import owlpy.polarisation',
+    'from owlpy import tilt, polarisation'])
+def test_lazy_subpackages(statement):
+    _, modules = run_import(statement)
+    assert 'numpy' not in modules
+
+
+@pytest.mark.parametrize('module', [
+    'owlpy.util',
+    'owlpy.polarisation.pca',
+    'owlpy.tilt.correction',
+    'owlpy.tilt.util',
+    'owlpy.tilt.runner'])
+def test_no_framework_imports(module):
+    _, modules = run_import('import %s' % module)
+    assert not modules & {'obspy', 'pyrocko', 'matplotlib', 'scipy'}
+
+
+def test_lazy_attribute_access():
+    import owlpy
+
+    assert 'tilt' in dir(owlpy)
+    assert owlpy.tilt.correction.remove_tilt is not None
+    with pytest.raises(AttributeError):
+        owlpy.does_not_exist
@@ -0,0 +1,226 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+
+import numpy as np
+import pytest
+
+from owlpy import moving
+
+
+def windows(nsamples, n, mode):
+    '''
+    Sample ranges of the windows of :py:func:`owlpy.util.moving_sum`.
+    '''
+    if mode == 'valid':
+        return [(i, i + n) for i in range(nsamples - n + 1)]
+    elif mode == 'same':
+        n1 = (n - 1) // 2
+        return [
+            (max(i - n1, 0), min(i - n1 + n, nsamples))
+            for i in range(nsamples)]
+    else:
+        return [
+            (max(i - n + 1, 0), min(i + 1, nsamples))
+            for i in range(nsamples + n - 1)]
+
+
+@pytest.mark.parametrize('mode', ['valid', 'same', 'full'])
+def test_moving_statistics(mode):
+    rstate = np.random.RandomState(10)
+    x = rstate.normal(size=(2, 3, 200)) + 1000.
+    n = 15
+
+    ranges = windows(x.shape[-1], n, mode)
+
+    def reference(func):
+        return np.stack(
+            [func(x[..., i0:i1]) for (i0, i1) in ranges], axis=-1)
+
+    np.testing.assert_allclose(
+        moving.moving_count(x.shape[-1], n, mode),
+        [i1 - i0 for (i0, i1) in ranges])
+
+    np.testing.assert_allclose(
+        moving.moving_mean(x, n, mode),
+        reference(lambda w: np.mean(w, axis=-1)))
+
+    np.testing.assert_allclose(
+        moving.moving_var(x, n, mode, ddof=0),
+        reference(lambda w: np.var(w, axis=-1)),
+        rtol=1e-6, atol=1e-9)
+
+    np.testing.assert_allclose(
+        moving.moving_rms(x, n, mode),
+        reference(lambda w: np.sqrt(np.mean(w**2, axis=-1))))
+
+    def cov(w, center=True):
+        if center:
+            w = w - np.mean(w, axis=-1, keepdims=True)
+
+        return np.einsum('...is,...js->...ij', w, w) / w.shape[-1]
+
+    np.testing.assert_allclose(
+        moving.moving_cov(x, n, mode), reference(cov),
+        rtol=1e-6, atol=1e-9)
+
+    np.testing.assert_allclose(
+        moving.moving_cov(x, n, mode, center=False),
+        reference(lambda w: cov(w, center=False)))
+
+    np.testing.assert_allclose(
+        moving.moving_products(x, n, mode),
+        reference(lambda w: cov(w, center=False) * w.shape[-1]))
+
+    corr = moving.moving_corrcoef(x, n, mode)
+    assert corr.shape == (2, 3, 3, len(ranges))
+    for iwindow in [0, len(ranges) // 2, len(ranges) - 1]:
+        i0, i1 = ranges[iwindow]
+        if i1 - i0 < 2:
+            continue
+
+        for k in range(2):
+            np.testing.assert_allclose(
+                corr[k, :, :, iwindow], np.corrcoef(x[k, :, i0:i1]),
+                rtol=1e-6, atol=1e-9)
+
+
+@pytest.mark.parametrize('mode', ['valid', 'same', 'full'])
+def test_moving_weighted_sum(mode):
+    rstate = np.random.RandomState(11)
+    x = rstate.normal(size=(2, 3, 300))
+
+    for n in [1, 2, 15, 400]:
+        for window in ['boxcar', 'hann', 'gaussian']:
+            w = moving.taper_window(n, window)
+            full = np.apply_along_axis(
+                lambda row: np.convolve(row, w, mode='full'), -1, x)
+
+            if mode == 'valid':
+                ref = full[..., n-1:x.shape[-1]]
+            elif mode == 'same':
+                ref = full[..., (n-1)//2:(n-1)//2 + x.shape[-1]]
+            else:
+                ref = full
+
+            methods = ['fft', 'prefix'] if window != 'gaussian' else ['fft']
+            for method in methods:
+                y = moving.moving_weighted_sum(
+                    x, n, window=window, mode=mode, method=method)
+
+                assert y.shape == ref.shape
+                np.testing.assert_allclose(y, ref, atol=1e-10)
+
+    with pytest.raises(ValueError):
+        moving.moving_weighted_sum(x, 15, window='gaussian', method='prefix')
+
+
+def test_exponential_moving_sum():
+    rstate = np.random.RandomState(12)
+    x = rstate.normal(size=(2, 3, 500))
+
+    for n in [0.5, 3., 50.]:
+        decay = np.exp(-1.0 / n)
+        ref = np.zeros_like(x)
+        state = np.zeros(x.shape[:-1])
+        for isample in range(x.shape[-1]):
+            state = decay * state + x[..., isample]
+            ref[..., isample] = state
+
+        np.testing.assert_allclose(
+            moving.exponential_moving_sum(x, n), ref, atol=1e-12)
+
+        ems = moving.ExponentialMovingSum(n)
+        chunks = [
+            ems.process(x[..., i0:i1])
+            for (i0, i1) in [(0, 10), (10, 10), (10, 400), (400, 500)]]
+
+        np.testing.assert_allclose(
+            np.concatenate(chunks, axis=-1), ref, atol=1e-12)
+        assert ems.state.shape == (2, 3)
+
+
+@pytest.mark.parametrize('mode', ['valid', 'same', 'full'])
+def test_moving_statistics_masked(mode):
+    rstate = np.random.RandomState(15)
+    x = rstate.normal(size=(2, 3, 200)) + 1000.
+    mask = np.zeros(x.shape, dtype=bool)
+    mask[0, 1, 50:80] = True
+    mask[1, :, 120:125] = True
+    mask[:, 2, 180:] = True
+    x[mask] = 1e20
+    xm = np.ma.masked_array(x, mask=mask)
+    n = 15
+
+    ranges = windows(x.shape[-1], n, mode)
+
+    def reference(func, joint=False):
+        out = []
+        for (i0, i1) in ranges:
+            w = xm[..., i0:i1]
+            if joint:
+                w = np.ma.masked_array(
+                    w, mask=np.broadcast_to(
+                        np.any(w.mask, axis=-2, keepdims=True), w.shape))
+
+            out.append(func(w))
+
+        return np.ma.filled(np.ma.stack(out, axis=-1).astype(float), np.nan)
+
+    sums, counts = moving.moving_sum(xm, n, mode, return_counts=True)
+    np.testing.assert_allclose(
+        sums, reference(lambda w: np.ma.sum(w, axis=-1).filled(0.)))
+    np.testing.assert_array_equal(
+        counts, reference(lambda w: np.ma.count(w, axis=-1)))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.testing.assert_allclose(
+            moving.moving_mean(xm, n, mode),
+            reference(lambda w: np.ma.mean(w, axis=-1)))
+
+        np.testing.assert_allclose(
+            moving.moving_var(xm, n, mode, ddof=1),
+            reference(lambda w: np.ma.var(w, axis=-1, ddof=1)),
+            rtol=1e-6, atol=1e-9)
+
+        np.testing.assert_allclose(
+            moving.moving_rms(xm, n, mode),
+            reference(lambda w: np.sqrt(np.ma.mean(w**2, axis=-1))))
+
+    def cov(w):
+        valid = ~np.ma.getmaskarray(w)
+        w = w - np.ma.mean(w, axis=-1, keepdims=True)
+        w = np.where(valid, np.ma.getdata(w), 0.)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.einsum('...is,...js->...ij', w, w) \
+                / np.sum(valid[..., :1, :], axis=-1)[..., np.newaxis]
+
+    np.testing.assert_allclose(
+        moving.moving_cov(xm, n, mode), reference(cov, joint=True),
+        rtol=1e-6, atol=1e-9)
+
+    np.testing.assert_allclose(
+        moving.moving_products(xm, n, mode),
+        reference(lambda w: np.ma.filled(np.einsum(
+            '...is,...js->...ij', w.filled(0.), w.filled(0.))), joint=True))
+
+    # windows fully inside a gap of one component have no valid samples
+    corr = moving.moving_corrcoef(xm, n, mode)
+    iwindow = [i for (i, (i0, i1)) in enumerate(ranges) if i0 >= 180][0]
+    assert np.all(np.isnan(corr[..., iwindow]))
+    assert not np.any(np.isnan(corr[..., ranges.index(windows(
+        x.shape[-1], n, 'valid')[10])]))
+
+
+def test_moving_weighted_sum_masked():
+    x = np.ma.masked_array(np.arange(20.), mask=np.arange(20) % 3 == 0)
+    np.testing.assert_allclose(
+        moving.moving_weighted_sum(x, 5, window='hann'),
+        moving.moving_weighted_sum(x.filled(0.), 5, window='hann'),
+        atol=1e-12)
@@ -11,6 +11,7 @@
 import os
 import math
 import numpy as np
+import pytest
 
 from pyrocko import trace as ptrace, util as putil
 from pyrocko import moment_tensor as pmt
@@ -255,3 +256,108 @@ def test_gridsearch_azimuth_rot_acc():
         axes.scatter(times, max_azimuths, c=max_correlations, cmap='Greys')
 
         plt.show()
+
+
+def test_gridsearch_azimuth_rot_acc_windows():
+    rstate = np.random.RandomState(13)
+    deltat = 0.01
+    nsamples = 10000
+    azimuth = 30.
+    signal = rstate.normal(size=nsamples)
+    data = [
+        signal,
+        -np.sin(azimuth*d2r) * signal + 0.5 * rstate.normal(size=nsamples),
+        np.cos(azimuth*d2r) * signal + 0.5 * rstate.normal(size=nsamples)]
+
+    traces = [
+        ptrace.Trace('', 'STA', '', comp, deltat=deltat, ydata=ydata)
+        for comp, ydata in zip(['RZ', 'N', 'E'], data)]
+
+    roughness = {}
+    for window in ['boxcar', 'hann', 'gaussian']:
+        times, azimuths, grid_correlations, max_azimuths, max_correlations \
+            = gridsearch.gridsearch_azimuth_rot_acc(
+                traces, 5.0, azimuth_delta=1., window=window)
+
+        assert grid_correlations.shape == (azimuths.size, nsamples)
+        max_azimuths = max_azimuths[500:-500]
+        assert abs(np.median(max_azimuths) - azimuth) <= 1.
+        assert np.all(np.abs(max_azimuths - azimuth) <= 10.)
+        assert np.all(max_correlations[500:-500] > 0.8)
+        roughness[window] = np.sum(np.abs(np.diff(max_azimuths)))
+
+    # tapered windows avoid jumps of the azimuth estimates
+    assert roughness['hann'] < 0.5 * roughness['boxcar']
+    assert roughness['gaussian'] < 0.5 * roughness['boxcar']
+
+
+def test_gaps():
+    from obspy import Stream
+
+    rstate = np.random.RandomState(14)
+    deltat = 0.01
+    nsamples = 4000
+    azimuth = 120.
+    signal = rstate.normal(size=nsamples)
+    data = [
+        signal,
+        -np.sin(azimuth*d2r) * signal + 0.5 * rstate.normal(size=nsamples),
+        np.cos(azimuth*d2r) * signal + 0.5 * rstate.normal(size=nsamples)]
+
+    # ObsPy traces with a gap of 1 s, masked after merging
+    i0, i1 = 2000, 2100
+    traces = []
+    for comp, ydata in zip(['RZ', 'N', 'E'], data):
+        tr = to_obspy_trace(ptrace.Trace(
+            '', 'STA', '', comp, deltat=deltat, ydata=ydata))
+
+        st = Stream([tr.slice(endtime=tr.stats.starttime + (i0-1)*deltat),
+                     tr.slice(starttime=tr.stats.starttime + i1*deltat)])
+        st.merge()
+        traces.extend(st)
+
+    masked = get_traces_data_as_array(traces)
+    assert np.ma.isMaskedArray(masked)
+    assert np.all(masked.mask[:, i0:i1])
+    assert not np.any(masked.mask[:, :i0])
+
+    times, azimuths, grid_correlations, max_azimuths, max_correlations = \
+        gridsearch.gridsearch_azimuth_rot_acc(
+            traces, 2.0, azimuth_delta=1., min_coverage=0.6)
+
+    assert times[0] == traces[0].stats.starttime.timestamp
+
+    # windows of 200 samples with less than 120 valid samples are invalid
+    invalid = np.isnan(max_correlations)
+    np.testing.assert_array_equal(
+        np.nonzero(invalid)[0], np.arange(i0 - 100 + 81, i1 + 100 - 80))
+    assert np.all(np.isnan(max_azimuths[invalid]))
+    assert np.all(np.isnan(grid_correlations[:, invalid]))
+
+    # windows partly covering the gap still give sensible estimates
+    deviations = np.abs(max_azimuths - azimuth)
+    assert np.median(deviations[~invalid]) <= 3.
+    near_gap = ~invalid[i0-100:i1+100]
+    assert np.median(deviations[i0-100:i1+100][near_gap]) <= 5.
+
+    # windows away from the gap are not affected
+    ptraces = [
+        ptrace.Trace('', 'STA', '', comp, deltat=deltat, ydata=ydata)
+        for comp, ydata in zip(['RZ', 'N', 'E'], data)]
+
+    reference = gridsearch.gridsearch_azimuth_rot_acc(
+        ptraces, 2.0, azimuth_delta=1.)[2]
+
+    np.testing.assert_allclose(
+        grid_correlations[:, :i0-100], reference[:, :i0-100], atol=1e-9)
+
+    # PCA uses only the samples outside of the gap
+    traces_pca = traces[1:]
+    traces_pca[0].data.data[i0:i1] = 1e6
+    np.testing.assert_allclose(
+        pca.pca(traces_pca)[0],
+        np.cov(np.delete(np.array(data[1:]), np.s_[i0:i1], axis=1)))
+
+    traces_pca[0].data.mask[:] = True
+    with pytest.raises(pca.PCAError):
+        pca.pca(traces_pca)
@@ -0,0 +1,844 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+
+import functools
+import glob
+import os
+import tracemalloc
+import warnings
+
+import numpy as np
+import pytest
+
+from owlpy.error import OwlPyError
+from owlpy.tilt import (
+    cache, correction, detect, geometry, orientation, preprocess, runner,
+    segments, spectral, streaming, sweep)
+
+g = 9.81
+
+
+def make_tilted_signal(nsamples=4000, deltat=0.01, amp_noise=0.01, seed=0):
+    rstate = np.random.RandomState(seed)
+    t = np.arange(nsamples) * deltat
+    source = 1e-4 * np.sin(2.0 * np.pi * 0.3 * t) \
+        + 1e-5 * rstate.normal(size=nsamples)
+    acc = amp_noise * 1e-4 * rstate.normal(size=nsamples)
+    response = acc + g * source
+    return response, source, acc, deltat
+
+
+def test_remove_tilt_sliding():
+    response, source, acc, deltat = make_tilted_signal()
+
+    # with threshold zero, each window is fully corrected, so blending must
+    # reproduce the direct correction
+    for overlap in (0.0, 0.5, 0.75):
+        corrected = correction.remove_tilt_sliding(
+            response, source, deltat, twin=5.0, overlap=overlap,
+            threshold=0.0, smooth=1.0)
+
+        assert corrected.shape == response.shape
+        np.testing.assert_allclose(corrected, acc, atol=1e-12)
+
+    times, freq, Grr, Gss, Ars, coh = correction.transfer_function_sliding(
+        response, source, deltat, smooth=1.0, twin=5.0)
+
+    assert Ars.shape == coh.shape == (times.size, freq.size)
+    assert np.all(np.abs(coh) <= 1.0 + 1e-9)
+
+    # time-varying coupling: second half has opposite polarity
+    nhalf = response.size // 2
+    response2 = response.copy()
+    response2[nhalf:] = acc[nhalf:] - g * source[nhalf:]
+    corrected = correction.remove_tilt_sliding(
+        response2, source, deltat, twin=5.0, method='freq', smooth=0.5)
+
+    misfit_first = np.std(corrected[:nhalf-500] - acc[:nhalf-500])
+    misfit_second = np.std(corrected[nhalf+500:] - acc[nhalf+500:])
+    assert misfit_first < 0.1 * np.std(response[:nhalf])
+    assert misfit_second < 0.1 * np.std(response[nhalf:])
+
+
+def test_remove_tilt_mimo():
+    nsamples = 4000
+    deltat = 0.01
+    rstate = np.random.RandomState(1)
+    t = np.arange(nsamples) * deltat
+
+    sources = 1e-4 * np.vstack([
+        np.sin(2.0 * np.pi * 0.3 * t),
+        np.cos(2.0 * np.pi * 0.7 * t)]) \
+        + 1e-5 * rstate.normal(size=(2, nsamples))
+
+    # sensors misaligned by 10 degrees
+    phi = 10.0 * np.pi / 180.
+    rot = np.array([
+        [np.cos(phi), np.sin(phi)],
+        [-np.sin(phi), np.cos(phi)]])
+
+    acc = 1e-6 * rstate.normal(size=(2, nsamples))
+    responses = acc + g * rot.dot(sources)
+
+    freq, H, coh = correction.transfer_matrix(
+        responses, sources, deltat, smooth=1.0)
+
+    assert H.shape == (2, 2, freq.size)
+    assert coh.shape == (2, freq.size)
+    iband = np.logical_and(freq > 0.1, freq < 2.0)
+    np.testing.assert_allclose(
+        H[:, :, iband].real,
+        np.repeat((g * rot)[:, :, np.newaxis], np.sum(iband), axis=2),
+        atol=0.05 * g)
+
+    corrected = correction.remove_tilt_mimo(
+        responses, sources, deltat, smooth=1.0)
+
+    assert corrected.shape == responses.shape
+    for icomp in range(2):
+        residual = np.std(corrected[icomp, 200:-200] - acc[icomp, 200:-200])
+        single = correction.remove_tilt(
+            responses[icomp], sources[icomp], deltat, method='freq')
+        residual_single = np.std(single[200:-200] - acc[icomp, 200:-200])
+        assert residual < 0.1 * residual_single
+
+
+def test_remove_tilt_multi():
+    response, source, acc, deltat = make_tilted_signal()
+    responses = np.vstack([response, -response, 0.5 * response + acc])
+    parallel = [True, False, True]
+
+    for method in ('coh', 'freq', 'direct'):
+        corrected = correction.remove_tilt_multi(
+            responses, source, deltat, parallel=parallel, smooth=0.5,
+            fmin=0.1, method=method)
+
+        assert corrected.shape == responses.shape
+        for iresponse in range(responses.shape[0]):
+            np.testing.assert_allclose(
+                corrected[iresponse],
+                correction.remove_tilt(
+                    responses[iresponse], source, deltat,
+                    parallel=parallel[iresponse], smooth=0.5, fmin=0.1,
+                    method=method),
+                rtol=1e-9, atol=1e-12)
+
+    # scalar parallel flag, 1D source shared by all responses
+    for method in ('coh', 'freq', 'direct'):
+        corrected = correction.remove_tilt_multi(
+            np.vstack([response, response]), source, deltat, method=method)
+
+        reference = correction.remove_tilt(
+            response, source, deltat, method=method)
+
+        for iresponse in range(2):
+            np.testing.assert_allclose(
+                corrected[iresponse], reference, rtol=1e-9, atol=1e-12)
+
+
+def test_sweep_remove_tilt():
+    response, source, acc, deltat = make_tilted_signal()
+
+    thresholds = [0.0, 0.5, 0.9]
+    smooths = [0.5, 1.0, 1.001]
+    fmins = [None, 0.1]
+    fmaxs = [1.0, None]
+
+    traces = sweep.sweep_remove_tilt(
+        response, source, deltat, thresholds, smooths, fmins, fmaxs,
+        output='traces')
+
+    misfits = sweep.sweep_remove_tilt(
+        response, source, deltat, thresholds, smooths, fmins, fmaxs,
+        reference=acc)
+
+    assert traces.shape == (3, 3, 2, 2, response.size)
+    assert misfits.shape == (3, 3, 2, 2)
+
+    for ismooth, smooth in enumerate(smooths):
+        for ithreshold, threshold in enumerate(thresholds):
+            for ifmin, fmin in enumerate(fmins):
+                for ifmax, fmax in enumerate(fmaxs):
+                    corrected = correction.remove_tilt(
+                        response, source, deltat, fmin=fmin, fmax=fmax,
+                        threshold=threshold, smooth=smooth)
+
+                    np.testing.assert_allclose(
+                        traces[ismooth, ithreshold, ifmin, ifmax],
+                        corrected, atol=1e-12)
+
+                    assert np.isclose(
+                        misfits[ismooth, ithreshold, ifmin, ifmax],
+                        np.sqrt(np.mean((corrected - acc)**2)))
+
+    traces = sweep.sweep_remove_tilt(
+        response, source, deltat, thresholds, smooths, fmins, fmaxs,
+        method='freq', output='traces')
+
+    for ismooth, smooth in enumerate(smooths):
+        np.testing.assert_allclose(
+            traces[ismooth],
+            np.broadcast_to(
+                correction.remove_tilt(
+                    response, source, deltat, smooth=smooth, method='freq'),
+                traces.shape[1:]),
+            atol=1e-12)
+
+
+def test_transfer_function_cache(tmp_path):
+    response, source, acc, deltat = make_tilted_signal()
+    codes = ('XX', 'STA', '', 'HHN', 'HJE')
+
+    tf_cache = cache.TransferFunctionCache(
+        str(tmp_path), dtype='complex128')
+    assert tf_cache.get(codes, deltat, 8192, 1.0) is None
+
+    Ars, coh = tf_cache.get_or_compute(codes, response, source, deltat, 1.0)
+    Ars_cached, coh_cached = tf_cache.get(
+        codes, deltat, cache.get_nfft(response.size), 1.0)
+
+    np.testing.assert_allclose(Ars_cached, Ars)
+    np.testing.assert_allclose(coh_cached, coh)
+
+    corrected = correction.remove_tilt(
+        response, source, deltat, trans_coh=(Ars_cached, coh_cached))
+
+    np.testing.assert_allclose(
+        corrected, correction.remove_tilt(response, source, deltat))
+
+    # different record length
+    nfft = cache.get_nfft(response.size // 2)
+    Ars_resampled, coh_resampled = tf_cache.get(codes, deltat, nfft, 1.0)
+    assert Ars_resampled.size == coh_resampled.size == nfft // 2 + 1
+
+    # eviction
+    size = tf_cache.size()
+    tf_cache.max_size = int(size * 1.5)
+    tf_cache.put(codes[:4], deltat, 1.0, Ars, coh)
+    assert tf_cache.get(codes, deltat, 8192, 1.0) is None
+    assert tf_cache.get(codes[:4], deltat, 8192, 1.0) is not None
+    assert tf_cache.size() <= tf_cache.max_size
+
+
+def test_remove_tilt_low_memory():
+    response, source, acc, deltat = make_tilted_signal()
+    response32 = response.astype(np.float32)
+    source32 = source.astype(np.float32)
+
+    freq, Grr, Gss, Ars, coh = correction.transfer_function(
+        response32, source32, deltat, 1.0, low_memory=True)
+
+    assert Grr.dtype == Gss.dtype == np.float32
+    assert Ars.dtype == coh.dtype == np.complex64
+
+    freq, Grr, Gss, Ars, coh = correction.transfer_function(
+        response, source, deltat, 1.0)
+
+    assert Grr.dtype == Gss.dtype == np.float64
+
+    for method in ('coh', 'freq'):
+        corrected32 = correction.remove_tilt(
+            response32, source32, deltat, method=method, low_memory=True)
+        corrected = correction.remove_tilt(
+            response, source, deltat, method=method)
+
+        assert corrected32.dtype == np.float32
+        np.testing.assert_allclose(
+            corrected32, corrected, atol=1e-4 * np.max(np.abs(response)))
+
+    # peak memory on a long signal
+    nsamples = 2**18
+    rstate = np.random.RandomState(16)
+    response = rstate.normal(size=nsamples)
+    source = 1e-3 * rstate.normal(size=nsamples)
+    response32 = response.astype(np.float32)
+    source32 = source.astype(np.float32)
+
+    def peak_memory(*args, **kwargs):
+        tracemalloc.start()
+        try:
+            corrected = correction.remove_tilt(*args, **kwargs)
+            return corrected, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    for method in ('coh', 'freq'):
+        corrected, peak = peak_memory(
+            response, source, deltat, smooth=0.05, method=method)
+
+        corrected32, peak32 = peak_memory(
+            response32, source32, deltat, smooth=0.05, method=method,
+            low_memory=True)
+
+        np.testing.assert_allclose(corrected32, corrected, atol=1e-4)
+        assert peak32 < 14 * response32.nbytes
+        assert peak32 < 0.6 * peak
+
+
+def test_remove_tilt_quantities():
+    nsamples = 4000
+    deltat = 0.01
+    t = np.arange(nsamples) * deltat
+
+    def gauss(t0, width, nderivative):
+        x = (t - t0) / width
+        y = np.exp(-x**2)
+        if nderivative == 1:
+            return -2.0 * x / width * y
+        elif nderivative == 2:
+            return (4.0 * x**2 - 2.0) / width**2 * y
+        elif nderivative == 3:
+            return (12.0 * x - 8.0 * x**3) / width**3 * y
+        return y
+
+    # tilt angle and its rotation rate
+    angle = 1e-4 * gauss(15.0, 2.0, 1)
+    rotation_rate = 1e-4 * gauss(15.0, 2.0, 2)
+
+    # tilt free ground motion, tilt induced velocity is g * integral of angle
+    vel = 1e-5 * gauss(25.0, 1.0, 1)
+    acc = 1e-5 * gauss(25.0, 1.0, 2)
+    response_vel = vel + g * 1e-4 * gauss(15.0, 2.0, 0)
+    response_acc = acc + g * angle
+
+    for quantity_output, expected in [
+            ('velocity', vel),
+            ('acceleration', acc)]:
+
+        corrected = correction.remove_tilt(
+            response_vel, rotation_rate, deltat, threshold=0.0,
+            quantity_response='velocity',
+            quantity_source='rotation_rate',
+            quantity_output=quantity_output)
+
+        np.testing.assert_allclose(
+            corrected, expected, atol=1e-6 * np.max(np.abs(expected)))
+
+    np.testing.assert_allclose(
+        correction.remove_tilt(
+            response_acc, angle, deltat, threshold=0.0,
+            quantity_output='velocity'),
+        vel, atol=1e-6 * np.max(np.abs(vel)))
+
+    # zero-frequency component is lost by integration of the source
+    response, source, acc, deltat = make_tilted_signal()
+    corrected = correction.remove_tilt(
+        np.cumsum(response) * deltat, np.gradient(source, deltat), deltat,
+        method='freq',
+        quantity_response='velocity',
+        quantity_source='rotation_rate')
+
+    assert np.all(np.isfinite(corrected))
+
+    # ... or by differentiation of the response, also without smoothing
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        for method in ('coh', 'freq'):
+            for quantity_response in ('velocity', 'displacement'):
+                corrected = correction.remove_tilt(
+                    response, source, deltat, method=method, smooth=0,
+                    quantity_response=quantity_response)
+
+                assert np.all(np.isfinite(corrected))
+
+
+def test_remove_tilt_zoom():
+    response, source, acc, deltat = make_tilted_signal(nsamples=20000)
+    fmin, fmax = 0.1, 1.0
+
+    freq, Grr, Gss, Ars, coh = correction.transfer_function(
+        response, source, deltat, 0.5)
+
+    freq_band, Grr_band, Gss_band, Ars_band, coh_band = \
+        correction.transfer_function(
+            response, source, deltat, 0.5, fmin=fmin, fmax=fmax)
+
+    band = np.logical_and(fmin <= freq, freq <= fmax)
+    np.testing.assert_equal(freq_band, freq[band])
+    for x, x_band in [(Grr, Grr_band), (Ars, Ars_band), (coh, coh_band)]:
+        np.testing.assert_allclose(x_band, x[band], rtol=1e-9)
+
+    corrected = correction.remove_tilt(
+        response, source, deltat, fmin=fmin, fmax=fmax, smooth=0.5)
+
+    for trans_coh in [None, (Ars_band, coh_band)]:
+        corrected_zoom = correction.remove_tilt(
+            response, source, deltat, fmin=fmin, fmax=fmax, smooth=0.5,
+            zoom=True, trans_coh=trans_coh)
+
+        np.testing.assert_allclose(corrected_zoom, corrected, atol=1e-12)
+
+    # empty bands, also with only one limit given
+    for kwargs in [dict(fmax=-1.), dict(fmin=1e6), dict(fmin=1.0, fmax=0.5)]:
+        with pytest.raises(ValueError):
+            correction.transfer_function(
+                response, source, deltat, 0.5, **kwargs)
+
+        with pytest.raises(ValueError):
+            correction.remove_tilt(
+                response, source, deltat, zoom=True, **kwargs)
+
+
+def test_streaming_tilt_corrector():
+    response, source, acc, deltat = make_tilted_signal()
+    rotation_rate = np.gradient(source, deltat)
+
+    angle = np.zeros_like(rotation_rate)
+    angle[1:] = np.cumsum(
+        0.5 * deltat * (rotation_rate[1:] + rotation_rate[:-1]))
+    angle += source[0]
+
+    expected = correction.remove_tilt(
+        response, angle, deltat, method='direct')
+
+    rstate = np.random.RandomState(2)
+    corrector = streaming.StreamingTiltCorrector(
+        deltat, nblock=100, angle=source[0])
+
+    i0 = 0
+    packets = []
+    while i0 < response.size:
+        i1 = i0 + rstate.randint(1, 300)
+        packets.append(
+            corrector.process(rotation_rate[i0:i1], response[i0:i1]))
+        i0 = i1
+
+    np.testing.assert_allclose(np.concatenate(packets), expected, atol=1e-12)
+
+    # drift control
+    drift = np.full(response.size, 1e-6)
+    zeros = np.zeros(response.size)
+    corrector = streaming.StreamingTiltCorrector(deltat, fcorner=0.1)
+    corrected_hp = corrector.process(drift, zeros)
+    corrector = streaming.StreamingTiltCorrector(deltat)
+    corrected = corrector.process(drift, zeros)
+
+    assert np.abs(corrected_hp[-1]) < 0.1 * np.abs(corrected[-1])
+    assert np.isclose(
+        corrected_hp[-1], -g * 1e-6 / (2.0 * np.pi * 0.1), rtol=0.05)
+
+    # drift control with corner frequencies far above 1 / (deltat * nblock)
+    dt = 0.005
+    rate = 1e-3 * rstate.normal(size=20000)
+    for fcorner in [1.0, 50.0]:
+        corrector = streaming.StreamingTiltCorrector(dt, fcorner=fcorner)
+        assert 2.0 * np.pi * fcorner * dt * corrector.nblock \
+            <= 8. * np.log(10.)
+
+        decay = np.exp(-2.0 * np.pi * fcorner * dt)
+        angle = np.zeros(rate.size)
+        state = 0.0
+        for i in range(rate.size):
+            rate_previous = rate[i-1] if i > 0 else -rate[0]
+            state = decay * state + 0.5 * dt * (rate[i] + rate_previous)
+            angle[i] = state
+
+        np.testing.assert_allclose(
+            corrector.process(rate, np.zeros(rate.size)), -g * np.sin(angle),
+            rtol=0, atol=1e-9 * g * np.max(np.abs(angle)))
+
+
+def load_segment(response, source, i0, i1):
+    return response[i0:i1], source[i0:i1]
+
+
+def load_broken_segment():
+    raise ValueError('Broken segment.')
+
+
+def test_run_remove_tilt():
+    response, source, acc, deltat = make_tilted_signal(nsamples=8000)
+    noverlap = 500
+    nsegment = 2000
+    segments = []
+    for i0 in range(0, response.size - noverlap, nsegment - noverlap):
+        i1 = min(i0 + nsegment, response.size)
+        if len(segments) % 2:
+            segments.append(
+                functools.partial(load_segment, response, source, i0, i1))
+        else:
+            segments.append((response[i0:i1], source[i0:i1]))
+
+    kwargs = dict(threshold=0.0, smooth=0.5)
+
+    corrected, stats = runner.run_remove_tilt(
+        segments, deltat, nworkers=2, **kwargs)
+
+    assert len(corrected) == len(segments)
+    for segment, corrected_segment in zip(segments, corrected):
+        if callable(segment):
+            segment = segment()
+
+        np.testing.assert_allclose(
+            corrected_segment,
+            correction.remove_tilt(*segment, deltat, **kwargs))
+
+    corrected, stats = runner.run_remove_tilt(
+        segments, deltat, noverlap=noverlap, nworkers=2, **kwargs)
+
+    assert corrected.shape == response.shape
+    np.testing.assert_allclose(corrected, acc, atol=1e-12)
+    assert stats['nsegments'] == len(segments)
+    assert stats['throughput'] > 0.0
+
+    # shared memory is released if a worker fails
+    shm_dir = '/dev/shm'
+    if os.path.isdir(shm_dir):
+        before = set(os.listdir(shm_dir))
+        with pytest.raises(ValueError):
+            runner.run_remove_tilt(
+                segments[:2] + [load_broken_segment] + segments[2:], deltat,
+                nworkers=2, **kwargs)
+
+        assert set(os.listdir(shm_dir)) <= before
+
+    with pytest.raises(OwlPyError):
+        runner.run_remove_tilt([], deltat, noverlap=noverlap)
+
+    with pytest.raises(OwlPyError):
+        runner.run_remove_tilt(segments, deltat, noverlap=nsegment + 1)
+
+
+def test_estimate_misorientation():
+    nsamples = 8000
+    deltat = 0.01
+    rstate = np.random.RandomState(3)
+    tilt = 1e-4 * rstate.normal(size=(2, nsamples))
+    responses = g * tilt + 1e-4 * rstate.normal(size=(2, nsamples))
+
+    for angle_in in [-150., 7.3, 95.]:
+        sources = orientation.rotate_sources(tilt, -angle_in)
+        angle, uncertainty, angles, objective = \
+            orientation.estimate_misorientation(
+                responses, sources, deltat, smooth=1.0, fmax=10.)
+
+        assert objective.shape == angles.shape
+        assert abs(orientation._wrap(angle - angle_in)) < 1.0
+        assert 0.0 < uncertainty < 1.0
+
+        np.testing.assert_allclose(
+            orientation.rotate_sources(sources, angle), tilt,
+            atol=0.03 * np.max(np.abs(tilt)))
+
+
+def test_cross_spectral_matrix():
+    response, source, acc, deltat = make_tilted_signal()
+    rstate = np.random.RandomState(4)
+    data = np.vstack([
+        response, source, rstate.normal(size=response.size), -response])
+
+    matrix = spectral.cross_spectral_matrix(data, deltat, 1.0)
+    assert matrix.G.shape == (4, 4, matrix.freq.size)
+    np.testing.assert_allclose(
+        matrix.G, np.conjugate(np.transpose(matrix.G, (1, 0, 2))))
+
+    coh_matrix = matrix.coherence_matrix()
+    for iresponse in range(4):
+        for isource in range(4):
+            freq, Grr, Gss, Ars, coh = correction.transfer_function(
+                data[iresponse], data[isource], deltat, 1.0)
+
+            Ars2, coh2 = matrix.transfer_function(iresponse, isource)
+            np.testing.assert_allclose(Ars2, Ars, rtol=1e-8)
+            np.testing.assert_allclose(coh2, coh, rtol=1e-8)
+            np.testing.assert_allclose(
+                coh_matrix[iresponse, isource], coh, rtol=1e-8)
+
+
+def make_step_signal(deltat=0.005, duration=60., seed=5):
+    rstate = np.random.RandomState(seed)
+    t = np.arange(int(round(duration / deltat))) * deltat
+    data = 1e-6 * rstate.normal(size=t.size)
+    for tstep in np.arange(10., duration - 5., 3.):
+        x = (t - tstep) / 0.5
+        inside = np.logical_and(0.0 <= x, x <= 1.0)
+        data[inside] += 1e-3 * np.sin(np.pi * x[inside])**2
+
+    return data, deltat
+
+
+def trigger_reference(data, deltat, a, b, d0, d1, c_on, c_off, start, stop):
+    from obspy.signal.trigger import classic_sta_lta
+    cft1 = classic_sta_lta(data, int(a), int(b))
+
+    _on = np.where(cft1 < d0)[0]
+    _off = np.where(cft1 > d1)[0]
+
+    on = []
+    on0 = 0
+    for i in range(len(_on)-1):
+        if _on[i+1] - _on[i] > 1:
+            trigg = _on[i]*deltat
+            if trigg >= start and trigg <= stop:
+                if np.abs((trigg + c_on)-on0) > 1.0:
+                    on.append(trigg + c_on)
+                    on0 = trigg + c_on
+    off = []
+    off0 = 0
+    for i in range(len(_off)-1):
+        if _off[i+1] - _off[i] > 1:
+            trigg = _off[i]*deltat
+            if trigg >= start and trigg <= stop:
+                if np.abs((trigg + c_off)-off0) > 1.0:
+                    off.append(trigg + c_off)
+                    off0 = trigg + c_off
+
+    return on, off
+
+
+def test_detect_steps():
+    from obspy.signal.trigger import classic_sta_lta
+    data, deltat = make_step_signal()
+
+    np.testing.assert_allclose(
+        detect.sta_lta(data, 10, 140), classic_sta_lta(data, 10, 140),
+        rtol=1e-6, atol=1e-9)
+
+    for args in [
+            (10, 140, 6.0, 5.0, -0.075, 0.49, 5.0, 55.0),
+            (10, 140, 1.5, 3.0, 0.0, 0.0, 0.0, 60.0),
+            (20, 400, 0.5, 2.0, -2.0, 0.0, 0.0, 40.0)]:
+
+        on, off = detect.detect_steps(data, deltat, *args)
+        on_ref, off_ref = trigger_reference(data, deltat, *args)
+
+        np.testing.assert_allclose(on, on_ref)
+        np.testing.assert_allclose(off, off_ref)
+
+
+def test_segment_table():
+    from obspy import Stream, Trace
+    from owlpy.tilt import util
+
+    deltat = 0.005
+    nsamples = 12000
+    t = np.arange(nsamples) * deltat
+    rstate = np.random.RandomState(6)
+    on = np.sort(rstate.uniform(-1.0, t[-1] + 1.0, size=50))
+    off = on + rstate.uniform(0.0, 1.0, size=on.size)
+
+    table = segments.segment_table(on, off, nsamples, deltat)
+    table_times = segments.segment_table(on, off, nsamples, times=t)
+
+    for ion, (t_on, t_off) in enumerate(zip(on, off)):
+        idx_on = np.abs(t - t_on).argmin()
+        idx_off = np.abs(t - t_off).argmin()
+        assert tuple(table[ion]) == (idx_on, idx_off)
+        assert tuple(table_times[ion]) == (idx_on, idx_off)
+
+    data, deltat = make_step_signal(deltat=deltat)
+    st = Stream([Trace(data=np.cumsum(data) * deltat)])
+    st[0].stats.delta = deltat
+    alpha = util.get_angle(st, on, off)
+
+    # reference: nearest samples found by scanning the time vector, as
+    # originally done with find_nearest
+    t = np.arange(len(st[0].data)) / st[0].stats.sampling_rate
+    alpha_ref = [
+        np.abs(st[0].data[np.abs(t - t_on).argmin()]
+               - st[0].data[np.abs(t - t_off).argmin()])
+        for (t_on, t_off) in zip(on, off)]
+
+    assert alpha.shape == (on.size,)
+    np.testing.assert_equal(alpha, alpha_ref)
+
+
+def test_residual_displacement():
+    from obspy import Stream, Trace
+    from owlpy.tilt import util
+
+    deltat = 0.01
+    rstate = np.random.RandomState(7)
+    velocity = np.cumsum(rstate.normal(size=5000)) * 1e-3
+    r = rstate.normal(size=velocity.size)
+    on = [3.0, 12.34, 30.0, 49.97]
+    off = [8.0, 20.0, 45.5, 49.99]
+    table = segments.segment_table(on, off, velocity.size, deltat)
+
+    for detrend in (True, False):
+        flat, offsets, ptp = segments.residual_displacement(
+            velocity, table, deltat, detrend=detrend)
+
+        assert offsets[-1] == flat.size
+        for iseg, disp in enumerate(segments.split_segments(flat, offsets)):
+            idx_on, idx_off = table[iseg]
+            tr = Trace(data=velocity[idx_on:idx_off].copy())
+            tr.stats.delta = deltat
+            if detrend:
+                tr.detrend('linear')
+            tr.data -= tr.data[0]
+            tr.integrate()
+            np.testing.assert_allclose(disp, tr.data, atol=1e-12)
+            np.testing.assert_allclose(ptp[iseg], np.ptp(tr.data), atol=1e-12)
+
+    st = Stream([Trace(data=velocity)])
+    st[0].stats.delta = deltat
+    starttime = st[0].stats.starttime
+    time, disp, mean, sigma = util.calc_residual_disp(st, on, off, r)
+    assert st[0].stats.starttime == starttime
+    assert len(time) == len(disp) == len(on)
+    for (idx_on, idx_off), t_seg, disp_seg in zip(table, time, disp):
+        assert t_seg.size == disp_seg.size == idx_off - idx_on
+        assert disp_seg[0] == r[idx_on]
+
+    # no steps detected
+    time, disp, mean, sigma = util.calc_residual_disp(st, [], [], r)
+    assert time == disp == []
+    assert np.isnan(mean) and np.isnan(sigma)
+
+    table = segments.segment_table([], [], velocity.size, deltat)
+    flat, offsets, ptp = segments.residual_displacement(
+        velocity, table, deltat)
+    assert flat.size == ptp.size == 0
+    assert segments.split_segments(flat, offsets) == []
+
+    with pytest.raises(ValueError):
+        segments.gather_segments(velocity, [[10, 10]])
+
+
+def test_invert_geometry():
+    from owlpy.tilt import util
+
+    rstate = np.random.RandomState(8)
+    alpha = rstate.uniform(0.005, 0.02, size=40)
+    l, dh, h = 0.3, 0.05, 0.12
+    disp = geometry.residual_displacement(alpha, l, dh, h)
+    assert disp.shape == alpha.shape
+
+    ls = np.linspace(0.1, 0.5, 41)
+    dhs = np.array([0.0, 0.05])
+    hs = np.linspace(0.0, 0.3, 31)
+
+    inv = geometry.invert_geometry(
+        disp, alpha, ls[:, np.newaxis], dhs[np.newaxis, :])
+    assert inv.misfit.shape == (ls.size, dhs.size)
+    np.testing.assert_allclose(inv.best['l'], l)
+    np.testing.assert_allclose(inv.best['dh'] + inv.best['h'], dh + h)
+    np.testing.assert_allclose(inv.h[:, 1], inv.h[:, 0] - 0.05)
+
+    h_fit, h_sigma, misfit = geometry.fit_height(disp, alpha, l, dh)
+    np.testing.assert_allclose(h_fit, h)
+    np.testing.assert_allclose(
+        h_fit, util.calc_height_of_mass(disp, l, dh, alpha)[0])
+
+    inv = geometry.invert_geometry(
+        disp, alpha, ls[:, np.newaxis, np.newaxis],
+        dhs[np.newaxis, :, np.newaxis], hs[np.newaxis, np.newaxis, :])
+
+    disp_grid = geometry.residual_displacement(alpha, inv.l, inv.dh, inv.h)
+    np.testing.assert_allclose(
+        inv.misfit, np.sqrt(np.mean((disp_grid - disp)**2, axis=-1)),
+        atol=1e-12)
+
+    disp_noisy = disp + rstate.normal(scale=1e-5, size=disp.size)
+    inv = geometry.invert_geometry(disp_noisy, alpha, ls[:, np.newaxis], dh)
+    sigma = inv.uncertainties()
+    assert abs(inv.best['l'] - l) <= sigma['l'] + 0.5 * (ls[1] - ls[0])
+    assert abs(inv.best['h'] - h) <= 3.0 * sigma['h']
+
+
+def make_tilt_table_files(path, duration=60., deltat=0.01):
+    from obspy import Stream, Trace, UTCDateTime
+    from obspy.core.inventory import (
+        Channel, Inventory, Network, Response, Station)
+
+    channels = []
+    for cha, azimuth, dip, units in [
+            ('HHZ', 0., -90., 'M/S'), ('HHN', 0., 0., 'M/S'),
+            ('HHE', 90., 0., 'M/S'), ('HJ3', 0., -90., 'RAD/S'),
+            ('HJ2', 0., 0., 'RAD/S'), ('HJ1', 90., 0., 'RAD/S')]:
+
+        channel = Channel(
+            cha, '', 0., 0., 0., 0., azimuth=azimuth, dip=dip,
+            sample_rate=1.0/deltat)
+        channel.response = Response.from_paz(
+            [0j, 0j], [-0.037 + 0.037j, -0.037 - 0.037j], 1000.,
+            input_units=units, output_units='COUNTS')
+        channels.append(channel)
+
+    inv = Inventory([
+        Network('XX', [Station('TT', 0., 0., 0., channels=channels)])])
+    fn_inv = str(path / 'inventory.xml')
+    inv.write(fn_inv, format='STATIONXML')
+
+    t0 = UTCDateTime(2020, 1, 1)
+    rstate = np.random.RandomState(9)
+    fns = []
+    for prefix, comps in [('HH', 'ZNE'), ('HJ', '321')]:
+        st = Stream([
+            Trace(
+                data=rstate.randint(
+                    -1000, 1000, size=int(round(duration/deltat)),
+                    dtype=np.int32),
+                header=dict(
+                    network='XX', station='TT', channel=prefix+comp,
+                    starttime=t0, delta=deltat))
+            for comp in comps])
+
+        fn = str(path / ('%s.mseed' % prefix))
+        st.write(fn, format='MSEED')
+        fns.append(fn)
+
+    return fns[0], fns[1], fn_inv, t0
+
+
+@pytest.mark.filterwarnings('ignore')
+def test_preprocess(tmp_path, monkeypatch):
+    from owlpy.tilt import util
+
+    fn_seis, fn_rot, fn_inv, t0 = make_tilt_table_files(tmp_path)
+    utctime = str(t0 + 10.)
+
+    r, s = util.get_data(
+        fn_seis, fn_rot, utctime, 30., None, None, fn_inv, 'HHE', 'HJE',
+        nworkers=1)
+
+    cache = preprocess.PreprocessCache(str(tmp_path / 'cache'))
+    for _ in range(2):
+        response, source, dt = preprocess.preprocess_arrays(
+            fn_seis, fn_rot, utctime, 30., fn_inv, 'HHE', 'HJE', cache=cache)
+
+        assert dt == r[0].stats.delta
+        np.testing.assert_array_equal(response, r[0].data)
+        np.testing.assert_array_equal(source, s[0].data)
+        assert len(glob.glob(os.path.join(cache.path, '*.npz'))) == 2
+
+    st_seis, st_rot = preprocess.preprocess(
+        fn_seis, fn_rot, utctime, 30., fn_inv, cache=cache)
+    assert [tr.stats.channel for tr in st_seis] == ['HHZ', 'HHN', 'HHE']
+    assert st_rot[0].stats.starttime == r[0].stats.starttime
+
+    preprocess.preprocess(
+        fn_seis, fn_rot, utctime, 30., fn_inv, cache=cache,
+        water_level=40.)
+    assert len(glob.glob(os.path.join(cache.path, '*.npz'))) == 3
+
+    # raw files are only hashed again when size or modification time change
+    hashed = []
+
+    def hash_file(filename):
+        hashed.append(os.path.basename(filename))
+        return hash_file_orig(filename)
+
+    hash_file_orig = preprocess._hash_file
+    monkeypatch.setattr(preprocess, '_hash_file', hash_file)
+
+    cache = preprocess.PreprocessCache(cache.path)
+    preprocess.preprocess(fn_seis, fn_rot, utctime, 30., fn_inv, cache=cache)
+    assert hashed == []
+
+    st = os.stat(fn_inv)
+    os.utime(fn_inv, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    preprocess.preprocess(fn_seis, fn_rot, utctime, 30., fn_inv, cache=cache)
+    assert set(hashed) == {os.path.basename(fn_inv)}
+
+    with pytest.raises(OwlPyError):
+        preprocess.preprocess_arrays(
+            fn_seis, fn_rot, utctime, 30., fn_inv, 'HH?', 'HJE')
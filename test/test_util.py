@@ -0,0 +1,232 @@
+# -----------------------------------------------------------------------------
+# OwlPy - AGPLv3
+#
+# This file is part of the OwlPy library. For licensing information see the
+# accompanying file `LICENSE`.
+#
+# The OwlPy Developers, 21st century
+# -----------------------------------------------------------------------------
+
+
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from pyrocko import trace as ptrace
+
+from owlpy.error import OwlPyError
+from owlpy import util
+from owlpy.util import get_traces_data_as_array, get_traces_data_aligned
+
+
+def make_traces(data, deltat=0.01, tmin=0.0):
+    return [
+        ptrace.Trace(
+            channel='C%i' % i, ydata=ydata, deltat=deltat, tmin=tmin)
+        for (i, ydata) in enumerate(data)]
+
+
+def test_get_traces_data_as_array():
+    data = np.random.normal(size=(3, 1000))
+    traces = make_traces(data)
+
+    merged = get_traces_data_as_array(traces)
+    np.testing.assert_array_equal(merged, data)
+    assert not np.shares_memory(merged, data)
+
+    view = get_traces_data_as_array(traces, copy=False)
+    np.testing.assert_array_equal(view, data)
+    assert np.shares_memory(view, data)
+
+    view = get_traces_data_as_array(traces[::-2], copy=False)
+    np.testing.assert_array_equal(view, data[::-2])
+    assert np.shares_memory(view, data)
+
+    irregular = [traces[0], traces[2], traces[1]]
+    merged = get_traces_data_as_array(irregular, copy=False)
+    np.testing.assert_array_equal(merged, data[[0, 2, 1]])
+    assert not np.shares_memory(merged, data)
+
+    views = get_traces_data_as_array(traces, views=True)
+    assert all(a is tr.ydata for (a, tr) in zip(views, traces))
+
+    out = np.zeros((3, 1000), dtype=np.float32)
+    result = get_traces_data_as_array(traces, out=out)
+    assert result is out
+    np.testing.assert_allclose(out, data, rtol=1e-6)
+
+    with pytest.raises(OwlPyError):
+        get_traces_data_as_array(traces, out=np.zeros((2, 1000)))
+
+    mixed = make_traces([data[0], data[1].astype(np.float32)])
+    with pytest.raises(OwlPyError):
+        get_traces_data_as_array(mixed)
+
+    merged = get_traces_data_as_array(mixed, dtype=np.float32)
+    assert merged.dtype == np.float32
+    np.testing.assert_allclose(merged, data[:2], rtol=1e-6)
+
+    with pytest.raises(OwlPyError):
+        get_traces_data_as_array([])
+
+
+def test_get_traces_data_as_array_masked():
+    data = np.random.normal(size=(2, 100))
+    mask = np.zeros(data.shape, dtype=bool)
+    mask[1, 10:20] = True
+    traces = [
+        util.ArrayTrace(np.ma.masked_array(ydata, mask=ymask), 0.5)
+        for (ydata, ymask) in zip(data, mask)]
+
+    traces[0].ydata = traces[0].ydata.filled()
+    for kwargs in [{}, dict(copy=False), dict(dtype=np.float32)]:
+        merged = get_traces_data_as_array(traces, **kwargs)
+        assert np.ma.isMaskedArray(merged)
+        np.testing.assert_array_equal(merged.mask, mask)
+        np.testing.assert_allclose(merged.data, data, rtol=1e-6)
+
+    sums, counts = util.moving_sum(merged, 5, return_counts=True)
+    np.testing.assert_array_equal(counts[0], 5.)
+    assert counts[1, 10] == 0.
+    np.testing.assert_allclose(
+        sums, util.moving_sum(merged.filled(0.), 5), rtol=1e-6)
+
+    _, counts = util.moving_sum(data, 5, mode='full', return_counts=True)
+    np.testing.assert_array_equal(counts, [1, 2, 3, 4] + [5]*96 + [4, 3, 2, 1])
+
+
+def test_get_traces_data_aligned():
+    def signal(t):
+        return np.sin(2.*np.pi*0.7*t) + 0.5*np.cos(2.*np.pi*1.3*t + 0.3) \
+            + 0.1*t
+
+    deltat = 0.05
+    traces = []
+    for tmin, nsamples in [
+            (0.0, 1000), (1.0 + 0.3*deltat, 900), (2.0 - 0.4*deltat, 1200)]:
+
+        traces.append(ptrace.Trace(
+            ydata=signal(tmin + np.arange(nsamples) * deltat),
+            tmin=tmin, deltat=deltat))
+
+    for method, tolerance in [('fft', 1e-3), ('sinc', 1e-2)]:
+        data, times = get_traces_data_aligned(traces, method=method)
+        assert data.shape == (3, times.size)
+        assert times[0] == 2.0 - 0.4*deltat
+        assert times[-1] <= 1.0 + 0.3*deltat + 899*deltat
+        np.testing.assert_allclose(
+            data[:, 50:-50],
+            np.broadcast_to(signal(times), data.shape)[:, 50:-50],
+            atol=tolerance)
+
+    data, times = get_traces_data_aligned(traces, method='nearest')
+    np.testing.assert_array_equal(data[2], traces[2].ydata[:times.size])
+
+    data = np.random.normal(size=(2, 1000))
+    traces = make_traces(data)
+    traces[1].tmin += 10 * traces[1].deltat
+    traces[1].deltat *= 1.0 + 1e-7
+    aligned, times = get_traces_data_aligned(traces)
+    np.testing.assert_array_equal(aligned[0], data[0, 10:])
+    np.testing.assert_array_equal(aligned[1], data[1, :990])
+
+    traces[1].deltat *= 1.01
+    with pytest.raises(OwlPyError):
+        get_traces_data_aligned(traces)
+
+
+def test_trace_store(tmp_path):
+    from obspy import Stream, Trace, UTCDateTime
+    from owlpy import tracestore
+
+    t0 = UTCDateTime(2021, 5, 1)
+    data = np.random.normal(size=(3, 1000))
+    st = Stream([
+        Trace(data=ydata, header=dict(
+            network='XX', station='BS1', channel='HJ%s' % comp,
+            starttime=t0, delta=0.01))
+        for (ydata, comp) in zip(data, 'ZNE')])
+
+    store = tracestore.convert(st, str(tmp_path / 'store'))
+    traces = store.traces('XX.BS1.*.HJ?')
+    assert [tr.codes for tr in traces] == [
+        ('XX', 'BS1', '', 'HJE'), ('XX', 'BS1', '', 'HJN'),
+        ('XX', 'BS1', '', 'HJZ')]
+    assert isinstance(traces[0].ydata, np.memmap)
+    assert traces[0].tmin == t0.timestamp
+
+    views = get_traces_data_as_array(traces, views=True)
+    assert all(isinstance(view, np.memmap) for view in views)
+    np.testing.assert_array_equal(
+        get_traces_data_as_array(traces), data[::-1])
+
+    window = store.traces('*.HJZ', tmin=t0.timestamp + 1.0,
+                          tmax=t0.timestamp + 2.0)
+    assert len(window) == 1
+    assert window[0].tmin == t0.timestamp + 1.0
+    np.testing.assert_array_equal(window[0].ydata, data[0, 100:201])
+    assert not store.traces(tmin=t0.timestamp + 100.)
+
+    store.add(make_traces(data[:1]), dtype=np.float32)
+    tr = store.traces('*.C0')[0]
+    assert tr.ydata.dtype == np.float32
+    np.testing.assert_allclose(tr.load().ydata, data[0], rtol=1e-6)
+
+    fn = str(tmp_path / 'broken.owltr')
+    with open(fn, 'wb') as f:
+        f.write(b'no trace')
+
+    with pytest.raises(tracestore.TraceStoreError):
+        tracestore.read_trace(fn)
+
+
+class MyTrace(object):
+    def __init__(self, samples, rate, start):
+        self.samples = samples
+        self.rate = rate
+        self.start = start
+
+
+class MySubTrace(MyTrace):
+    pass
+
+
+def test_trace_adapters():
+    data = np.random.normal(size=(2, 100))
+
+    traces = [util.ArrayTrace(ydata, 0.5, tmin=10.) for ydata in data]
+    assert util._unpack_trace(traces[0]) == (traces[0].ydata, 0.5, 10.)
+    np.testing.assert_array_equal(get_traces_data_as_array(traces), data)
+
+    with pytest.raises(TypeError):
+        get_traces_data_as_array([MyTrace(data[0], 2.0, 10.)])
+
+    try:
+        util.register_trace_adapter(
+            '%s.MyTrace' % __name__,
+            lambda tr: (tr.samples, 1.0 / tr.rate, tr.start))
+
+        traces = [MySubTrace(ydata, 2.0, 10.) for ydata in data]
+        np.testing.assert_array_equal(get_traces_data_as_array(traces), data)
+
+        util.register_trace_adapter(
+            MySubTrace, lambda tr: (tr.samples, 1.0 / tr.rate, 0.))
+        assert util._unpack_trace(traces[0])[2] == 0.
+
+    finally:
+        for key in ('%s.MyTrace' % __name__, MySubTrace):
+            util._trace_adapters.pop(key, None)
+
+        util._trace_adapter_cache.clear()
+
+
+def test_util_import_without_frameworks():
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        'import sys, owlpy.util; '
+        'print(any(m.split(".")[0] in ("obspy", "pyrocko") '
+        'for m in sys.modules))'])
+
+    assert output.strip() == b'False'